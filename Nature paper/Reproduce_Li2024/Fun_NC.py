@@ -1,14 +1,18 @@
 # For GEM-2 NC paper
-import csv, random, os
+import csv, random, os, json
 import pybamm as pb;import pandas as pd   ;import numpy as np;import os;
 import matplotlib.pyplot as plt;import os;#import imageio;import timeit
 from scipy.io import savemat,loadmat;from pybamm import constants,exp,sqrt;
 import matplotlib as mpl; 
-from multiprocessing import Queue, Process, set_start_method
+import multiprocessing
+from multiprocessing import Queue, Process, Pipe, set_start_method
 from queue import Empty
 import openpyxl
 import traceback
-import random;import time, signal
+from Fun_Store import *    # results store and campaign index
+import random;import time, signal, threading
+import subprocess, sys
+import ast, copy, glob, gzip, hashlib, pickle, re
 
 ###################################################################
 #############    From Patrick from Github        ##################
@@ -46,14 +50,57 @@ class TimeoutFunc(object):
                 Call_ref,
                 self.timeout_val]
         return Result_List  
+
+# In-process version of TimeoutFunc with the same interface.
+# The deadline goes to func as the keyword Deadline, which hands it to its
+# RioCallback; the callback checks it at the start of every step and cycle.
+# So the result is never pickled and built models/integrators stay alive 
+# for the next call. SIGALRM at the deadline is the backstop if one step 
+# runs on: it only exists in the main thread of the process, in other 
+# threads the callback check is all there is (noted in the DeBug list)
+class TimeoutInline(object):
+    def __init__(self, func, timeout=None, timeout_val=None):
+        assert callable(func), 'Positional argument 1 must be a callable method'
+        self.func = func
+        self.timeout = timeout
+        self.timeout_val = timeout_val
+    def __call__(self, *args, **kwargs):
+        Use_Alarm = (
+            self.timeout is not None and hasattr(signal, "SIGALRM") and 
+            threading.current_thread() is threading.main_thread())
+        if self.timeout is not None:
+            kwargs = {**kwargs, "Deadline": time.time() + self.timeout}
+        if Use_Alarm:
+            handler_old = signal.signal(signal.SIGALRM, handle_signal)
+            signal.alarm(max(int(np.ceil(self.timeout)), 1))
+        try:
+            Result_List = self.func(*args, **kwargs)
+        except TimeoutError:
+            Call_ref = RioCallback() 
+            Result_List = [         
+                self.timeout_val,
+                self.timeout_val,
+                Call_ref,
+                self.timeout_val]
+        finally:
+            if Use_Alarm:
+                signal.alarm(0)
+                signal.signal(signal.SIGALRM, handler_old)
+        DeBug_List = Result_List[-1]
+        if (self.timeout is not None and not Use_Alarm 
+                and isinstance(DeBug_List, list) and len(DeBug_List)
+                and isinstance(DeBug_List[-1], str)):
+            DeBug_List[-1] += "; no SIGALRM outside the main thread, deadline only checked between steps"
+        return Result_List  
 ###################################################################
 #############    New functions from P3 - 221113        ############
 ###################################################################
 # DEFINE my callback:
 class RioCallback(pb.callbacks.Callback):
-    def __init__(self, logfile=None):
+    def __init__(self, logfile=None, Deadline=None):
         self.logfile = logfile
         self.success  = True
+        self.Deadline = Deadline    # time.time() to stop at, see TimeoutInline
         if logfile is None:
             # Use pybamm's logger, which prints to command line
             self.logger = pb.logger
@@ -67,6 +114,13 @@ class RioCallback(pb.callbacks.Callback):
         self.success  = False
     def on_experiment_infeasible(self, logs):
         self.success  = False
+    def Check_Deadline(self):
+        if self.Deadline is not None and time.time() > self.Deadline:
+            raise TimeoutError
+    def on_cycle_start(self, logs):
+        self.Check_Deadline()
+    def on_step_start(self, logs):
+        self.Check_Deadline()
 
 class Experiment_error_infeasible(ValueError):
     pass
@@ -423,6 +477,30 @@ def Cal_new_con_Update(Sol,Para):   # subscript r means the reservoir
     #############################################################################################################################  
     ###################       Step-4 Update parameters here        ##############################################################
     #############################################################################################################################
+    Para = Update_Para_Dryout(Para, Data_Pack, c_EC_JR_old)
+    return Data_Pack,Para
+
+# parameters changed by Update_Para_Dryout, what a checkpoint keeps of them
+Keys_Para_Dryout = [
+    'Bulk solvent concentration [mol.m-3]',
+    'EC initial concentration in electrolyte [mol.m-3]',
+    'Ratio of Li-ion concentration change in electrolyte consider solvent consumption',
+    'Current total electrolyte volume in whole cell [m3]',
+    'Current total electrolyte volume in jelly roll [m3]',
+    'Ratio of electrolyte dry out in jelly roll',
+    'Electrode width [m]',
+    'Current solvent concentration in the reservoir [mol.m-3]',
+    'Current electrolyte concentration in the reservoir [mol.m-3]',
+]
+def Get_Para_Dryout(Para):
+    return {
+        key: float(Para[key]) for key in Keys_Para_Dryout 
+        if key in Para.keys() and isinstance(Para[key], (int, float, np.number))}
+
+def Update_Para_Dryout(Para, Data_Pack, c_EC_JR_old):
+    [Vol_Elely_Tot_new, Vol_Elely_JR_new, c_e_r_new, c_EC_r_new,
+        Ratio_Dryout, Ratio_CeEC_JR, Ratio_CeLi_JR, Width_new] = [
+        Data_Pack[i] for i in [5,6,9,10,11,12,13,14]]
     Para.update(   
         {'Bulk solvent concentration [mol.m-3]':  
          c_EC_JR_old * Ratio_CeEC_JR  })
@@ -448,6 +526,76 @@ def Cal_new_con_Update(Sol,Para):   # subscript r means the reservoir
     Para.update(   
         {'Current electrolyte concentration in the reservoir [mol.m-3]':c_e_r_new}, 
         check_already_exists=False)             
+    return Para
+
+# Same Data_Pack and Para update as Cal_new_con_Update, but 
+# read from the dry-out states solved inside the model (Add_Dryout_States);
+# the Li+ mixing is already done in the model so Ratio_CeLi_JR stays 1. 
+# The states are carried over segments, so take differences over the run
+def Cal_new_con_Update_ODE(Sol,Para):
+    try:
+        Ratio_all = Sol["Ratio of electrolyte dry out in jelly roll"].entries
+    except KeyError: # e.g. break-in, which is not run with the dry-out states
+        return Cal_new_con_Update(Sol,Para)
+    Ratio_Dryout = Ratio_all[-1] / Ratio_all[0]  # of this run, as Cal_new_con_Update
+    L_p   =Para["Positive electrode thickness [m]"]
+    L_n   =Para["Negative electrode thickness [m]"]
+    L_s   =Para["Separator thickness [m]"]
+    L_y   =Para["Electrode width [m]"]
+    L_z   =Para["Electrode height [m]"]
+    c_EC_JR_old =Para["Bulk solvent concentration [mol.m-3]"]
+    Vol_Elely_Tot_old = Para["Current total electrolyte volume in whole cell [m3]"] 
+    Vol_Elely_JR_old  = Para["Current total electrolyte volume in jelly roll [m3]"] 
+    LLINegSEI = (
+        Sol["Loss of lithium to SEI [mol]"].entries[-1] 
+        - Sol["Loss of lithium to SEI [mol]"].entries[0] )
+    Vol_Pore_tot_old = (
+        Sol["X-averaged negative electrode porosity"].entries[0]*L_n
+        + Sol["X-averaged separator porosity"].entries[0]*L_s
+        + Sol["X-averaged positive electrode porosity"].entries[0]*L_p ) * L_y*L_z
+    Width_new     = Ratio_Dryout * L_y
+    Vol_Pore_tot_new = (
+        Sol["X-averaged negative electrode porosity"].entries[-1]*L_n
+        + Sol["X-averaged separator porosity"].entries[-1]*L_s
+        + Sol["X-averaged positive electrode porosity"].entries[-1]*L_p ) * Width_new*L_z
+    Vol_EC_consumed  = (
+        Sol["EC consumed volume [m3]"].entries[-1] 
+        - Sol["EC consumed volume [m3]"].entries[0] )
+    Vol_Elely_JR_new = Sol["Jelly roll electrolyte volume [m3]"].entries[-1]
+    Vol_Elely_r = Sol["Reservoir electrolyte volume [m3]"].entries
+    ECMol_r     = Sol["Reservoir EC amount [mol]"].entries
+    LiMol_r     = Sol["Reservoir lithium-ion amount [mol]"].entries
+    Vol_Elely_Tot_new = Vol_Elely_JR_new + Vol_Elely_r[-1]
+    Vol_Pore_decrease = Vol_Elely_JR_old  - Vol_Pore_tot_new
+    Vol_Elely_need    = Vol_EC_consumed - Vol_Pore_decrease
+    Vol_Elely_add     = max(Vol_Elely_r[0] - Vol_Elely_r[-1], 0.0)
+    Test_V  = 0.5*LLINegSEI*Para["Outer SEI partial molar volume [m3.mol-1]"] - Vol_Pore_decrease
+    Test_V2 = (Vol_Pore_tot_old - Vol_Elely_JR_old) / Vol_Elely_JR_old * 100
+    if Vol_Elely_r[-1] > 1e-3*Vol_Elely_Tot_old:
+        c_e_r_new  = LiMol_r[-1] / Vol_Elely_r[-1]
+        c_EC_r_new = ECMol_r[-1] / Vol_Elely_r[-1]
+    else:   # reservoir is empty, keep the last concentrations
+        c_e_r_new  = Para["Current electrolyte concentration in the reservoir [mol.m-3]"]
+        c_EC_r_new = Para["Current solvent concentration in the reservoir [mol.m-3]"]
+    TotECMol_JR   = Vol_Elely_JR_old*c_EC_JR_old - LLINegSEI + (ECMol_r[0]-ECMol_r[-1])
+    Ratio_CeEC_JR = TotECMol_JR / Vol_Elely_JR_new / c_EC_JR_old
+    Ratio_CeLi_JR = 1.0
+    Data_Pack   = [
+        Vol_EC_consumed, 
+        Vol_Elely_need, 
+        Test_V, 
+        Test_V2, 
+        Vol_Elely_add, 
+        Vol_Elely_Tot_new, 
+        Vol_Elely_JR_new, 
+        Vol_Pore_tot_new, 
+        Vol_Pore_decrease, 
+        c_e_r_new, c_EC_r_new,
+        Ratio_Dryout, Ratio_CeEC_JR, 
+        Ratio_CeLi_JR,
+        Width_new, 
+        ]
+    Para = Update_Para_Dryout(Para, Data_Pack, c_EC_JR_old)
     return Data_Pack,Para
 
 def Get_Last_state(Model, Sol):
@@ -459,15 +607,16 @@ def Get_Last_state(Model, Sol):
         list_short.append(var._name)
     # delete Porosity times concentration and Electrolyte potential then add back
     list_short.remove("Porosity times concentration [mol.m-3]");
-    list_short.remove("Electrolyte potential [V]");
     list_short.extend(
         ("Negative electrode porosity times concentration [mol.m-3]",
         "Separator porosity times concentration [mol.m-3]",
-        "Positive electrode porosity times concentration [mol.m-3]",   
-
-        "Negative electrolyte potential [V]",
-        "Separator electrolyte potential [V]",
-        "Positive electrolyte potential [V]",))
+        "Positive electrode porosity times concentration [mol.m-3]",))
+    if "Electrolyte potential [V]" in list_short: # not a state of SPMe
+        list_short.remove("Electrolyte potential [V]");
+        list_short.extend(
+            ("Negative electrolyte potential [V]",
+            "Separator electrolyte potential [V]",
+            "Positive electrolyte potential [V]",))
     for list_short_i in list_short:
         dict_short.update( { list_short_i : Sol.last_state[list_short_i].data  } )
     return list_short,dict_short
@@ -476,7 +625,7 @@ def Get_Last_state(Model, Sol):
 # Define a function to calculate based on previous solution
 def Run_Model_Base_On_Last_Solution( 
     Model  , Sol , Para_update, ModelExperiment, 
-    Update_Cycles,Temper_i ,mesh_list,submesh_strech):
+    Update_Cycles,Temper_i ,mesh_list,submesh_strech, Deadline=None):
     # Use Sulzer's method: inplace = false
     # Important line: define new model based on previous solution
     Ratio_CeLi = Para_update[
@@ -517,7 +666,7 @@ def Run_Model_Base_On_Last_Solution(
             submesh_params={"side": "right", "stretch": int(submesh_strech)})
         submesh_types["negative particle"] = particle_mesh
         submesh_types["positive particle"] = particle_mesh 
-    Call_Age = RioCallback()  # define callback
+    Call_Age = RioCallback(Deadline=Deadline)  # define callback
     
     # update 231208 - try 3 times until give up 
     i_run_try = 0
@@ -579,48 +728,17 @@ def Run_Model_Base_On_Last_Solution(
             DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
         else:
             i_run_try += 1
-            # add 230221 - update 230317 try to access Throughput capacity more than once
-            i_try = 0
-            while i_try<3:
-                try:
-                    getSth2 = Sol_new['Throughput capacity [A.h]'].entries[-1]
-                except:
-                    i_try += 1
-                    print(f"Fail to read Throughput capacity for the {i_try}th time")
-                else:
-                    break
             # update 240110
             if isinstance(Sol, pb.solvers.solution.Solution):
-                i_try = 0
-                while i_try<3:
-                    try:
-                        getSth = Sol['Throughput capacity [A.h]'].entries[-1]
-                    except:
-                        i_try += 1
-                        print(f"Fail to read Throughput capacity for the {i_try}th time")
-                    else:
-                        break
+                getSth = Get_Throughput_Last(Sol)
             elif isinstance(Sol, list):
                 print("Must be the first run after restart, already have getSth")
             else:
                 print("!! Big problem, Sol here is neither solution or list")
             # update 23-11-16 change method to get throughput capacity:
             # # (1) add old ones, as before; (2): change values of the last one
-            Sol_new['Throughput capacity [A.h]'].entries += getSth
+            Sol_new = Update_Throughput_AGE(Sol_new,getSth,Update_Cycles)
             cyc_number = len(Sol_new.cycles)
-            if not Update_Cycles == 1: # the solution is imcomplete in this case
-                thr_1st = np.trapz(
-                    abs(Sol_new.cycles[0]["Current [A]"].entries), 
-                    Sol_new.cycles[0]["Time [h]"].entries) # in A.h
-                thr_end = np.trapz(
-                    abs(Sol_new.cycles[-1]["Current [A]"].entries), 
-                    Sol_new.cycles[-1]["Time [h]"].entries) # in A.h
-                thr_tot = (thr_1st+thr_end) / 2 * cyc_number
-            else:
-                thr_tot = abs(
-                    Sol_new['Throughput capacity [A.h]'].entries[-1] - 
-                    Sol_new['Throughput capacity [A.h]'].entries[0]  )
-            Sol_new['Throughput capacity [A.h]'].entries[-1] = getSth + thr_tot # only the last one is true
             DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
             print(f"Succeed to run the ageing set for {cyc_number} cycles the {i_run_try}th time")
             break # terminate the loop of trying to solve if you can get here. 
@@ -644,14 +762,22 @@ def Get_ThrCap(sol_PRT):
 
 def Run_Model_Base_On_Last_Solution_RPT( 
     Model  , Sol,  Para_update, 
-    ModelExperiment ,Update_Cycles, Temper_i,mesh_list,submesh_strech):
+    ModelExperiment ,Update_Cycles, Temper_i,mesh_list,submesh_strech, Deadline=None):
     # Use Sulzer's method: inplace = false
     Ratio_CeLi = Para_update["Ratio of Li-ion concentration change in electrolyte consider solvent consumption"]
     # print("Model is now using average EC Concentration of:",Para_update['Bulk solvent concentration [mol.m-3]'])
     # print("Ratio of electrolyte dry out in jelly roll is:",Para_update['Ratio of electrolyte dry out in jelly roll'])
     # print("Model is now using an electrode width of:",Para_update['Electrode width [m]'])
     # Important line: define new model based on previous solution
-    list_short,dict_short = Get_Last_state(Model, Sol)
+    if isinstance(Sol, pb.solvers.solution.Solution):
+        list_short,dict_short = Get_Last_state(Model, Sol)
+    elif isinstance(Sol, list): # first run after restart
+        [dict_short, getSth] = Sol
+        list_short = []
+        for var, equation in Model.initial_conditions.items():
+            list_short.append(var._name)
+    else:
+        print("!! Big problem, Sol here is neither solution or list")
     dict_short["Negative electrode porosity times concentration [mol.m-3]"] = (
         dict_short["Negative electrode porosity times concentration [mol.m-3]"] * Ratio_CeLi )# important: update sol here!
     dict_short["Separator porosity times concentration [mol.m-3]"] = (
@@ -685,7 +811,7 @@ def Run_Model_Base_On_Last_Solution_RPT(
         var_pts = var_pts,
         submesh_types=submesh_types
     )
-    Call_RPT = RioCallback()  # define callback
+    Call_RPT = RioCallback(Deadline=Deadline)  # define callback
     # update 231208 - try 3 times until give up 
     i_run_try = 0
     while i_run_try<3:
@@ -719,28 +845,9 @@ def Run_Model_Base_On_Last_Solution_RPT(
         else:
             # add 230221 - update 230317 try to access Throughput capacity more than once
             i_run_try += 1
-            i_try = 0
-            while i_try<3:
-                try:
-                    getSth2 = Sol_new['Throughput capacity [A.h]'].entries[-1]
-                except:
-                    i_try += 1
-                    print(f"Fail to read Throughput capacity for the {i_try}th time")
-                else:
-                    break
-            i_try = 0
-            while i_try<3:
-                try:
-                    getSth = Sol['Throughput capacity [A.h]'].entries[-1]
-                except:
-                    i_try += 1
-                    print(f"Fail to read Throughput capacity for the {i_try}th time")
-                else:
-                    break
-            Sol_new['Throughput capacity [A.h]'].entries += getSth
-            # update 23-11-17 change method to get throughput capacity to avioid problems of empty solution:
-            thr_tot = Get_ThrCap(Sol_new)
-            Sol_new['Throughput capacity [A.h]'].entries[-1] = getSth + thr_tot # only the last one is true
+            if isinstance(Sol, pb.solvers.solution.Solution):
+                getSth = Get_Throughput_Last(Sol)
+            Sol_new = Update_Throughput_RPT(Sol_new,getSth)
             DeBug_List = "Empty"
             print(f"Succeed to run RPT for the {i_run_try}th time")
             break # terminate the loop of trying to solve if you can get here. 
@@ -748,7 +855,1540 @@ def Run_Model_Base_On_Last_Solution_RPT(
     Result_List_RPT = [Model_new, Sol_new,Call_RPT,DeBug_List]
     return Result_List_RPT
 
+###################################################################
+#############    Build-once engine                     ############
+###################################################################
+# speed-up switches for Run_P2_Excel, all off by default so that the 
+# original (rebuild every segment) behaviour is kept unless asked for
+Options_Speed_Default = {
+    "Engine": False,    # build/discretise the model once per scan
+    "Cache": False,     # keep built engines for later scans in this process
+    "Timeout_Inline": False,  # enforce Timelimit in this process, not a fork
+    "Worker": False,    # one long-lived process per scan, needs "Engine"
+                            # and not Return_Sol
+    "Jump": False,      # cycle jumping in ageing sets, needs "Engine"
+    "Jump_Sample": 5,   # cycles simulated between two jumps
+    "Jump_Tol": 1e-3,   # relative extrapolation error allowed per jump
+    "Adaptive": False,  # adaptive number of cycles per ageing set
+    "Adaptive_Tol_Dry": 0.01,  # relative change of electrolyte in JR per set
+    "Adaptive_Tol_LLI": 0.2,   # relative change of LLI rate between sets
+    "Dryout_ODE": False,    # solve dry-out inside the DFN (engine only)
+    "Timelimit_Predict": False, # per-segment Timelimit from the cost history
+    "Timelimit_Factor": 5,  # times the predicted segment time
+    "Abort_MPE": None,      # stop once the running error (%) is above this
+    "Abort_Min_RPT": 3,     # RPTs (incl. the one after break-in) before checking
+    "Model": "DFN",         # pybamm.lithium_ion model, "SPMe" for screening
+    "Mesh_Auto": False,     # pick the mesh from Mesh_Auto_List, see Select_Mesh
+    "Mesh_Auto_List": [     # x_n, x_s, x_p, r_n, r_p, coarse to fine
+        [5,5,5,10,10], [5,5,5,20,20], [5,5,5,30,30], [10,10,10,60,60]],
+    "Mesh_Auto_Tol": 2e-3,  # relative change of capacity, resistance, LLI
+    "Mesh_Auto_Cycles": 5,  # ageing cycles in the mesh study
+    "Result_Cache": False,  # reuse results of identical rows, see Get_Result_Key
+    "Store": "Files",       # "Files" (Excel, pkl, mat), "Parquet" (Store/) or "Both"
+    "Plot": "Inline",       # "Async" (background process), "Later" (only 
+                            # save the job, see Run_Plot_Jobs) or "None"
+    "Plot_Async_Max": 2,    # background plot processes at a time, see PlotProcs
+    "Lean": False,          # keep only a compact record of every finished
+                            # segment, see Get_Sol_Lean
+    "Spill": False,         # with Return_Sol (and not Lean), write the solutions 
+                            # to Sols/ of the output folder, see SolSpill
+    "GITT_Sparse": False,   # with R_from_GITT, 0.1 s output only where 
+                            # Get_0p1s_R0 needs it, see Initialize_exp_text
+    "GITT_Parallel": 0,     # with R_from_GITT, > 0: no GITT in the RPT, the 
+                            # pulses run on this many processes from C/10 
+                            # states, an approximation, see Get_GITT_Seeds
+}
+def Get_Options_Speed(Options_Speed):
+    Options_Speed_i = Options_Speed_Default.copy()
+    if isinstance(Options_Speed, dict):
+        for key in Options_Speed.keys():
+            if not key in Options_Speed_Default.keys():
+                print(f"!! Unknown speed option {key}, ignored")
+            else:
+                Options_Speed_i[key] = Options_Speed[key]
+    return Options_Speed_i
 
+def Get_Mesh_Settings(Model, mesh_list, submesh_strech):
+    var = pb.standard_spatial_vars  
+    var_pts = {
+        var.x_n: int(mesh_list[0]),  
+        var.x_s: int(mesh_list[1]),  
+        var.x_p: int(mesh_list[2]),  
+        var.r_n: int(mesh_list[3]),  
+        var.r_p: int(mesh_list[4]),  }
+    submesh_types = Model.default_submesh_types
+    if submesh_strech == "nan":
+        pass
+    else:
+        particle_mesh = pb.MeshGenerator(
+            pb.Exponential1DSubMesh, 
+            submesh_params={"side": "right", "stretch": int(submesh_strech)})
+        submesh_types["negative particle"] = particle_mesh
+        submesh_types["positive particle"] = particle_mesh 
+    return var_pts,submesh_types
+
+# parameters changed between ageing segments by Cal_new_con_Update 
+# (and the temperature changed between ageing and RPT), 
+# these become input parameters so that the model is only built once
+Keys_Engine_Input = [
+    "Electrode width [m]",
+    "Bulk solvent concentration [mol.m-3]",
+    "EC initial concentration in electrolyte [mol.m-3]",
+    "Ambient temperature [K]",
+]
+Keys_PoreCon = [
+    "Negative electrode porosity times concentration [mol.m-3]",
+    "Separator porosity times concentration [mol.m-3]",
+    "Positive electrode porosity times concentration [mol.m-3]",
+]
+# states whose names contain these are the slow ones for cycle jumping
+Keys_Jump_Slow = [
+    "SEI", "lithium plating", "dead lithium", "crack length",
+    "active material volume fraction", "Loss of lithium", "electrode porosity",
+    "EC consumed", "electrolyte volume", "Reservoir", "dry out",
+]
+Jump_Max_Change = 0.05  # largest relative change of a slow state per jump
+t_Jump_Gap = 1e-3   # s between the last simulated point and the jumped state
+
+# A solution with only the state at time index Index of 
+# Sol, with its model and inputs (pybamm's last_state drops the inputs)
+def Get_Sol_At(Sol, Index):
+    n_ts = np.cumsum([len(t) for t in Sol.all_ts])
+    Index = Index % n_ts[-1]
+    j = int(np.searchsorted(n_ts, Index, side="right"))
+    k = Index - (n_ts[j] - len(Sol.all_ts[j]))
+    return pb.Solution(   # copies, so Sol can be freed
+        [np.array(Sol.all_ts[j][k:k+1])], [np.array(Sol.all_ys[j][:, k:k+1])], 
+        [Sol.all_models[j]], [Sol.all_inputs[j]], None, None, "final time")
+
+# values of keys at the time indices Indices only (last axis), so the 
+# cost does not grow with the length of Sol. Variables integrated over 
+# time by the solver (e.g. Discharge capacity) need all points
+def Get_Var_At(Sol, keys, Indices=[0,-1], Sols_At=None):
+    if Sols_At is None:
+        Sols_At = {}    # point solutions, can be shared between calls
+    Models = list({id(Model): Model for Model in Sol.all_models}.values())
+    Values = {}
+    for key in keys:
+        if any([
+                Model.variables_and_events[key].has_symbol_of_classes(
+                    pb.ExplicitTimeIntegral) for Model in Models]):
+            entries = Sol[key].entries
+            Values[key] = np.stack([entries[...,i] for i in Indices], axis=-1)
+            continue
+        for i in Indices:
+            if not i in Sols_At:
+                Sols_At[i] = Get_Sol_At(Sol, i)
+        Values[key] = np.stack(
+            [Sols_At[i][key].entries[...,0] for i in Indices], axis=-1)
+    return Values
+
+# The true throughput at the end of a segment is kept as 
+# Sol.Thr_Last instead of shifting the whole processed variable, which 
+# forced pybamm to evaluate it over every time point of the segment
+def Get_Throughput_Last(Sol):
+    if hasattr(Sol, "Thr_Last"):
+        return Sol.Thr_Last
+    # add 230221 - update 230317 try to access Throughput capacity more than once
+    i_try = 0;  getSth = np.nan
+    while i_try<3:
+        try:
+            getSth = Get_Var_At(Sol, ['Throughput capacity [A.h]'], [-1])[
+                'Throughput capacity [A.h]'][0]
+        except TimeoutError:    # deadline of TimeoutInline, not a read error
+            raise
+        except Exception as e:
+            i_try += 1
+            print(f"Fail to read Throughput capacity for the {i_try}th time due to {e}")
+        else:
+            break
+    return getSth
+
+# same as the ageing part of Run_Model_Base_On_Last_Solution
+def Update_Throughput_AGE(Sol_new,getSth,Update_Cycles,Cycs_Jumped=0):
+    cyc_number = len(Sol_new.cycles) + Cycs_Jumped
+    if not Update_Cycles == 1: # the solution is imcomplete in this case
+        thr_1st = np.trapz(
+            abs(Sol_new.cycles[0]["Current [A]"].entries), 
+            Sol_new.cycles[0]["Time [h]"].entries) # in A.h
+        thr_end = np.trapz(
+            abs(Sol_new.cycles[-1]["Current [A]"].entries), 
+            Sol_new.cycles[-1]["Time [h]"].entries) # in A.h
+        thr_tot = (thr_1st+thr_end) / 2 * cyc_number
+    else:
+        thr_tot = abs(np.diff(Get_Var_At(
+            Sol_new, ['Throughput capacity [A.h]'])['Throughput capacity [A.h]'])[0])
+    Sol_new.Thr_Last = getSth + thr_tot # only the last one is true
+    return Sol_new
+
+# same for the RPT, from the current of every (non-empty) step
+def Update_Throughput_RPT(Sol_new,getSth):
+    # update 23-11-17 change method to get throughput capacity to avioid problems of empty solution:
+    thr_tot = Get_ThrCap(Sol_new)
+    Sol_new.Thr_Last = getSth + thr_tot # only the last one is true
+    return Sol_new
+
+# Built simulations (with their compiled integrators) 
+# are kept for the life of the process, so later RPTs and later scans 
+# in the same worker skip building and compiling
+Engine_Cache = {}
+Engine_Cache_Max = 6
+def Get_Value_Str(value):
+    if callable(value):  # also values captured by closures and defaults
+        str_fun = f"{getattr(value,'__module__','')}.{getattr(value,'__qualname__',value)}"
+        Captured = list(getattr(value, "__defaults__", None) or [])
+        for cell in (getattr(value, "__closure__", None) or []):
+            try:
+                Captured.append(cell.cell_contents)
+            except ValueError:  # empty cell
+                pass
+        if len(Captured):
+            str_fun += Get_Value_Str(Captured)
+        return str_fun
+    elif isinstance(value, np.ndarray):
+        return hashlib.md5(value.tobytes()).hexdigest()
+    elif isinstance(value, (tuple,list)):
+        return "(" + ",".join([Get_Value_Str(value_i) for value_i in value]) + ")"
+    else:
+        return str(value)
+def Get_Engine_Key(Model_0,Para_sim,Experiment,mesh_list,submesh_strech):
+    str_para = []
+    for key in sorted(Para_sim.keys()):
+        str_para.append(f"{key}={Get_Value_Str(Para_sim[key])}")
+    str_para = hashlib.md5("\n".join(str_para).encode()).hexdigest()
+    return (
+        Model_0.name, str(Model_0.options), str(mesh_list), str(submesh_strech),
+        str(Experiment.args), str_para)
+
+# Numeric scan columns that are pybamm parameters can also be inputs, 
+# so that scans which differ only in these share the cached simulations
+def Get_Keys_Scan(Para_dict_i, Para_0):
+    Keys_Scan = []
+    for key,value in Para_dict_i.items():
+        if (isinstance(value,(int,float)) and not isinstance(value,bool) 
+                and key in Para_0.keys() 
+                and not key in Keys_Engine_Input + Keys_Dryout_Input):
+            Keys_Scan.append(key)
+    return Keys_Scan
+
+# Positions, scale and reference of every state in a built 
+# model, by variable name, used to carry the raw state vector across models
+def Get_State_Index(Model):
+    State_Index = {}
+    for var, slices in Model.y_slices.items():
+        if isinstance(var, pb.ConcatenationVariable):
+            continue    # children are listed on their own
+        index = np.concatenate(
+            [np.arange(slice_i.start, slice_i.stop) for slice_i in slices])
+        State_Index[var.name] = [
+            index, 
+            np.asarray(var.scale.evaluate()).flatten(), 
+            np.asarray(var.reference.evaluate()).flatten()]
+    return State_Index
+
+# y_new = (y_old[index_old]*scale_old + reference_old)/scale_new ..., 
+# with the porosity times concentration entries marked for Ratio_CeLi;
+# return None if some state of Model_new can't be found in Model_old
+def Get_State_Map(Model_old, Model_new):
+    try:
+        Index_old = Get_State_Index(Model_old)
+        Index_new = Get_State_Index(Model_new)
+    except TimeoutError:
+        raise
+    except Exception as e: # scale depends on inputs etc.
+        print(f"Can't map the state vector due to {e}")
+        return None
+    n_new = Model_new.len_rhs_and_alg
+    index_old = np.zeros(n_new, dtype=int); covered = np.zeros(n_new, dtype=bool)
+    scale_old = np.ones(n_new);  refer_old = np.zeros(n_new)
+    scale_new = np.ones(n_new);  refer_new = np.zeros(n_new)
+    mask_PoreCon = np.zeros(n_new, dtype=bool)
+    for name, [index, scale, refer] in Index_new.items():
+        if not name in Index_old.keys():
+            if name in Keys_Dryout_States:  # see Reset_Dryout_States
+                covered[index] = True
+                continue
+            return None
+        [index_i, scale_i, refer_i] = Index_old[name]
+        if not len(index_i) == len(index):
+            return None
+        index_old[index] = index_i; covered[index] = True
+        scale_old[index] = scale_i; refer_old[index] = refer_i
+        scale_new[index] = scale;   refer_new[index] = refer
+        if name in Keys_PoreCon:
+            mask_PoreCon[index] = True
+    if not covered.all():
+        return None
+    return [index_old, scale_old, refer_old, scale_new, refer_new, mask_PoreCon]
+
+# continuation from the raw final state vector of Sol: no symbolic work, 
+# only one gather and the Ratio_CeLi rescale; State_Maps caches the maps
+def Get_y0_From_Last(Sol, Model_new, Ratio_CeLi, State_Maps, y_last=None):
+    Model_old = Sol.all_models[-1]
+    if not (Model_old,Model_new) in State_Maps.keys():
+        State_Maps[(Model_old,Model_new)] = Get_State_Map(Model_old, Model_new)
+    State_Map = State_Maps[(Model_old,Model_new)]
+    if State_Map is None:
+        return None
+    [index_old, scale_old, refer_old, scale_new, refer_new, mask_PoreCon] = State_Map
+    if y_last is None:  # otherwise a state given in the layout of Model_old
+        y_last = np.asarray(Sol.all_ys[-1])[:,-1]
+    y_phy  = y_last[index_old] * scale_old + refer_old
+    y_phy[mask_PoreCon] = y_phy[mask_PoreCon] * Ratio_CeLi # important: update sol here!
+    y0 = (y_phy - refer_new) / scale_new
+    return y0
+
+# Electrolyte dry-out solved inside the DFN. Reservoir, 
+# jelly roll electrolyte and dry-out ratio become states, so the wetted 
+# width and the Li+ mixing follow continuously instead of only being 
+# updated by Cal_new_con_Update between segments. Only for the engine: 
+# the dry-out ratio is the wetted part of "Initial Electrode width [m]", 
+# so the width the DFN sees is that input times the ratio. The states 
+# are carried from one segment to the next; they only start from the 
+# parameters (Cal_new_con_Update_ODE) after a model without them, e.g. 
+# break-in or a restart (see ScanEngine.Reset_Dryout_States). The 
+# solvent concentration in the jelly roll is still updated per segment
+Keys_Dryout_Input = [
+    "Initial Electrode width [m]",
+    "Current total electrolyte volume in whole cell [m3]",
+    "Current total electrolyte volume in jelly roll [m3]",
+    "Current electrolyte concentration in the reservoir [mol.m-3]",
+    "Current solvent concentration in the reservoir [mol.m-3]",
+]
+Keys_Dryout_States = [
+    "Jelly roll electrolyte volume [m3]",
+    "Reservoir electrolyte volume [m3]",
+    "Reservoir lithium-ion amount [mol]",
+    "Reservoir EC amount [mol]",
+    "Ratio of electrolyte dry out in jelly roll",
+]
+
+# rates per volume of the negative electrode from the rhs of the SEI 
+# thickness and plating states, as pybamm defines the quantities: 
+# [pore volume, from eps = eps_init - a*L_tot of the reaction-driven 
+# porosity; lithium lost to SEI and SEI on cracks, from n = a*L/V_bar]. 
+# The slow change of a and of the roughness ratio is neglected
+def Get_Side_Reaction_Rates(Model):
+    a = Model.variables["Negative electrode surface area to volume ratio [m-1]"]
+    roughness = Model.variables["Negative electrode roughness ratio"]
+    prim = Model.param.n.prim
+    c_to_L = Model.param.V_bar_Li / prim.a_typ
+    Rate_L = []; Rate_n = []
+    for var, rhs in Model.rhs.items():
+        name = var.name.replace("X-averaged negative", "Negative")
+        if not ("SEI" in name or "lithium" in name):
+            continue
+        if not rhs.domain == ["negative electrode"]:
+            rhs = pb.PrimaryBroadcast(rhs, "negative electrode")
+        factor = roughness - 1 if "on cracks" in name else 1
+        if name in [
+                "Negative inner SEI thickness [m]", 
+                "Negative inner SEI on cracks thickness [m]"]:
+            Rate_L.append(factor * rhs); Rate_n.append(factor * rhs / prim.V_bar_inner)
+        elif name in [
+                "Negative outer SEI thickness [m]", 
+                "Negative outer SEI on cracks thickness [m]"]:
+            Rate_L.append(factor * rhs); Rate_n.append(factor * rhs / prim.V_bar_outer)
+        elif name in [
+                "Negative lithium plating concentration [mol.m-3]", 
+                "Negative dead lithium concentration [mol.m-3]"]:
+            Rate_L.append(c_to_L * rhs)
+    Rate_Pore = pb.Scalar(0); Rate_LLI = pb.Scalar(0)
+    if len(Rate_L) > 0 and not (
+            Model.options["SEI porosity change"] == "false" and 
+            Model.options["lithium plating porosity change"] == "false"):
+        Rate_Pore = - pb.x_average(a * sum(Rate_L[1:], Rate_L[0]))
+    if len(Rate_n) > 0:
+        Rate_LLI = prim.z_sei * pb.x_average(a * sum(Rate_n[1:], Rate_n[0]))
+    return [Rate_Pore, Rate_LLI]
+
+def Add_Dryout_States(Model):
+    L_n = pb.Parameter("Negative electrode thickness [m]")
+    L_s = pb.Parameter("Separator thickness [m]")
+    L_p = pb.Parameter("Positive electrode thickness [m]")
+    L_y = pb.Parameter("Electrode width [m]")   # wetted width
+    L_z = pb.Parameter("Electrode height [m]")
+    L_y_0 = pb.InputParameter("Electrode width [m]") # width at segment start
+    L_y_ini = pb.InputParameter("Initial Electrode width [m]")
+    VmolEC  = pb.Parameter("EC partial molar volume [m3.mol-1]")
+    c_EC_JR = pb.Parameter("Bulk solvent concentration [mol.m-3]")
+    Vol_Tot_0 = pb.Parameter("Current total electrolyte volume in whole cell [m3]")
+    Vol_JR_0  = pb.Parameter("Current total electrolyte volume in jelly roll [m3]")
+    c_e_r_0   = pb.Parameter("Current electrolyte concentration in the reservoir [mol.m-3]")
+    c_EC_r_0  = pb.Parameter("Current solvent concentration in the reservoir [mol.m-3]")
+    [Vol_JR, Vol_r, LiMol_r, ECMol_r, Ratio_Dryout] = [
+        pb.Variable(name, scale=scale) for name,scale in zip(
+            Keys_Dryout_States, [1e-6, 1e-6, 1e-3, 1e-3, 1])]
+    # EC:lithium = 1:1 as in Cal_new_con_Update, SEI on cracks included
+    [Rate_Pore, Rate_LLI] = Get_Side_Reaction_Rates(Model)
+    Rate_EC = Rate_LLI * L_n * L_y * L_z * VmolEC
+    # the rate form of Cal_new_con_Update: the jelly roll needs the EC 
+    # consumed plus the pore volume gained (negative if pores shrink). 
+    # The reservoir gives what is needed and takes what is squeezed out; 
+    # what it can't give dries the jelly roll, at the pore volume of the 
+    # wetted width. Below Vol_r_min the reservoir gives less and less
+    Need = Rate_EC + Rate_Pore * L_n * L_y * L_z
+    Vol_r_min = 1e-3 * Vol_Tot_0
+    Flow = pb.minimum(Need, 0) + pb.maximum(Need, 0) * pb.maximum(
+        pb.minimum(Vol_r / Vol_r_min, 1), 0)
+    Dry = Need - Flow
+    c_e_r  = LiMol_r / pb.maximum(Vol_r, Vol_r_min)
+    c_EC_r = ECMol_r / pb.maximum(Vol_r, Vol_r_min)
+    c_e_JR = Model.variables["X-averaged electrolyte concentration [mol.m-3]"]
+    Flow_Li = pb.maximum(Flow, 0) * c_e_r  + pb.minimum(Flow, 0) * c_e_JR
+    Flow_EC = pb.maximum(Flow, 0) * c_EC_r + pb.minimum(Flow, 0) * c_EC_JR
+    Model.rhs.update({
+        Vol_JR: Flow - Rate_EC,
+        Vol_r: - Flow,
+        LiMol_r: - Flow_Li,
+        ECMol_r: - Flow_EC,
+        Ratio_Dryout: - Ratio_Dryout * Dry / Vol_JR, })
+    Model.initial_conditions.update({
+        Vol_JR: Vol_JR_0,
+        Vol_r: Vol_Tot_0 - Vol_JR_0,
+        LiMol_r: (Vol_Tot_0 - Vol_JR_0) * c_e_r_0,
+        ECMol_r: (Vol_Tot_0 - Vol_JR_0) * c_EC_r_0,
+        Ratio_Dryout: L_y_0 / L_y_ini, })
+    # Li+ from the reservoir spreads evenly over the pore volume, which 
+    # is Vol_JR, and Li+ of the dried part is kept in the wetted part
+    eps = Model.variables["Porosity"]
+    for var in Model.rhs.keys():
+        if var.name == "Porosity times concentration [mol.m-3]":
+            Model.rhs[var] = Model.rhs[var] + (
+                var * Dry + eps * Flow_Li) / Vol_JR
+    Model.variables.update({
+        name: var for name,var in zip(
+            Keys_Dryout_States, 
+            [Vol_JR, Vol_r, LiMol_r, ECMol_r, Ratio_Dryout])})
+    # not a state of its own: pybamm would turn it into a time integral 
+    # over the output points, as nothing depends on it
+    Model.variables.update({
+        "EC consumed volume [m3]": Vol_Tot_0 - Vol_JR - Vol_r,
+        "Reservoir electrolyte concentration [mol.m-3]": c_e_r,
+        "Reservoir EC concentration [mol.m-3]": c_EC_r,
+        "Total electrolyte volume in whole cell [m3]": Vol_JR + Vol_r, })
+    return Model
+
+def Get_Dryout_Ratio(Model):
+    for var in Model.rhs.keys():
+        if var.name == "Ratio of electrolyte dry out in jelly roll":
+            return var
+    return None
+
+# Build the DFN once for ageing and once for RPT, then only change 
+# inputs and initial states between segments. Run_AGE and Run_RPT take 
+# the same arguments and return the same list as 
+# Run_Model_Base_On_Last_Solution(_RPT), so they can be swapped in 
+class ScanEngine(object):
+    def __init__(
+            self, Model_0, Para_0, Experiment_Long, Experiment_RPT,
+            mesh_list, submesh_strech, Keys_Scan=[], Model_Sim=None):
+        self.Model_0 = Model_0
+        # model actually solved, e.g. with Add_Dryout_States
+        self.Model_Sim = Model_0 if Model_Sim is None else Model_Sim
+        Ratio_Dryout = Get_Dryout_Ratio(self.Model_Sim)
+        self.Dryout_ODE = Ratio_Dryout is not None
+        Keys_Dryout_i = Keys_Dryout_Input if self.Dryout_ODE else []
+        self.Keys_Input = Keys_Engine_Input[:-1] + list(Keys_Scan) + Keys_Dryout_i
+        self.Para_sim = Para_0.copy()
+        self.Para_sim.update(
+            {key: "[input]" for key in Keys_Engine_Input + list(Keys_Scan) + Keys_Dryout_i},
+            check_already_exists=False)
+        if self.Dryout_ODE:   # the DFN only sees the wetted width
+            self.Para_sim.update({
+                "Electrode width [m]": 
+                pb.InputParameter("Initial Electrode width [m]") * Ratio_Dryout})
+        self.Experiment_Long = Experiment_Long
+        self.Experiment_RPT  = Experiment_RPT
+        self.mesh_list = mesh_list; self.submesh_strech = submesh_strech
+        self.var_pts,self.submesh_types = Get_Mesh_Settings(
+            Model_0, mesh_list, submesh_strech)
+        self.Sim_AGE = None; self.Sim_RPT = None
+        self.State_Maps = {}
+        self.Jump = None    # [Jump_Sample, Jump_Tol] to use Run_AGE_Jump
+        self.Sims_Cycles = {}; self.Jump_Masks = {}
+
+    def Get_Sim(self, Experiment):
+        Sim = pb.Simulation(
+            self.Model_Sim,
+            experiment = Experiment, 
+            parameter_values = self.Para_sim,
+            solver = pb.CasadiSolver(),
+            var_pts = self.var_pts,
+            submesh_types = self.submesh_types )
+        Sim.build_for_experiment()
+        return Sim
+
+    def Get_Sim_Cached(self, Experiment):
+        key = Get_Engine_Key(
+            self.Model_Sim, self.Para_sim, Experiment,
+            self.mesh_list, self.submesh_strech)
+        if key in Engine_Cache.keys():
+            Sim = Engine_Cache.pop(key)
+            print("Reuse built simulation from the engine cache")
+        else:
+            Sim = self.Get_Sim(Experiment)
+            while len(Engine_Cache) >= Engine_Cache_Max:
+                del Engine_Cache[next(iter(Engine_Cache))] # drop the oldest
+        Engine_Cache[key] = Sim  # most recently used goes to the end
+        return Sim
+
+    def Build(self, Use_Cache=False):
+        if Use_Cache:
+            self.Sim_AGE = self.Get_Sim_Cached(self.Experiment_Long)
+            self.Sim_RPT = self.Get_Sim_Cached(self.Experiment_RPT)
+        else:
+            self.Sim_AGE = self.Get_Sim(self.Experiment_Long)
+            self.Sim_RPT = self.Get_Sim(self.Experiment_RPT)
+        return self
+
+    def Get_Inputs(self, Para_update, Temper_i):
+        inputs = {}
+        for key in self.Keys_Input:
+            inputs[key] = Para_update[key]
+        inputs["Ambient temperature [K]"] = Temper_i
+        return inputs
+
+    def Get_First_Built(self, Sim):
+        step_0 = Sim.experiment.operating_conditions_steps[0]
+        Model_1st  = Sim.op_conds_to_built_models[step_0.basic_repr()]
+        return Model_1st
+
+    def Get_Seed(self, Sim, Sol, Para_update, inputs):
+        # single-point solution holding the rescaled last state, used as 
+        # starting_solution so that nothing is rebuilt
+        Ratio_CeLi = Para_update[
+            "Ratio of Li-ion concentration change in electrolyte consider solvent consumption"]
+        Model_1st = self.Get_First_Built(Sim)
+        inputs_1st = self.Get_Inputs_Built(Model_1st, inputs)
+        y0 = None;  Carry_Dryout = False
+        if isinstance(Sol, pb.solvers.solution.Solution):
+            y0 = Get_y0_From_Last(Sol, Model_1st, Ratio_CeLi, self.State_Maps)
+            dict_short = "Raw state vector"
+            Carry_Dryout = (
+                y0 is not None and 
+                Get_Dryout_Ratio(Sol.all_models[-1]) is not None)
+        if y0 is None:  # restart from dict_short, or states don't match
+            if isinstance(Sol, pb.solvers.solution.Solution):
+                _,dict_short = Get_Last_state(self.Model_0, Sol)
+            elif isinstance(Sol, list):
+                dict_short = Sol[0].copy()
+            else:
+                print("!! Big problem, Sol here is neither solution or list")
+            for key in Keys_PoreCon:
+                dict_short[key] = dict_short[key] * Ratio_CeLi # important: update sol here!
+            if self.Dryout_ODE: # not in Model_0, overwritten below
+                for key in Keys_Dryout_States:
+                    dict_short.setdefault(key, np.zeros(1))
+            _,ics = Model_1st.set_initial_conditions_from(
+                dict_short, return_type="ics")
+            y0 = ics.evaluate(0, inputs=inputs_1st).flatten()
+        if self.Dryout_ODE and not Carry_Dryout:
+            y0 = self.Reset_Dryout_States(Model_1st, y0, inputs_1st)
+        Sol_seed = self.Get_Point_Solution(0.0, y0, Model_1st, inputs_1st)
+        Sol_seed.cycles = []
+        Sol_seed.all_summary_variables = []
+        Sol_seed.all_first_states = []
+        return Sol_seed,dict_short
+
+    # the last solution has no dry-out states: start them from the 
+    # parameters, i.e. the current width and nothing consumed yet
+    def Reset_Dryout_States(self, Model_built, y0, inputs_built):
+        ics = Model_built.concatenated_initial_conditions.evaluate(
+            0, inputs=inputs_built).flatten()
+        y0 = np.array(y0, dtype=float)
+        for var, slices in Model_built.y_slices.items():
+            if var.name in Keys_Dryout_States:
+                for slice_i in slices:
+                    y0[slice_i] = ics[slice_i]
+        return y0
+
+    def Get_Inputs_Built(self, Model_built, inputs):
+        # keep only inputs really in the model, sorted as the solver does, 
+        # otherwise the variables cached in the model get mismatching shapes
+        inputs_all = {**inputs, "start time": 0.0}
+        Names_in = sorted([para.name for para in Model_built.input_parameters])
+        return {name: inputs_all[name] for name in Names_in}
+
+    def Get_Point_Solution(self, t, y, Model_built, inputs_built):
+        Sol_point = pb.Solution(
+            np.array([t]), y[:,np.newaxis], Model_built, inputs_built)
+        Sol_point.solve_time = pb.TimerTime(0); Sol_point.integration_time = pb.TimerTime(0)
+        return Sol_point
+
+    def Set_Fail_Early(self, Sim, Flag):
+        for solver in Sim.op_conds_to_built_solvers.values():
+            solver.return_solution_if_failed_early = Flag
+
+    def Run_AGE(
+            self, Model, Sol, Para_update, ModelExperiment, 
+            Update_Cycles, Temper_i, mesh_list, submesh_strech, Deadline=None):
+        Sim = self.Get_Sim_AGE(Update_Cycles)
+        inputs = self.Get_Inputs(Para_update, Temper_i)
+        Para_update.update(   {'Ambient temperature [K]':Temper_i });  
+        Sol_seed,dict_short = self.Get_Seed(Sim, Sol, Para_update, inputs)
+        Call_Age = RioCallback(Deadline=Deadline)  # define callback
+        # update 231208 - try 3 times until give up 
+        i_run_try = 0
+        str_err = "Initialize only"
+        while i_run_try<3:
+            try:
+                if i_run_try < 2:
+                    Sol_new = Sim.solve(
+                        calc_esoh=False,
+                        save_at_cycles = Update_Cycles,
+                        callbacks=Call_Age,
+                        starting_solution = Sol_seed,
+                        inputs = inputs)
+                    if Call_Age.success == False:
+                        raise Experiment_error_infeasible("Self detect")
+                else:   # i_run_try = 2, 
+                    self.Set_Fail_Early(Sim, True)
+                    try:
+                        Sol_new = Sim.solve(
+                            calc_esoh=False,
+                            callbacks=Call_Age,
+                            starting_solution = Sol_seed,
+                            inputs = inputs)
+                    finally:
+                        self.Set_Fail_Early(Sim, False)
+                    Succeed_AGE_cycs = len(Sol_new.cycles)
+                    if Succeed_AGE_cycs < Update_Cycles:
+                        str_err = f"Partially succeed to run the ageing set for {Succeed_AGE_cycs} cycles the {i_run_try+1}th time"
+                        print(str_err)
+                    else: 
+                        str_err = f"Fully succeed to run the ageing set for {Succeed_AGE_cycs} cycles the {i_run_try+1}th time"
+                        print(str_err)
+            except (
+                pb.expression_tree.exceptions.ModelError,
+                pb.expression_tree.exceptions.SolverError
+                ) as e:
+                i_run_try += 1
+                Sol_new = "Model error or solver error"
+                str_err = f"Fail to run the ageing set due to {Sol_new} for the {i_run_try}th time"
+                print(str_err)
+                DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
+            except Experiment_error_infeasible as custom_error:
+                i_run_try += 1
+                Sol_new = "Experiment error or infeasible"
+                str_err= f"{Sol_new}: {custom_error} for ageing set for the {i_run_try}th time"
+                print(str_err)
+                DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
+            else:
+                i_run_try += 1
+                # update 240110
+                if isinstance(Sol, pb.solvers.solution.Solution):
+                    getSth = Get_Throughput_Last(Sol)
+                else:
+                    getSth = Sol[1] # first run after restart, already have getSth
+                Sol_new = Update_Throughput_AGE(Sol_new,getSth,Update_Cycles)
+                DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
+                print(f"Succeed to run the ageing set for {len(Sol_new.cycles)} cycles the {i_run_try}th time")
+                break # terminate the loop of trying to solve if you can get here. 
+        Result_list = [self.Model_0, Sol_new,Call_Age,DeBug_List]
+        return Result_list
+
+    # Cycle jumping. Simulate a few cycles, get the drift 
+    # per cycle of the end-of-cycle state, extrapolate the slow states 
+    # (Keys_Jump_Slow) over as many cycles as the error control allows, 
+    # then simulate again, until Update_Cycles are covered. Fast states 
+    # (particle and electrolyte concentration, temperature) keep their 
+    # end-of-cycle profile and are only shifted as a whole by their mean 
+    # drift, so the lithium they hold follows the lithium lost to the 
+    # extrapolated side reactions. The jumped state is put t_Jump_Gap after the 
+    # last point, so quantities integrated over time (throughput, 
+    # discharge capacity) see no gap; the throughput of the jumped cycles 
+    # is added by Update_Throughput_AGE. The last cycles are always 
+    # simulated, so GetSol_dict still sees real cycles
+    def Get_Sim_Cycles(self, Sim, n_cyc):
+        # same built models/solvers as Sim, but only its first n_cyc cycles
+        if not (Sim,n_cyc) in self.Sims_Cycles.keys():
+            Experiment_n = copy.copy(Sim.experiment)
+            Experiment_n.cycle_lengths = Sim.experiment.cycle_lengths[:n_cyc]
+            Experiment_n.operating_conditions_cycles = (
+                Sim.experiment.operating_conditions_cycles[:n_cyc])
+            Experiment_n.operating_conditions_steps = (
+                Sim.experiment.operating_conditions_steps[:sum(Experiment_n.cycle_lengths)])
+            Sim_n = copy.copy(Sim)
+            Sim_n.experiment = Experiment_n
+            self.Sims_Cycles[(Sim,n_cyc)] = Sim_n
+        return self.Sims_Cycles[(Sim,n_cyc)]
+
+    def Get_Sim_AGE(self, Update_Cycles):
+        # ageing sets can be shorter than the built one (adaptive length)
+        if Update_Cycles == len(self.Sim_AGE.experiment.cycle_lengths):
+            return self.Sim_AGE
+        return self.Get_Sim_Cycles(self.Sim_AGE, Update_Cycles)
+
+    def Get_Jump_Mask(self, Model_built):
+        # slow (degradation) states, the ones checked by the error control, 
+        # and the other differential states, grouped by variable
+        if not Model_built in self.Jump_Masks.keys():
+            mask = np.zeros(Model_built.len_rhs_and_alg, dtype=bool)
+            groups = []; groups_fast = []
+            for name, [index, _, _] in Get_State_Index(Model_built).items():
+                if any([key in name for key in Keys_Jump_Slow]):
+                    mask[index] = True;  groups.append(index)
+                elif np.all(index < Model_built.len_rhs):
+                    groups_fast.append(index)
+            self.Jump_Masks[Model_built] = [mask, groups, groups_fast]
+        return self.Jump_Masks[Model_built]
+
+    def Get_Jump(self, cycles, Jump_cap):
+        # return [cycles to jump, state after the jump]
+        [Jump_Sample, Jump_Tol] = self.Jump
+        cycles = cycles[1:] # first cycle after a restart or jump is a transient
+        Model_last = cycles[-1].all_models[-1]
+        if len(cycles) < 3 or Jump_cap < Jump_Sample or not all(
+                [cycle.all_models[-1] is Model_last for cycle in cycles]):
+            return [0, None]
+        Y = np.array([np.asarray(cycle.all_ys[-1])[:,-1] for cycle in cycles])
+        n = len(Y); m = (n-1)//2
+        drift_a = (Y[m] - Y[0]) / m;   drift_b = (Y[-1] - Y[m]) / (n-1-m)
+        curv = (drift_b - drift_a) / ((n-1)/2)  # distance between mid points
+        [mask, groups, groups_fast] = self.Get_Jump_Mask(Model_last)
+        Jump = float(Jump_cap)
+        for index in groups:
+            scale = max(np.max(np.abs(Y[-1][index])), 1e-12)
+            curv_i = np.max(np.abs(curv[index])); drift_i = np.max(np.abs(drift_b[index]))
+            if curv_i > 0: # extrapolation error 0.5*curv*J^2 within tolerance
+                Jump = min(Jump, np.sqrt(2*Jump_Tol*scale/curv_i))
+            if drift_i > 0: # and no state changes more than Jump_Max_Change
+                Jump = min(Jump, Jump_Max_Change*scale/drift_i)
+        Jump = int(Jump)
+        if Jump < Jump_Sample:  # not worth it
+            return [0, None]
+        y_jump = Y[-1].copy()
+        mask_jump = mask.copy() 
+        mask_jump[Model_last.len_rhs:] = False  # algebraic states are kept
+        y_jump[mask_jump] = y_jump[mask_jump] + drift_b[mask_jump] * Jump
+        for index in groups_fast:
+            y_jump[index] = y_jump[index] + np.mean(drift_b[index]) * Jump
+        return [Jump, y_jump]
+
+    def Solve_Jump(self, Sim, Sol_seed, inputs, Update_Cycles, Call_Age):
+        Jump_Sample = self.Jump[0]
+        Model_1st = self.Get_First_Built(Sim)
+        inputs_1st = self.Get_Inputs_Built(Model_1st, inputs)
+        Sol_now = Sol_seed;  Cycs_left = Update_Cycles;  Cycs_Jumped = 0
+        while Cycs_left > 0:
+            n_cyc = min(Jump_Sample, Cycs_left)
+            Sol_now = self.Get_Sim_Cycles(Sim, n_cyc).solve(
+                calc_esoh=False,
+                callbacks=Call_Age,
+                starting_solution = Sol_now,
+                inputs = inputs)
+            Cycs_left -= n_cyc
+            if Call_Age.success == False:
+                raise Experiment_error_infeasible("Self detect")
+            # keep at least Jump_Sample cycles to simulate at the end
+            [Jump, y_jump] = self.Get_Jump(
+                Sol_now.cycles[-n_cyc:], Cycs_left - Jump_Sample)
+            if Jump == 0:
+                continue
+            y0 = Get_y0_From_Last(
+                Sol_now, Model_1st, 1.0, self.State_Maps, y_last=y_jump)
+            if y0 is None:
+                continue
+            Sol_jump = Sol_now + self.Get_Point_Solution(
+                Sol_now.t[-1] + t_Jump_Gap, y0, Model_1st, inputs_1st)
+            Sol_jump.cycles = Sol_now.cycles
+            Sol_jump.all_summary_variables = Sol_now.all_summary_variables
+            Sol_jump.all_first_states = Sol_now.all_first_states
+            Sol_now = Sol_jump
+            Cycs_left -= Jump;  Cycs_Jumped += Jump
+            print(f"Jump {Jump} cycles, {Cycs_left} cycles left in this ageing set")
+        return Sol_now,Cycs_Jumped
+
+    def Run_AGE_Jump(
+            self, Model, Sol, Para_update, ModelExperiment, 
+            Update_Cycles, Temper_i, mesh_list, submesh_strech, Deadline=None):
+        if Update_Cycles < 3 * self.Jump[0]: # too short to jump
+            return self.Run_AGE(
+                Model, Sol, Para_update, ModelExperiment, 
+                Update_Cycles, Temper_i, mesh_list, submesh_strech, Deadline)
+        Sim = self.Sim_AGE
+        inputs = self.Get_Inputs(Para_update, Temper_i)
+        Para_update.update(   {'Ambient temperature [K]':Temper_i });  
+        Sol_seed,dict_short = self.Get_Seed(Sim, Sol, Para_update, inputs)
+        Call_Age = RioCallback(Deadline=Deadline)  # define callback
+        try:
+            Sol_new,Cycs_Jumped = self.Solve_Jump(
+                Sim, Sol_seed, inputs, Update_Cycles, Call_Age)
+        except (
+            pb.expression_tree.exceptions.ModelError,
+            pb.expression_tree.exceptions.SolverError,
+            Experiment_error_infeasible
+            ) as e:
+            print(f"Fail to run the ageing set with cycle jumping due to {e}, run all cycles instead")
+            return self.Run_AGE(
+                Model, Sol, Para_update, ModelExperiment, 
+                Update_Cycles, Temper_i, mesh_list, submesh_strech, Deadline)
+        if isinstance(Sol, pb.solvers.solution.Solution):
+            getSth = Get_Throughput_Last(Sol)
+        else:
+            getSth = Sol[1] # first run after restart, already have getSth
+        Sol_new = Update_Throughput_AGE(Sol_new,getSth,Update_Cycles,Cycs_Jumped)
+        Sol_new.Cycs_Jumped = Cycs_Jumped
+        str_err = f"Fully succeed to run the ageing set for {Update_Cycles} cycles, {Cycs_Jumped} of them by cycle jumping"
+        print(str_err)
+        DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
+        Result_list = [self.Model_0, Sol_new,Call_Age,DeBug_List]
+        return Result_list
+
+    def Run_RPT(
+            self, Model, Sol, Para_update, ModelExperiment,
+            Update_Cycles, Temper_i, mesh_list, submesh_strech, Deadline=None):
+        Sim = self.Sim_RPT
+        inputs = self.Get_Inputs(Para_update, Temper_i)
+        Para_update.update(   {'Ambient temperature [K]':Temper_i });
+        Sol_seed,dict_short = self.Get_Seed(Sim, Sol, Para_update, inputs)
+        Call_RPT = RioCallback(Deadline=Deadline)  # define callback
+        # update 231208 - try 3 times until give up 
+        i_run_try = 0
+        while i_run_try<3:
+            try:
+                Sol_new = Sim.solve(
+                    calc_esoh=False,
+                    callbacks=Call_RPT,
+                    starting_solution = Sol_seed,
+                    inputs = inputs) 
+                if Call_RPT.success == False:
+                    raise Experiment_error_infeasible("Self detect")        
+            except (
+                pb.expression_tree.exceptions.ModelError,
+                pb.expression_tree.exceptions.SolverError
+                ) as e:
+                i_run_try += 1
+                Sol_new = "Model error or solver error"
+                str_err = f"Fail to run RPT due to {Sol_new} for the {i_run_try}th time"
+                print(str_err)
+                DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
+            except Experiment_error_infeasible as custom_error:
+                i_run_try += 1
+                Sol_new = "Experiment error or infeasible"
+                str_err = f"{Sol_new}: {custom_error} for RPT for the {i_run_try}th time"
+                print(str_err)
+                DeBug_List = [ Para_update, Update_Cycles, dict_short, str_err ]
+            else:
+                i_run_try += 1
+                if isinstance(Sol, pb.solvers.solution.Solution):
+                    getSth = Get_Throughput_Last(Sol)
+                else:
+                    getSth = Sol[1] # first run after restart, already have getSth
+                Sol_new = Update_Throughput_RPT(Sol_new,getSth)
+                DeBug_List = "Empty"
+                print(f"Succeed to run RPT for the {i_run_try}th time")
+                break # terminate the loop of trying to solve if you can get here. 
+        Result_List_RPT = [self.Model_0, Sol_new,Call_RPT,DeBug_List]
+        return Result_List_RPT
+
+# Compact summary of one segment - only what GetSol_dict,
+# Cal_new_con_Update and Save_for_Reload need, so that a worker process
+# can send it back instead of pickling the whole solution
+Keys_Endpoints = [
+    "Loss of lithium to SEI [mol]",
+    "Loss of lithium to SEI on cracks [mol]",
+    "Loss of lithium to dead lithium plating [mol]",
+    "Loss of lithium to lithium plating [mol]",
+    "X-averaged electrolyte concentration [mol.m-3]",
+    "X-averaged negative electrode porosity",
+    "X-averaged separator porosity",
+    "X-averaged positive electrode porosity",
+    "Total lithium in electrolyte [mol]",
+]
+def Get_Endpoints(Sol):
+    Keys_Dryout_i = [   # only for models with Add_Dryout_States
+        key for key in Keys_Dryout_States + ["EC consumed volume [m3]"]
+        if key in Sol.all_models[-1].variables.keys()]
+    # Only the first and last states are evaluated
+    Endpoints = Get_Var_At(Sol, Keys_Endpoints + Keys_Dryout_i, [0,-1])
+    return Endpoints
+
+# stands in for a solution in Cal_new_con_Update, which only reads
+# entries[0] and entries[-1]
+class Sol_Endpoints(object):
+    class Entries(object):
+        def __init__(self, entries):
+            self.entries = entries
+    def __init__(self, Endpoints):
+        self.Endpoints = Endpoints
+    def __getitem__(self, key):
+        return Sol_Endpoints.Entries(self.Endpoints[key])
+
+def Initialize_my_dict(keys_all):
+    my_dict = {}
+    for keys in keys_all:
+        for key in keys:
+            my_dict[key]=[]
+    return my_dict
+
+# merge the my_dict of one segment into the one of the whole scan
+def Merge_Sol_dict(my_dict, my_dict_part):
+    for key,value in my_dict_part.items():
+        if key in ["x_n [m]","x [m]","x_s [m]","x_p [m]"]:
+            if not len(my_dict[key]):   # special: add only once
+                my_dict[key] = value
+        else:
+            my_dict[key].extend(value)
+    return my_dict
+
+def Get_Summary_Base(Model, Sol):
+    Summ = {}
+    Summ["Endpoints"] = Get_Endpoints(Sol)
+    Summ["Thr"] = Get_Throughput_Last(Sol)
+    _,Summ["dict_short"] = Get_Last_state(Model, Sol)
+    Summ["n_t"] = len(Sol.t)    # time points, for the cost history
+    return Summ
+
+# same post-processing as for every ageing set in Run_P2_Excel
+def Get_Summary_AGE(
+        Model, Sol, Flag_partial, keys_all_AGE, Flag_First, cycle_no,
+        step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV):
+    my_dict_AGE = Initialize_my_dict(keys_all_AGE)
+    if Flag_First:
+        my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol,
+            0, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )
+    # update 240111
+    if Flag_partial == True:
+        try:
+            my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol,
+                cycle_no, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )
+        except IndexError:
+            print("The last cycle is incomplete, try [-2] cycle")
+            try:
+                my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol,
+                    -2, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )
+            except IndexError:
+                print("[-2] cycle also does not work, try first one")
+                try:
+                    my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol,
+                        0, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )
+                except TimeoutError:
+                    raise
+                except Exception:
+                    print("Still does not work, less than one cycle, we are in trouble")
+    else:
+        try:
+            my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol,
+                cycle_no, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )
+        except TimeoutError:
+            raise
+        except Exception:
+            print("GetSol_dict fail for a complete ageing set for unknown reasons!!!")
+    Summ = Get_Summary_Base(Model, Sol)
+    Summ["my_dict"] = my_dict_AGE
+    Summ["Flag_First"] = Flag_First
+    Summ["Cycs"] = len(Sol.cycles) + getattr(Sol, "Cycs_Jumped", 0)
+    Summ["avg_T"] = np.mean(
+        Sol["Volume-averaged cell temperature [C]"].entries)
+    return Summ
+
+# same post-processing as for every RPT in Run_P2_Excel
+def Get_Summary_RPT(
+        Model, Sol, keys_all_RPT, cap_full, R_from_GITT, Cyc_Index_Res,
+        step_0p1C_CD, step_0p1C_CC,step_0p1C_RE , step_AGE_CV, step_0p5C_CD,
+        Q_GITT=None):
+    my_dict_RPT = Initialize_my_dict(keys_all_RPT)
+    # update 231210: delete the first hold at 4.2V for later RPT
+    my_dict_RPT = GetSol_dict (my_dict_RPT,keys_all_RPT, Sol,
+        0,step_0p1C_CD, step_0p1C_CC,step_0p1C_RE , step_AGE_CV   )
+    # update 230517 - Get R from C/2 discharge only, discard GITT
+    if R_from_GITT:
+        Res_midSOC,Res_full,SOC_Res = Get_0p1s_R0(Sol,Cyc_Index_Res,cap_full)
+    else:
+        step_0P5C_CD = Sol.cycles[0].steps[step_0p5C_CD]
+        Res_midSOC,Res_full,SOC_Res = Get_R_from_0P5C_CD(step_0P5C_CD,cap_full)
+    my_dict_RPT["SOC_Res"]    = [SOC_Res,]
+    my_dict_RPT["Res_full"]   = [Res_full,]
+    my_dict_RPT["Res_midSOC"] = [Res_midSOC,]
+    Summ = Get_Summary_Base(Model, Sol)
+    Summ["my_dict"] = my_dict_RPT
+    if Q_GITT is not None:  # see Get_GITT_Seeds
+        Summ["GITT_Seeds"] = Get_GITT_Seeds(Sol, step_0p1C_CD, Q_GITT, cap_full)
+    return Summ
+
+# Options_Speed["Lean"] keeps a compact record of every
+# finished segment instead of the whole solution. The final state is a
+# one-point solution (with its model, inputs and Thr_Last), enough to
+# start the next segment from
+def Get_Sol_Last(Sol):
+    if not isinstance(Sol, pb.solvers.solution.Solution):
+        return Sol  # [dict_short, getSth] after restart, or error text
+    Sol_Last = Get_Sol_At(Sol, -1)
+    Sol_Last.Thr_Last = Get_Throughput_Last(Sol)
+    return Sol_Last
+
+# drop variables pybamm processed and cached during post-processing
+def Clear_Sol_Cache(Sol):
+    for Sol_i in [Sol] + list(getattr(Sol, "steps", [])):
+        if isinstance(Sol_i, pb.solvers.solution.Solution):
+            Sol_i._variables = pb.FuzzyDict()
+            Sol_i.data = pb.FuzzyDict()
+
+# the record: final state, first and last cycle and the summary
+def Get_Sol_Lean(Sol, Summ=None):
+    if not isinstance(Sol, pb.solvers.solution.Solution):
+        return Sol
+    Cycles = [Sol.cycles[0], Sol.cycles[-1]] if len(Sol.cycles) else []
+    for Cycle in Cycles:
+        Clear_Sol_Cache(Cycle)
+    return {
+        "Last": Get_Sol_Last(Sol), "Cycles": Cycles,
+        "Cycs": len(Sol.cycles), "Summ": Summ}
+
+# Options_Speed["Spill"] writes every solution kept for
+# Return_Sol to Path_Spill as soon as it is finished: t and y of every
+# sub-solution compressed in {Name}.npz, the structure (cycles, steps,
+# inputs, events) in {Name}.pkl and every model once in Model_{n}.pkl.gz.
+# Sol_RPT and Sol_AGE then hold Sol_Spilled proxies
+class SolSpill(object):
+    def __init__(self, Path_Spill):
+        self.Path_Spill = Path_Spill
+        os.makedirs(Path_Spill, exist_ok=True)
+        self.Models = {}    # id of model: name of its file
+        self.Models_Mem = {}    # models that could not be pickled, by name
+        self.Counts = {}    # solutions written per name
+
+    def Add_Model(self, Model):
+        if not id(Model) in self.Models.keys():
+            Name_Model = f"Model_{len(self.Models)}"
+            try:    # expression trees compress about 10 times
+                with gzip.open(self.Path_Spill + Name_Model + ".pkl.gz", "wb", 6) as file:
+                    pickle.dump(Model, file)
+            except Exception as e:
+                print(f"Fail to write {Name_Model} due to {e}, keep it in memory")
+                self.Models_Mem[Name_Model] = Model
+            self.Models[id(Model)] = Name_Model
+        return self.Models[id(Model)]
+
+    def Get_Layout(self, Sol, Chunks):
+        if isinstance(Sol, pb.solvers.solution.EmptySolution):
+            return {"Empty": True, "t": Sol.t, "termination": Sol.termination}
+        Index = []
+        for t, y in zip(Sol.all_ts, Sol.all_ys):
+            if not id(y) in Chunks.keys():  # the same arrays are in cycles
+                Chunks[id(y)] = [len(Chunks), np.asarray(t), np.asarray(y)]
+            Index.append(Chunks[id(y)][0])
+        return {
+            "Empty": False, "Index": Index,
+            "Models": [self.Add_Model(Model) for Model in Sol.all_models],
+            "Inputs": Sol.all_inputs, "t_event": Sol.t_event,
+            "y_event": Sol.y_event, "termination": Sol.termination}
+
+    def Add(self, Sol, Name):
+        if not isinstance(Sol, pb.solvers.solution.Solution):
+            return Sol  # list after restart, summary or error text
+        i_Name = self.Counts.get(Name, 0);   self.Counts[Name] = i_Name + 1
+        Name = f"{Name}_{i_Name}"
+        Chunks = {}
+        Layout = self.Get_Layout(Sol, Chunks)
+        Layout["Cycles"] = []
+        for Cycle in Sol.cycles:
+            if Cycle is None:   # not saved by save_at_cycles
+                Layout["Cycles"].append(None);  continue
+            Layout_cyc = self.Get_Layout(Cycle, Chunks)
+            Layout_cyc["Steps"] = [
+                self.Get_Layout(Step, Chunks) for Step in Cycle.steps]
+            Layout_cyc["Summary"] = getattr(Cycle, "cycle_summary_variables", None)
+            Layout["Cycles"].append(Layout_cyc)
+        Layout["Summary"] = getattr(Sol, "all_summary_variables", None)
+        Layout["Attrs"] = {     # added by Fun_NC
+            key: getattr(Sol, key) for key in ["Thr_Last", "Cycs_Jumped"]
+            if hasattr(Sol, key)}
+        Arrays = {}
+        for [i, t, y] in Chunks.values():
+            Arrays[f"t_{i}"] = t;   Arrays[f"y_{i}"] = y
+        np.savez_compressed(self.Path_Spill + Name + ".npz", **Arrays)
+        with open(self.Path_Spill + Name + ".pkl", "wb") as file:
+            pickle.dump(Layout, file)
+        return Sol_Spilled(self.Path_Spill, Name, self.Models_Mem,
+            [Sol.t[0], Sol.t[-1]], len(Sol.cycles))
+
+# stands in for a spilled solution: the solution is rebuilt from disk on
+# first access of a variable (Sol_i["Voltage [V]"]) or of anything else
+# of a solution (Sol_i.cycles, Sol_i.t, ...), Free() drops it again
+class Sol_Spilled(object):
+    def __init__(self, Path_Spill, Name, Models_Mem, t_range, n_cycles):
+        self.Path_Spill = Path_Spill;   self.Name = Name
+        self.Models_Mem = Models_Mem
+        self.t_range = t_range;     self.n_cycles = n_cycles
+        self._Sol = None
+
+    def __repr__(self):
+        return (f"Sol_Spilled({self.Path_Spill}{self.Name}, t = {self.t_range[0]:.0f}"
+            f" ~ {self.t_range[1]:.0f} s, {self.n_cycles} cycles)")
+
+    def Load_Model(self, Name_Model, Models):
+        if Name_Model in self.Models_Mem.keys():
+            return self.Models_Mem[Name_Model]
+        if not Name_Model in Models.keys():
+            with gzip.open(self.Path_Spill + Name_Model + ".pkl.gz", "rb") as file:
+                Models[Name_Model] = pickle.load(file)
+        return Models[Name_Model]
+
+    def Get_Sol(self, Layout, Arrays, Models):
+        if Layout["Empty"]:
+            return pb.EmptySolution(Layout["termination"], Layout["t"])
+        return pb.Solution(
+            [Arrays[f"t_{i}"] for i in Layout["Index"]],
+            [Arrays[f"y_{i}"] for i in Layout["Index"]],
+            [self.Load_Model(Name_Model, Models) for Name_Model in Layout["Models"]],
+            Layout["Inputs"], Layout["t_event"], Layout["y_event"],
+            Layout["termination"])
+
+    def Load(self):
+        if self._Sol is not None:
+            return self._Sol
+        with open(self.Path_Spill + self.Name + ".pkl", "rb") as file:
+            Layout = pickle.load(file)
+        with np.load(self.Path_Spill + self.Name + ".npz") as Arrays:
+            Arrays = dict(Arrays)
+        Models = {}
+        Sol = self.Get_Sol(Layout, Arrays, Models)
+        Cycles = []
+        for Layout_cyc in Layout["Cycles"]:
+            if Layout_cyc is None:
+                Cycles.append(None);    continue
+            Cycle = self.Get_Sol(Layout_cyc, Arrays, Models)
+            Cycle.steps = [
+                self.Get_Sol(Layout_step, Arrays, Models)
+                for Layout_step in Layout_cyc["Steps"]]
+            if Layout_cyc["Summary"] is not None:
+                Cycle.cycle_summary_variables = Layout_cyc["Summary"]
+            Cycles.append(Cycle)
+        Sol.cycles = Cycles
+        if Layout["Summary"] is not None:
+            Sol.set_summary_variables(Layout["Summary"])
+        for key, value in Layout["Attrs"].items():
+            setattr(Sol, key, value)
+        self._Sol = Sol
+        return Sol
+
+    def Free(self):
+        self._Sol = None
+
+    def __getitem__(self, key):
+        return self.Load()[key]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):    # also keeps pickle and copy away from Load
+            raise AttributeError(name)
+        return getattr(self.Load(), name)
+
+    def __getstate__(self):
+        State = self.__dict__.copy();   State["_Sol"] = None
+        return State
+
+# Long-lived worker for one scan. It is forked after the
+# engine is built, keeps the built simulations and the current solution
+# in memory, and answers small commands:
+#   ["AGE" or "RPT", Para_short, Update_Cycles, Temper_i, Summ_Args]
+# with [None, summary or error text, callback, DeBug_List]
+def Scan_Worker_Loop(Conn, Engine, Sol_Last, Lean=False):
+    while True:
+        try:
+            Command = Conn.recv()
+        except EOFError:
+            break
+        if Command[0] == "Stop":
+            break
+        [Name, Para_short, Update_Cycles, Temper_i, Summ_Args] = Command
+        try:
+            if Name == "AGE":
+                Run_AGE_i = Engine.Run_AGE_Jump if Engine.Jump else Engine.Run_AGE
+                [Model_i, Sol_i, Call_i, DeBug_i] = Run_AGE_i(
+                    Engine.Model_0, Sol_Last, Para_short, Engine.Experiment_Long,
+                    Update_Cycles, Temper_i, Engine.mesh_list, Engine.submesh_strech)
+            else:
+                [Model_i, Sol_i, Call_i, DeBug_i] = Engine.Run_RPT(
+                    Engine.Model_0, Sol_Last, Para_short, Engine.Experiment_RPT,
+                    Update_Cycles, Temper_i, Engine.mesh_list, Engine.submesh_strech)
+            if isinstance(Sol_i, pb.solvers.solution.Solution):
+                if Name == "AGE":
+                    Summ = Get_Summary_AGE(
+                        Model_i, Sol_i, "Partially" in DeBug_i[-1], *Summ_Args)
+                else:
+                    Summ = Get_Summary_RPT(Model_i, Sol_i, *Summ_Args)
+                Sol_Last = Get_Sol_Last(Sol_i) if Lean else Sol_i
+                Sol_i = Summ
+        except Exception as e:
+            Sol_i = "Model error or solver error"
+            Call_i = RioCallback()
+            DeBug_i = [ Para_short, Update_Cycles, "nan",
+                f"Worker fail to run {Name} due to {e}"]
+            print(DeBug_i[-1])
+        Conn.send([None, Sol_i, Call_i, DeBug_i])
+    Conn.close()
+
+class ScanWorker(object):
+    def __init__(self, Engine, Sol_0, Timeout, Timelimit, Timeout_text, Lean=False):
+        self.Engine = Engine;   self.Lean = Lean
+        self.Checkpoint = Sol_0 # restart point if the worker is killed
+        self.Timeout = Timeout; self.Timelimit = Timelimit
+        self.Timeout_text = Timeout_text
+        self.Process = None
+        self.Start()
+
+    def Start(self):
+        self.Conn, Conn_child = Pipe()
+        self.Process = Process(
+            target=Scan_Worker_Loop,
+            args=(Conn_child, self.Engine, self.Checkpoint, self.Lean))
+        self.Process.daemon = True
+        self.Process.start()
+        Conn_child.close()
+
+    def Kill(self):
+        self.Process.terminate()
+        self.Process.join()
+        self.Process = None
+
+    def Get_Para_Short(self, Para_update):
+        Para_short = {}
+        for key in self.Engine.Keys_Input + [
+                "Ratio of Li-ion concentration change in electrolyte consider solvent consumption"]:
+            Para_short[key] = Para_update[key]
+        return Para_short
+
+    def Run(self, Command):
+        if self.Process is None:
+            print("Restart scan worker from the last checkpoint")
+            self.Start()
+        self.Conn.send(Command)
+        if self.Conn.poll(self.Timelimit if self.Timeout else None):
+            try:
+                Result_List = self.Conn.recv()
+            except EOFError:  # worker died
+                self.Kill()
+                Result_List = [
+                    None, "Model error or solver error", RioCallback(),
+                    [Command[1], Command[2], "nan", "Scan worker died"]]
+        else:
+            self.Kill()
+            Result_List = [
+                self.Timeout_text, self.Timeout_text,
+                RioCallback(), self.Timeout_text]
+        if isinstance(Result_List[1], dict):
+            self.Checkpoint = [
+                Result_List[1]["dict_short"], Result_List[1]["Thr"]]
+        return Result_List
+
+    def Stop(self):
+        if self.Process is None:
+            return
+        try:
+            self.Conn.send(["Stop"])
+        except (BrokenPipeError, OSError):
+            pass
+        self.Process.join(timeout=10)
+        if self.Process.is_alive():
+            self.Process.terminate()
+        self.Process = None
+
+# Checkpoint after break-in, every ageing set and every RPT,
+# so that a scan killed by the walltime can go on with any later Re_No. 
+# One file per scan, overwritten by every try, so a retry finds the last 
+# checkpoint even if tries in between wrote none. It holds plain data 
+# only (dicts, lists, arrays), written to a temporary file first so a kill
+# while writing is harmless. A failed save raises: a scan that can not 
+# checkpoint should not go on as if it could
+def Get_Checkpoint_Path(BasicPath, Target, Scan_i):
+    return BasicPath + Target+"Mats/" + str(Scan_i)+ '-Checkpoint.pkl'
+def Save_Checkpoint(Path_Check, Checkpoint):
+    Path_tmp = Path_Check + f".{os.getpid()}.tmp"
+    with open(Path_tmp, 'wb') as file:
+        pickle.dump(Checkpoint, file)
+        file.flush();   os.fsync(file.fileno())
+    os.replace(Path_tmp, Path_Check)
+def Load_Checkpoint(Path_Check):
+    if not os.path.exists(Path_Check):
+        return None
+    try:
+        with open(Path_Check, 'rb') as file:
+            Checkpoint = pickle.load(file)
+    except Exception as e:
+        print(f"Fail to load checkpoint {Path_Check} due to {e}")
+        return None
+    return Checkpoint
+
+# Results of finished scans are kept in 
+# BasicPath/Result_Cache/, keyed by a hash of everything that sets the 
+# result: resolved parameter values, model and options, experiment text, 
+# mesh, cycle numbers and the speed options that change results. A row of 
+# any campaign with the same key gets the stored midc_merge and Excel row
+Keys_Speed_Result = [
+    "Model", "Jump", "Jump_Sample", "Jump_Tol", "Adaptive", 
+    "Adaptive_Tol_Dry", "Adaptive_Tol_LLI", "Dryout_ODE", 
+    "Abort_MPE", "Abort_Min_RPT", ]
+# the code that made a result is part of its key: any edit of this file 
+# or another pybamm version starts a new cache
+def Get_Code_Version():
+    with open(os.path.abspath(__file__), 'rb') as file:
+        str_code = hashlib.md5(file.read()).hexdigest()
+    return f"{str_code}_pybamm_{pb.__version__}"
+def Get_Result_Key(
+        Para_0, model_options, Exp_Texts, mesh_list, submesh_strech, 
+        Cycles_Temps, R_from_GITT, Options_Speed):
+    str_key = [f"{key}={Get_Value_Str(Para_0[key])}" for key in sorted(Para_0.keys())]
+    str_key += [
+        Get_Code_Version(),
+        str(model_options), str(Exp_Texts), str(mesh_list), str(submesh_strech),
+        str(Cycles_Temps), str(R_from_GITT), 
+        str([Options_Speed[key] for key in Keys_Speed_Result])]
+    return hashlib.md5("\n".join(str_key).encode()).hexdigest()
+
+def Load_Result_Cache(BasicPath, Key_Result):
+    return Load_Checkpoint(BasicPath + f"/Result_Cache/{Key_Result}.pkl")
+
+def Save_Result_Cache(BasicPath, Key_Result, midc_merge, df_excel, Source):
+    os.makedirs(BasicPath + "/Result_Cache/", exist_ok=True)
+    try:    # the results are saved already, only the cache is missing
+        Save_Checkpoint(
+            BasicPath + f"/Result_Cache/{Key_Result}.pkl", 
+            {"midc_merge": midc_merge, "Excel": df_excel.iloc[0].to_dict(), 
+             "Source": Source})
+    except Exception as e:
+        print(f"Fail to save result cache {Key_Result} due to {e}")
+
+# write the cached result as if this row had been run
+def Use_Result_Cache(
+        Cached, Para_dict_i, Scan_i, Re_No, BasicPath, Target, book_name_xlsx,
+        purpose, Save_Files=True, Save_Store=False):
+    midc_merge = Cached["midc_merge"]
+    Dict_Excel = Cached["Excel"].copy()
+    Dict_Excel.update(Para_dict_i)
+    Dict_Excel["Scan No"] = Scan_i
+    Dict_Excel["Log"] = f"Result from cache, first run as {Cached['Source']}"
+    if Save_Store:
+        Save_Store_Scan(
+            BasicPath, Target, purpose, Scan_i, Re_No, 
+            Dict_Excel, Para_dict_i, midc_merge)
+    if Save_Files:
+        pd.DataFrame([Dict_Excel]).to_excel(
+            BasicPath + Target + "Excel/" + str(Scan_i)+ '_' + book_name_xlsx,
+            index=False, engine='openpyxl')
+        with open(
+            BasicPath + Target+"Mats/" 
+            + str(Scan_i)+ f'_Re_{Re_No}-midc_merge.pkl', 'wb') as file:
+            pickle.dump(midc_merge, file)
+    print(f"Scan {Scan_i} Re {Re_No}: Same as {Cached['Source']}, use the cached result")
+    return midc_merge
+
+# Pick the length of the next ageing set from how fast the
+# electrolyte and LLI changed in the last ones: longer when smooth, 
+# shorter near dry-out onset, and always ending exactly at the next RPT
+Keys_LLI_Sched = [
+    "Loss of lithium to SEI [mol]",
+    "Loss of lithium to SEI on cracks [mol]",
+    "Loss of lithium to lithium plating [mol]",
+]
+class SegmentScheduler(object):
+    def __init__(self, Update_Cycles, Cycle_bt_RPT, Tol_Dry, Tol_LLI):
+        self.n_last = int(Update_Cycles)
+        self.n_min  = max(1, int(Update_Cycles)//10)
+        self.n_max  = max(int(Cycle_bt_RPT), self.n_min)
+        self.Tol_Dry = Tol_Dry;  self.Tol_LLI = Tol_LLI
+        self.History = []   # [cycles, LLI rate, Data_Pack] for each ageing set
+        self.Summ_Added = None
+
+    # Summ_AGE: summary of the ageing set just finished; Data_Pack: dry-out
+    # update computed from it (None if dry-out is off)
+    def Add(self, Summ_AGE, Data_Pack):
+        if Summ_AGE is self.Summ_Added:  # already there
+            return
+        self.Summ_Added = Summ_AGE
+        n_cyc = max(Summ_AGE["Cycs"], 1)
+        LLI = 0.0
+        for key in Keys_LLI_Sched:
+            LLI += abs(Summ_AGE["Endpoints"][key][-1] - Summ_AGE["Endpoints"][key][0])
+        self.History.append([n_cyc, LLI / n_cyc, Data_Pack])
+
+    # plain data for the checkpoint
+    def Get_State(self):
+        return {
+            "n_last": self.n_last, 
+            "History": [
+                [n_cyc, rate_LLI, None if Data_Pack is None else list(Data_Pack)] 
+                for [n_cyc, rate_LLI, Data_Pack] in self.History]}
+    def Set_State(self, State):
+        self.n_last  = State["n_last"]
+        self.History = [list(History_i) for History_i in State["History"]]
+
+    def Next(self, Cycs_left):
+        n_next = self.n_last
+        if len(self.History):
+            [n_cyc, rate_LLI, Data_Pack] = self.History[-1]
+            n_next = min(2 * n_cyc, self.n_max)  # grow if nothing below objects
+            if Data_Pack is not None:
+                Vol_Elely_need = Data_Pack[1]; Vol_Elely_Tot_new = Data_Pack[5]
+                Vol_Elely_JR_new = Data_Pack[6]; Ratio_Dryout = Data_Pack[11]
+                rate_Vol = Vol_Elely_need / n_cyc   # m3 per cycle
+                if abs(rate_Vol) > 0:   # electrolyte in JR changes < Tol_Dry
+                    n_next = min(n_next, self.Tol_Dry * Vol_Elely_JR_new / abs(rate_Vol))
+                if len(self.History) > 1 and self.History[-2][2] is not None:
+                    dRatio = abs(Ratio_Dryout - self.History[-2][2][11]) / n_cyc
+                    if dRatio > 0:
+                        n_next = min(n_next, self.Tol_Dry / dRatio)
+            if len(self.History) > 1 and self.History[-2][1] > 0:
+                dRate = abs(rate_LLI / self.History[-2][1] - 1)
+                if dRate > self.Tol_LLI:    # LLI rate changes too fast
+                    n_next = min(n_next, n_cyc * self.Tol_LLI / dRate)
+            n_next = max(int(n_next), n_cyc // 2)   # shrink at most by half
+            if Data_Pack is not None:   # but end right at dry-out onset
+                Vol_reservoir = Vol_Elely_Tot_new - Vol_Elely_JR_new
+                if Vol_reservoir > 0 and rate_Vol > 0:  
+                    n_next = min(n_next, int(np.ceil(Vol_reservoir / rate_Vol)))
+            n_next = max(n_next, self.n_min)
+        n_next = min(n_next, Cycs_left)
+        if Cycs_left - n_next < self.n_min: # don't leave a tiny last set
+            n_next = Cycs_left
+        self.n_last = n_next
+        return n_next
+
+
+# Cost history and predictor. Every Run_P2_Excel writes 
+# one json to BasicPath/Cost_History/ (wall time, time and number of 
+# ageing sets and RPTs, solver time points). CostPredictor fits log time 
+# per ageing cycle and log time per RPT on the row parameters, which 
+# gives the expected wall time of new rows (longest first, packing 
+# rows into allocations) and a per-segment Timelimit instead of 48 h
+def Initialize_Cost_Log(Model_Name="DFN"):
+    return {
+        "Model": Model_Name,
+        "Time break-in [s]": 0.0, 
+        "Segments AGE": 0, "Cycles AGE": 0, "Time AGE [s]": 0.0,
+        "Segments RPT": 0, "Time RPT [s]": 0.0,
+        "Max segment [s]": 0.0, "Steps": 0, }
+
+def Add_Cost_Log(Cost_Log, Kind, t_seg, Summ, Cycs=0):
+    Cost_Log[f"Segments {Kind}"] += 1
+    Cost_Log[f"Time {Kind} [s]"] += t_seg
+    Cost_Log["Max segment [s]"] = max(Cost_Log["Max segment [s]"], t_seg)
+    Cost_Log["Steps"] += Summ.get("n_t", 0)
+    if Kind == "AGE":
+        Cost_Log["Cycles AGE"] += Cycs
+    return Cost_Log
+
+def Save_Cost_History(
+        BasicPath, purpose, Para_dict_i, Re_No, Cost_Log, t_wall, Flag_Done):
+    Path_History = BasicPath + "/Cost_History/"
+    os.makedirs(Path_History, exist_ok=True)
+    Record = {
+        "purpose": purpose, "Scan No": int(Para_dict_i["Scan No"]), 
+        "Re_No": Re_No, "Para": Para_dict_i, "Wall [s]": t_wall, 
+        "Done": bool(Flag_Done), **Cost_Log}
+    try:
+        with open(
+                Path_History + f"{purpose}_{Record['Scan No']}_Re_{Re_No}.json", 
+                "w") as file:
+            json.dump(
+                Record, file, 
+                default=lambda x: x.item() if hasattr(x,"item") else str(x))
+    except OSError as e:
+        print(f"Fail to save cost history due to {e}")
+
+def Load_Cost_History(BasicPath):
+    History = []
+    for file_name in glob.glob(BasicPath + "/Cost_History/*.json"):
+        try:
+            with open(file_name) as file:
+                History.append(json.load(file))
+        except (OSError, ValueError):
+            pass
+    return History
+
+# ageing cycles, RPTs and break-in of a row, np.inf if the experiment 
+# is not implemented (so it starts early)
+def Get_Scan_Wall(Para_dict_i, Runshort, t_cyc, t_RPT):
+    try:
+        tot_cyc,cyc_age,_ = Get_tot_cyc(
+            Runshort, int(Para_dict_i["Exp No."]), 
+            Para_dict_i["Ageing temperature"], int(Para_dict_i["Scan No"]))
+    except Exception:
+        return np.inf
+    return tot_cyc * t_cyc + (int(tot_cyc / cyc_age) + 1) * t_RPT
+
+def Get_Scan_States(Para_dict_i):
+    if "Mesh list" in Para_dict_i.keys():
+        mesh_list = json.loads(Para_dict_i["Mesh list"])
+    else:
+        mesh_list = [5,5,5,30,30]
+    return (
+        mesh_list[0]*mesh_list[3] + mesh_list[2]*mesh_list[4]
+        + mesh_list[0] + mesh_list[1] + mesh_list[2])
+
+# True if the scan got to its last RPT
+def Get_Scan_Done(midc_merge, Para_dict_i):
+    if midc_merge[0].get("Early abort", False):  # no point running it again
+        return True
+    Cycle_RPT = midc_merge[0]["Cycle_RPT"]
+    Cycle_bt_RPT = Para_dict_i["Ageing cycles between RPT"]
+    Cycle_end = int(Para_dict_i["Total ageing cycles"]/Cycle_bt_RPT) * Cycle_bt_RPT
+    return len(Cycle_RPT) > 0 and Cycle_RPT[-1] >= Cycle_end
+
+Keys_Option_Cost = [
+    "SEI on cracks", "lithium plating", "particle mechanics", 
+    "loss of active material", "SEI porosity change", "thermal", ]
+class CostPredictor(object):
+    def __init__(self, Runshort, Ridge=1e-2):
+        self.Runshort = Runshort
+        self.Ridge = Ridge
+        self.Coef = None    # [coef per ageing cycle, coef per RPT]
+        self.Exps = [];  self.Keys_Ea = []
+
+    def Get_Features(self, Para_dict_i):
+        x = [1.0, np.log(Get_Scan_States(Para_dict_i)), 
+            1e3 / (float(Para_dict_i["Ageing temperature"]) + 273.15)]
+        x += [float(int(Para_dict_i["Exp No."]) == Exp) for Exp in self.Exps]
+        try:
+            model_options = ast.literal_eval(str(Para_dict_i["Model option"]))
+        except (KeyError, ValueError, SyntaxError):
+            model_options = {}
+        for key in Keys_Option_Cost:
+            value = str(model_options.get(key, "none")).lower()
+            x.append(float(not value in ["none", "false", "isothermal"]))
+        for key in self.Keys_Ea:    # in 10 kJ/mol
+            try:
+                x.append(float(Para_dict_i[key]) / 1e4)
+            except (KeyError, ValueError, TypeError):
+                x.append(0.0)
+        return np.array(x)
+
+    def Fit(self, History):
+        History = [
+            Record for Record in History 
+            if Record["Cycles AGE"] > 0 and Record["Segments RPT"] > 0
+            and Record.get("Model", "DFN") == "DFN"]    # not screening runs
+        if len(History) < 3:
+            print(f"Only {len(History)} runs in the cost history, no prediction")
+            return self
+        self.Exps = sorted(set([int(Record["Para"]["Exp No."]) for Record in History]))
+        self.Keys_Ea = sorted(set([
+            key for Record in History for key in Record["Para"].keys()
+            if "activation energy" in key.lower()]))
+        X = np.array([self.Get_Features(Record["Para"]) for Record in History])
+        Y = np.log(np.array([
+            [Record["Time AGE [s]"] / Record["Cycles AGE"], 
+             Record["Time RPT [s]"] / Record["Segments RPT"]]
+            for Record in History]))
+        A = X.T @ X + self.Ridge * np.eye(X.shape[1])
+        self.Coef = np.linalg.solve(A, X.T @ Y)
+        return self
+
+    def Predict(self, Para_dict_i):
+        t_cyc, t_RPT = np.exp(self.Get_Features(Para_dict_i) @ self.Coef)
+        Wall = Get_Scan_Wall(Para_dict_i, self.Runshort, t_cyc, t_RPT)
+        return {"AGE per cycle [s]": t_cyc, "RPT [s]": t_RPT, "Wall [s]": Wall, }
+
+# per-segment Timelimit from the prediction, never more than Timelimit
+def Get_Timelimit_Predicted(
+        Predictor, Para_dict_i, Cycles_seg, Timelimit, Factor, Timelimit_Min=1800):
+    if Predictor.Coef is None:
+        return Timelimit
+    Cost = Predictor.Predict(Para_dict_i)
+    t_seg = max(Cost["AGE per cycle [s]"] * Cycles_seg, Cost["RPT [s]"])
+    return int(min(Timelimit, max(Factor * t_seg, Timelimit_Min)))
 
 def recursive_scan(mylist,kvs, key_list, acc):
     # 递归终止条件
@@ -958,99 +2598,80 @@ def Para_init(Para_dict,cap_st):
 
     return CyclePack,Para_0
 
+# Every variable of one cycle is evaluated once per step; 
+# start/end values come from the first/last state of the step only (one 
+# time point instead of all), unless the variable integrates over time
+class Sol_Cycle_Cache(object):
+    def __init__(self, Sol, cycle_no):
+        self.Cycle = Sol.cycles[cycle_no]
+        self.Entries = {};  self.Sols_At = {}
+
+    def Get_Entries(self, step_no, key):
+        if not (step_no,key) in self.Entries:
+            self.Entries[(step_no,key)] = self.Cycle.steps[step_no][key].entries
+        return self.Entries[(step_no,key)]
+
+    def Get_Point(self, step_no, key, sta_end):
+        Index = 0 if sta_end == "sta" else -1
+        if (step_no,key) in self.Entries:
+            Value = self.Entries[(step_no,key)][...,Index]
+        else:
+            Value = Get_Var_At(
+                self.Cycle.steps[step_no], [key], [Index], 
+                self.Sols_At.setdefault(step_no, {}))[key][...,0]
+        return Value[()] if Value.ndim == 0 else np.array(Value)
+
+    # electrolyte potential in the middle of the separator, as reference
+    def Get_Phi_Ref(self, step_no):
+        phi_sep = self.Get_Entries(step_no, "Separator electrolyte potential [V]")
+        mesh_sep = phi_sep.shape[0]
+        if mesh_sep % 2 ==0:
+            return (phi_sep[mesh_sep//2-1,:] + phi_sep[mesh_sep//2+1,:]) / 2
+        else:
+            return phi_sep[mesh_sep//2,:]
+
 # Add 220808 - to simplify the post-processing
+# One pass over the keys with Sol_Cycle_Cache, values are
+#                numpy arrays (scalars for keys_cyc) instead of lists
 def GetSol_dict (my_dict, keys_all, Sol, 
     cycle_no,step_CD, step_CC , step_RE, step_CV ):
 
     [keys_loc,keys_tim,keys_cyc]  = keys_all;
+    Steps = {"CD": step_CD, "CC": step_CC, "RE": step_RE, "CV": step_CV}
+    Cache = Sol_Cycle_Cache(Sol, cycle_no)
     # get time_based variables:
-    if len(keys_tim): 
-        for key in keys_tim:
-            step_no = eval("step_{}".format(key[0:2]))
-            if key[3:] == "Time [h]":
-                my_dict[key].append  (  (
-                    Sol.cycles[cycle_no].steps[step_no][key[3:]].entries
-                    -
-                    Sol.cycles[cycle_no].steps[step_no][key[3:]].entries[0]).tolist()  )
-            elif key[3:] == "Anode potential [V]":
-                sol_step = Sol.cycles[cycle_no].steps[step_no]
-                mesh_sep = len(sol_step["Separator electrolyte potential [V]"].entries[:,0])
-                if mesh_sep % 2 ==0:
-                    phi_ref = (
-                        sol_step["Separator electrolyte potential [V]"].entries[mesh_sep//2-1,:]
-                        +
-                        sol_step["Separator electrolyte potential [V]"].entries[mesh_sep//2+1,:]
-                        ) / 2
-                    #print(mesh_sep/2+0.5)
-                else:
-                    phi_ref = sol_step["Separator electrolyte potential [V]"].entries[mesh_sep//2,:]
-                V_n = -phi_ref 
-                my_dict[key].append(  V_n.tolist()  )
-            elif key[3:] == "Cathode potential [V]":
-                sol_step = Sol.cycles[cycle_no].steps[step_no]
-                mesh_sep = len(sol_step["Separator electrolyte potential [V]"].entries[:,0])
-                if mesh_sep % 2 ==0:
-                    phi_ref = (
-                        sol_step["Separator electrolyte potential [V]"].entries[mesh_sep//2-1,:]
-                        +
-                        sol_step["Separator electrolyte potential [V]"].entries[mesh_sep//2+1,:]
-                        ) / 2
-                    #print(mesh_sep/2+0.5)
-                else:
-                    phi_ref = sol_step["Separator electrolyte potential [V]"].entries[mesh_sep//2,:]
-                V =  sol_step["Terminal voltage [V]"].entries
-                V_p = V - phi_ref   
-                my_dict[key].append(  V_p.tolist()  )
-            else:
-                my_dict[key].append(  (
-                    Sol.cycles[cycle_no].steps[step_no][key[3:]].entries).tolist()  )
+    for key in keys_tim:
+        step_no = Steps[key[0:2]]
+        if key[3:] == "Time [h]":
+            entries = Cache.Get_Entries(step_no, key[3:])
+            my_dict[key].append(entries - entries[0])
+        elif key[3:] == "Anode potential [V]":
+            my_dict[key].append(-Cache.Get_Phi_Ref(step_no))
+        elif key[3:] == "Cathode potential [V]":
+            my_dict[key].append(
+                Cache.Get_Entries(step_no, "Terminal voltage [V]")
+                - Cache.Get_Phi_Ref(step_no))
+        else:
+            my_dict[key].append(np.array(Cache.Get_Entries(step_no, key[3:])))
     # get cycle_step_based variables: # isn't an array
-    if len(keys_cyc): 
-        for key in keys_cyc:
-            if key in ["Discharge capacity [A.h]"]:
-                step_no = step_CD;
-                my_dict[key].append  (
-                    Sol.cycles[cycle_no].steps[step_no][key].entries[-1]
-                    - 
-                    Sol.cycles[cycle_no].steps[step_no][key].entries[0])
-            elif key in ["Throughput capacity [A.h]"]: # 
-                i_try = 0
-                while i_try<3:
-                    try:
-                        getSth = Sol[key].entries[-1]
-                    except:
-                        i_try += 1
-                        print(f"Fail to read Throughput capacity for the {i_try}th time")
-                    else:
-                        break
-                my_dict[key].append(abs(getSth))
-            elif key[0:5] in ["CDend","CCend","CVend","REend",
-                "CDsta","CCsta","CVsta","REsta",]:
-                step_no = eval("step_{}".format(key[0:2]))
-                if key[2:5] == "sta":
-                    my_dict[key].append  (
-                        Sol.cycles[cycle_no].steps[step_no][key[6:]].entries[0])
-                elif key[2:5] == "end":
-                    my_dict[key].append  (
-                        Sol.cycles[cycle_no].steps[step_no][key[6:]].entries[-1])
-                
+    for key in keys_cyc:
+        if key in ["Discharge capacity [A.h]"]:
+            my_dict[key].append(
+                Cache.Get_Point(step_CD, key, "end")
+                - Cache.Get_Point(step_CD, key, "sta"))
+        elif key in ["Throughput capacity [A.h]"]: # 
+            my_dict[key].append(abs(Get_Throughput_Last(Sol)))
+        elif key[0:5] in ["CDend","CCend","CVend","REend",
+            "CDsta","CCsta","CVsta","REsta",]:
+            my_dict[key].append(Cache.Get_Point(Steps[key[0:2]], key[6:], key[2:5]))
     # get location_based variables:
-    if len(keys_loc): 
-        for key in keys_loc:
-            if key in ["x_n [m]","x [m]","x_s [m]","x_p [m]"]:
-                #print("These variables only add once")
-                if not len(my_dict[key]):   # special: add only once
-                    my_dict[key] = (Sol[key].entries[:,-1]).tolist()
-            elif key[0:5] in ["CDend","CCend","CVend","REend",
-                            "CDsta","CCsta","CVsta","REsta",]:      
-                #print("These variables add multiple times")
-                step_no = eval("step_{}".format(key[0:2]))
-                if key[2:5] == "sta":
-                    my_dict[key].append  ((
-                        Sol.cycles[cycle_no].steps[step_no][key[6:]].entries[:,0]).tolist() )
-                elif key[2:5] == "end":
-                    my_dict[key].append ( (
-                        Sol.cycles[cycle_no].steps[step_no][key[6:]].entries[:,-1]).tolist()  )
+    for key in keys_loc:
+        if key in ["x_n [m]","x [m]","x_s [m]","x_p [m]"]:
+            if not len(my_dict[key]):   # special: add only once
+                my_dict[key] = Get_Var_At(Sol, [key], [-1])[key][:,0]
+        elif key[0:5] in ["CDend","CCend","CVend","REend",
+                        "CDsta","CCsta","CVsta","REsta",]:      
+            my_dict[key].append(Cache.Get_Point(Steps[key[0:2]], key[6:], key[2:5]))
     return my_dict                              
 
 def Get_SOH_LLI_LAM(my_dict_RPT,model_options,DryOut,mdic_dry,cap_0):
@@ -1127,11 +2748,9 @@ def Get_SOH_LLI_LAM(my_dict_RPT,model_options,DryOut,mdic_dry,cap_0):
 # define the model and run break-in cycle - 
 # input parameter: model_options, Experiment_Breakin, Para_0, mesh_list, submesh_strech
 # output: Sol_0 , Model_0, Call_Breakin
-def Run_Breakin(
-    model_options, Experiment_Breakin, 
-    Para_0, mesh_list, submesh_strech,cap_increase):
-
-    Model_0 = pb.lithium_ion.DFN(options=model_options)
+# Split from Run_Breakin, also used to resume a scan
+def Get_Model_0(model_options, Para_0, Model_Name="DFN"):
+    Model_0 = getattr(pb.lithium_ion, Model_Name)(options=model_options)
     # update 220926 - add diffusivity and conductivity as variables:
     c_e = Model_0.variables["Electrolyte concentration [mol.m-3]"]
     T = Model_0.variables["Cell temperature [K]"]
@@ -1139,6 +2758,14 @@ def Run_Breakin(
     sigma_e = Para_0["Electrolyte conductivity [S.m-1]"]
     Model_0.variables["Electrolyte diffusivity [m2.s-1]"] = D_e(c_e, T)
     Model_0.variables["Electrolyte conductivity [S.m-1]"] = sigma_e(c_e, T)
+    return Model_0
+
+def Run_Breakin(
+    model_options, Experiment_Breakin, 
+    Para_0, mesh_list, submesh_strech,cap_increase, Model_Name="DFN",
+    Deadline=None):
+
+    Model_0 = Get_Model_0(model_options, Para_0, Model_Name)
     var = pb.standard_spatial_vars  
     var_pts = {
         var.x_n: int(mesh_list[0]),  
@@ -1201,7 +2828,7 @@ def Run_Breakin(
                 solver = pb.CasadiSolver(),
                 var_pts=var_pts,
                 submesh_types=submesh_types) 
-            Call_Breakin = RioCallback()    
+            Call_Breakin = RioCallback(Deadline=Deadline)    
             Sol_0    = Sim_0.solve(calc_esoh=False,callbacks=Call_Breakin)
         except (
             pb.expression_tree.exceptions.ModelError,
@@ -1225,6 +2852,71 @@ def Run_Breakin(
 
     return Result_list_breakin
 
+# Automatic mesh. Run break-in and one short ageing set on 
+# meshes of increasing resolution until two neighbours give the same 
+# capacity, resistance and LLI within Tol (relative), then take the 
+# coarser one. The choice is saved in BasicPath/Mesh_Cache/, one json per 
+# model options and parameter set, so later rows skip the study
+def Get_Mesh_Metrics(
+        Model_Name, model_options, Para_0, Experiment_Breakin, 
+        Experiment_AGE, Cycles_AGE, Temper_i, mesh_list, submesh_strech, 
+        cap_increase, Summ_Args_RPT):
+    [Model_0,Sol_0,Call_Breakin] = Run_Breakin(
+        model_options, Experiment_Breakin, Para_0.copy(), mesh_list, 
+        submesh_strech, cap_increase, Model_Name)
+    if not isinstance(Sol_0, pb.solvers.solution.Solution):
+        return None
+    my_dict_RPT = Get_Summary_RPT(Model_0, Sol_0, *Summ_Args_RPT)["my_dict"]
+    [_, Sol_1, Call_Age, _] = Run_Model_Base_On_Last_Solution(
+        Model_0, Sol_0, Para_0.copy(), Experiment_AGE, Cycles_AGE, 
+        Temper_i, mesh_list, submesh_strech)
+    if not isinstance(Sol_1, pb.solvers.solution.Solution):
+        return None
+    Key_Li = "Total lithium capacity in particles [A.h]"
+    return [
+        my_dict_RPT["Discharge capacity [A.h]"][0], 
+        my_dict_RPT["Res_midSOC"][0],
+        Sol_0[Key_Li].entries[-1] - Sol_1[Key_Li].entries[-1], ]
+
+def Select_Mesh(
+        BasicPath, Para_dict_i, Model_Name, model_options, Para_0, 
+        Experiment_Breakin, Experiment_AGE, Cycles_AGE, Temper_i, 
+        submesh_strech, cap_increase, Summ_Args_RPT, Mesh_Candidates, Tol):
+    str_key = json.dumps([
+        Model_Name, str(model_options), str(Para_dict_i["Para_Set"]), 
+        str(submesh_strech), Mesh_Candidates, Tol])
+    Path_Cache = (
+        BasicPath + "/Mesh_Cache/" 
+        + hashlib.md5(str_key.encode()).hexdigest() + ".json")
+    try:
+        with open(Path_Cache) as file:
+            return json.load(file)["Mesh list"]
+    except (OSError, ValueError, KeyError):
+        pass
+    Metrics_All = [];  mesh_select = Mesh_Candidates[-1]
+    for i,mesh_list in enumerate(Mesh_Candidates):
+        Metrics = Get_Mesh_Metrics(
+            Model_Name, model_options, Para_0, Experiment_Breakin, 
+            Experiment_AGE, Cycles_AGE, Temper_i, mesh_list, submesh_strech, 
+            cap_increase, Summ_Args_RPT)
+        Metrics_All.append(Metrics)
+        print(f"Mesh study: {mesh_list} gives capacity, resistance, LLI of {Metrics}")
+        if i > 0 and Metrics_All[i-1] is not None and Metrics is not None:
+            Error = np.max(
+                np.abs(np.array(Metrics_All[i-1]) - np.array(Metrics)) 
+                / np.abs(np.array(Metrics)))
+            if Error <= Tol:
+                mesh_select = Mesh_Candidates[i-1]
+                break
+    os.makedirs(BasicPath + "/Mesh_Cache/", exist_ok=True)
+    with open(Path_Cache + f".{os.getpid()}", "w") as file:
+        json.dump({
+            "Key": str_key, "Mesh list": mesh_select, 
+            "Meshes": Mesh_Candidates[:len(Metrics_All)], 
+            "Metrics": Metrics_All}, file)
+    os.replace(Path_Cache + f".{os.getpid()}", Path_Cache)
+    return mesh_select
+
 # Input: Para_0
 # Output: mdic_dry, Para_0
 def Initialize_mdic_dry(Para_0,Int_ElelyExces_Ratio):
@@ -1896,21 +3588,166 @@ def Plot_Dryout(
     return
 
 # update 230312: add a function to get the discharge capacity and resistance
+# 0.1s resistance (mOhm) of one GITT pulse, from the end of 
+# the 1.2 s rest before it and only the first point of the pulse
+def Get_R0_Pulse(step_Rest, step_Pulse):
+    Pulse = Get_Var_At(step_Pulse, ["Terminal voltage [V]", "Current [A]"], [0])
+    return (
+        np.mean(step_Rest["Terminal voltage [V]"].entries[-10:-1])
+        - Pulse["Terminal voltage [V]"][0]
+    ) / Pulse["Current [A]"][0] * 1000
+
 def Get_0p1s_R0(sol_RPT,Index,cap_full):
     Res_0p1s = []; SOC = [100,];
     for i,index in enumerate(Index):
         cycle = sol_RPT.cycles[index]
-        Res_0p1s.append(   (
-            np.mean(cycle.steps[1]["Terminal voltage [V]"].entries[-10:-1])
-            - cycle.steps[2]["Terminal voltage [V]"].entries[0]
-        ) / cycle.steps[2]["Current [A]"].entries[0] * 1000)
+        Res_0p1s.append(Get_R0_Pulse(cycle.steps[1], cycle.steps[2]))
         if i > 0:
-            Dis_Cap = abs(
-                cycle.steps[2]["Discharge capacity [A.h]"].entries[0] 
-                - cycle.steps[2]["Discharge capacity [A.h]"].entries[-1] )
+            Dis_Cap = abs(np.diff(Get_Var_At(
+                cycle.steps[2], ["Discharge capacity [A.h]"])[
+                "Discharge capacity [A.h]"]))[0]
             SOC.append(SOC[-1]-Dis_Cap/cap_full*100)
     return Res_0p1s[12],Res_0p1s,SOC
 
+# With Options_Speed["GITT_Parallel"], the RPT has no GITT.
+# The pulses start instead from states of its C/10 discharge, one every 
+# Q_GITT (the charge of one pulse), and run side by side in Run_GITT_Parallel.
+# This is an approximation of the GITT run one pulse after another: the 
+# state before each pulse has a C/10 instead of a C/2 history, and the 
+# ageing during the GITT (about a day per RPT) is not simulated at all, 
+# which Run_P2_Excel says when it starts
+def Get_GITT_Seeds(Sol, step_0p1C_CD, Q_GITT, cap_full, N_Pulse=24):
+    step_CD = Sol.cycles[0].steps[step_0p1C_CD]
+    Dis_Cap = abs(
+        step_CD["Discharge capacity [A.h]"].entries 
+        - step_CD["Discharge capacity [A.h]"].entries[0])
+    Seeds = []; SOC = []
+    for i in range(N_Pulse):
+        Index = int(np.searchsorted(Dis_Cap, i * Q_GITT))
+        if Index >= len(Dis_Cap): # the GITT stops at V_min as well
+            break
+        if Index > 0 and (
+                i * Q_GITT - Dis_Cap[Index-1] < Dis_Cap[Index] - i * Q_GITT):
+            Index -= 1  # closest time point
+        Seed = Get_Sol_At(step_CD, Index)   # as starting_solution
+        Seed.cycles = [];   Seed.all_summary_variables = [];   Seed.all_first_states = []
+        Seed.solve_time = pb.TimerTime(0);  Seed.integration_time = pb.TimerTime(0)
+        Seeds.append(Seed)
+        SOC.append(100 - Dis_Cap[Index]/cap_full*100)
+    return Seeds, SOC
+
+# experiment of one pulse, with the rests before it as in exp_RPT_GITT_text
+def Get_GITT_Pulse_Experiment(exp_RPT_GITT_text, V_min):
+    return pb.Experiment([ (
+        exp_RPT_GITT_text[0][3], exp_RPT_GITT_text[0][0], exp_RPT_GITT_text[0][1],
+        f"Discharge at C/2 for 1 second or until {V_min}V (0.1 second period)",
+        ) ])
+
+# what a GITT pulse engine is built from, plain values only, so that 
+# any process can build its own: pybamm expression trees can't be sent to 
+# a new process, their ids are hashes of strings and differ there
+def Get_GITT_Recipe(
+        model_options, Model_Name, Para_0, exp_RPT_GITT_text, V_min, 
+        mesh_list, submesh_strech):
+    return [
+        model_options, Model_Name, Para_0.copy(), exp_RPT_GITT_text, V_min,
+        mesh_list, submesh_strech]
+
+# a ScanEngine whose RPT simulation is the pulse, built once per scan: 
+# all that Update_Para_Dryout changes between RPTs is an input as well
+def Get_GITT_Engine(Recipe, Use_Cache=False):
+    [model_options, Model_Name, Para_0, exp_RPT_GITT_text, V_min, 
+        mesh_list, submesh_strech] = Recipe
+    Model_0 = Get_Model_0(model_options, Para_0, Model_Name)
+    Experiment_Pulse = Get_GITT_Pulse_Experiment(exp_RPT_GITT_text, V_min)
+    Engine_GITT = ScanEngine(
+        Model_0, Para_0, None, Experiment_Pulse, mesh_list, submesh_strech)
+    Keys_New = [
+        key for key in Keys_Para_Dryout 
+        if key in Para_0.keys() and not key in Engine_GITT.Keys_Input]
+    Engine_GITT.Keys_Input += Keys_New
+    Engine_GITT.Para_sim.update(
+        {key: "[input]" for key in Keys_New}, check_already_exists=False)
+    if Use_Cache:
+        Engine_GITT.Sim_RPT = Engine_GITT.Get_Sim_Cached(Experiment_Pulse)
+    else:
+        Engine_GITT.Sim_RPT = Engine_GITT.Get_Sim(Experiment_Pulse)
+    Engine_GITT.Recipe = Recipe
+    return Engine_GITT
+
+# [t, y] of a seed in the state layout of the built pulse, so that only 
+# arrays go to the other processes; None if the states don't match
+def Get_GITT_Pulse_State(Engine_GITT, Seed):
+    Model_1st = Engine_GITT.Get_First_Built(Engine_GITT.Sim_RPT)
+    y0 = Get_y0_From_Last(Seed, Model_1st, 1.0, Engine_GITT.State_Maps)
+    if y0 is None:
+        return None
+    return [float(Seed.t[-1]), y0]
+
+def Run_GITT_Pulse(Engine_GITT, State, inputs, Deadline):
+    if State is None:
+        return np.nan
+    Sim = Engine_GITT.Sim_RPT
+    Model_1st = Engine_GITT.Get_First_Built(Sim)
+    Sol_seed = Engine_GITT.Get_Point_Solution(
+        State[0], State[1], Model_1st, inputs)
+    Sol_seed.cycles = [];   Sol_seed.all_summary_variables = []
+    Sol_seed.all_first_states = []
+    try:
+        Sol = Sim.solve(
+            starting_solution=Sol_seed, calc_esoh=False, inputs=inputs,
+            callbacks=RioCallback(Deadline=Deadline))
+        cycle = Sol.cycles[-1]
+        return Get_R0_Pulse(cycle.steps[-2], cycle.steps[-1])
+    except TimeoutError:
+        return np.nan
+    except Exception as e:
+        print(f"Fail to run GITT pulse due to {e}")
+        return np.nan
+
+# every pool process builds its own pulse engine once, from the recipe
+def Init_GITT_Pool(Recipe):
+    global Engine_GITT_Pool
+    Engine_GITT_Pool = Get_GITT_Engine(*Recipe)
+def Run_GITT_Pulse_Pool(Task):
+    return Run_GITT_Pulse(Engine_GITT_Pool, *Task)
+
+# the pulses run on a pool of Pool_No processes, or one after another; 
+# those not done by Deadline (time.time()) are nan
+def Run_GITT_Parallel(
+        Engine_GITT, Para_update, Temper_RPT, Seeds, SOC, Pool_No, Deadline=None):
+    inputs = Engine_GITT.Get_Inputs_Built(
+        Engine_GITT.Get_First_Built(Engine_GITT.Sim_RPT), 
+        Engine_GITT.Get_Inputs(Para_update, Temper_RPT))
+    States = [Get_GITT_Pulse_State(Engine_GITT, Seed) for Seed in Seeds]
+    Pool_No = min(int(Pool_No), len(Seeds))
+    Res_full = []
+    if Pool_No > 1:
+        with multiprocessing.Pool(
+                Pool_No, initializer=Init_GITT_Pool, 
+                initargs=(Engine_GITT.Recipe,)) as pool:
+            Res_iter = pool.imap(
+                Run_GITT_Pulse_Pool, 
+                [[State, inputs, Deadline] for State in States])
+            try:
+                for i in range(len(Seeds)):
+                    Res_full.append(Res_iter.next(
+                        None if Deadline is None 
+                        else max(Deadline - time.time(), 0)))
+            except multiprocessing.TimeoutError:
+                pass    # leaving the with block terminates the pool
+    else:
+        for State in States:
+            if Deadline is not None and time.time() > Deadline:
+                break
+            Res_full.append(Run_GITT_Pulse(Engine_GITT, State, inputs, Deadline))
+    N_Done = int(np.sum(np.isfinite(Res_full)))
+    if Deadline is not None and time.time() > Deadline and N_Done < len(Seeds):
+        print(f"GITT pulses stopped at the time limit, {N_Done} of {len(Seeds)} done")
+    Res_full = Res_full + [np.nan] * (len(Seeds) - len(Res_full))
+    Res_midSOC = Res_full[12] if len(Res_full) > 12 else np.nan
+    return Res_midSOC,Res_full,SOC
+
 # update 230517 add a function to get R_50%SOC from C/2 discharge
 def Get_R_from_0P5C_CD(step_0P5C_CD,cap_full):
     # print("Total data points: ",len(step_0P5C_CD["Time [h]"].entries))
@@ -2106,6 +3943,18 @@ def Compare_Exp_Model(
             punish],2)
     return mpe_all
 
+# Error of the RPTs done so far, checked after every RPT 
+# to abort scans that already diverged from the experiment. Same as 
+# mpe_tot but without the punishment for ending early
+def Get_Running_Error(
+        my_dict_RPT, XY_pack, model_options, DryOut, mdic_dry, cap_0):
+    my_dict_i = Get_SOH_LLI_LAM(
+        dict(my_dict_RPT), model_options, DryOut, mdic_dry, cap_0)
+    mpe_all = Compare_Exp_Model(
+        my_dict_i, XY_pack, None, None, None, None, None, None, None, None, 
+        PlotCheck=False)
+    return mpe_all[0] - (mpe_all[7]>1.0) * mpe_all[7] * 2
+
 # read scan files:
 def load_combinations_from_csv(Para_file):
     dataframe = pd.read_csv(Para_file)
@@ -2123,7 +3972,7 @@ def load_combinations_from_csv(Para_file):
 
     return Para_dict_list
 
-def Initialize_exp_text( index_exp, V_max, V_min, Add_Rest):
+def Initialize_exp_text( index_exp, V_max, V_min, Add_Rest, GITT_Sparse=False):
     """ TODO: if at the end of ageing cycles the cell SOC is NOT 100%SOC, then
     need to top it up before RPT or at the start of RPT! That should involve 
     "0.3C charge to 4.2V" if the SOC after ageing cycles is far away from 100%
@@ -2319,6 +4168,17 @@ def Initialize_exp_text( index_exp, V_max, V_min, Add_Rest):
         f"Discharge at C/2 for 4.8 minutes or until {V_min}V (0.1 second period)",
         "Rest for 1 hour", # (5 minute period)  
         ) ]
+    # Get_0p1s_R0 only uses the end of the 1.2 s rest and the 
+    # first and last point of each pulse, so the pulse does not need the 
+    # 0.1 s period. The 1 hour rest keeps its period: a coarser one changes 
+    # the relaxation (and so the next pulse) by more than the solver tolerance
+    if GITT_Sparse:
+        exp_RPT_GITT_text = [ (
+            "Rest for 5 minutes (1 minute period)",  
+            "Rest for 1.2 seconds (0.1 second period)",  
+            f"Discharge at C/2 for 4.8 minutes or until {V_min}V (1 minute period)",
+            "Rest for 1 hour",
+            ) ]
     exp_refill = [ (
         f"Charge at 0.3C until {V_max}V",
         f"Hold at {V_max}V until C/100",
@@ -2647,7 +4507,7 @@ def Write_Dict_to_Excel(
         model_options,my_dict_RPT,mdic_dry,
         DryOut,Scan_i,str_exp_AGE_text,
         str_exp_RPT_text,str_error_AGE_final,
-        str_error_RPT,log_messages,
+        str_error_RPT,log_messages,Save_Excel=True,
         ): 
     # *mpe_all = [mpe_tot,mpe_1,mpe_2,mpe_3,mpe_4,mpe_5,mpe_6,punish]
     Dict_Excel = {}
@@ -2731,16 +4591,191 @@ def Write_Dict_to_Excel(
     # df_excel = pd.DataFrame(Dict_Excel)
     df_excel = pd.DataFrame([Dict_Excel])
     book_name_xlsx_seperate =   str(Scan_i)+ '_' + book_name_xlsx
-    df_excel.to_excel(
-        BasicPath + Target + "Excel/" 
-        +book_name_xlsx_seperate,
-        index=False, engine='openpyxl')
+    if Save_Excel:  # otherwise only in the results store
+        df_excel.to_excel(
+            BasicPath + Target + "Excel/" 
+            +book_name_xlsx_seperate,
+            index=False, engine='openpyxl')
     return df_excel
 
 
+# Experiment data of one Exp and temperature, "nan" if none
+def Get_Exp_Data(Path_to_ExpData, index_exp, Temp_K):
+    [
+        Exp_All_Cell,Temp_Cell_Exp_All,
+        Exp_Path,Exp_head,Exp_Temp_Cell
+        ]  = Get_Exp_Pack()
+    # index_exp should be 1~5 to really have experimental data
+    if index_exp in list(np.arange(1,6)) and int(Temp_K) in [10,25,40]:
+        Temp_Cell_Exp = Temp_Cell_Exp_All[index_exp-1] 
+        Exp_Any_AllData = Read_Exp(
+            Path_to_ExpData,Exp_All_Cell[index_exp-1],
+            Exp_Path,Exp_head,Exp_Temp_Cell[index_exp-1],
+            index_exp-1)
+    else:
+        Temp_Cell_Exp = "nan"
+        Exp_Any_AllData = "nan"
+    return Temp_Cell_Exp,Exp_Any_AllData
+
+# All plots of one scan from a plot job (dict, see 
+# Run_P2_Excel), so they can be made in the scan itself ("Plot": "Inline"),
+# in a background process ("Async") or later in a batch ("Later")
+def Plot_Scan(Job, Exp_Data=None):
+    mpl.rc('font', **{'family' : 'DejaVu Sans','size' : Job["fs"]})
+    if Exp_Data is None:
+        Exp_Data = Get_Exp_Data(
+            Job["Path_to_ExpData"], Job["index_exp"], Job["Temper_i"]-273.15)
+    [Temp_Cell_Exp,Exp_Any_AllData] = Exp_Data
+    [my_dict_RPT,my_dict_AGE,mdic_dry] = [
+        Job["my_dict_RPT"],Job["my_dict_AGE"],Job["mdic_dry"]]
+    [Scan_i,Re_No,index_exp,Temper_i,model_options,BasicPath,Target,fs,dpi] = [
+        Job[key] for key in [
+            "Scan_i","Re_No","index_exp","Temper_i","model_options",
+            "BasicPath","Target","fs","dpi"]]
+    if not isinstance(Job["XY_pack"], str):
+        Compare_Exp_Model( my_dict_RPT, Job["XY_pack"], Scan_i, Re_No,
+            index_exp, Temper_i,BasicPath, Target,fs,dpi, PlotCheck=True)
+    Plot_Cyc_RPT_4(
+        my_dict_RPT, Exp_Any_AllData,Temp_Cell_Exp,
+        Job["XY_pack"],index_exp, Job["Plot_Exp"], Job["R_from_GITT"],
+        Scan_i,Re_No,Temper_i,model_options,
+        BasicPath, Target,fs,dpi)
+    Plot_DMA_Dec(my_dict_RPT,Scan_i,Re_No,Temper_i,model_options,
+        BasicPath, Target,fs,dpi)
+    if len(my_dict_AGE["CDend Porosity"])>1:
+        Plot_Loc_AGE_4(
+            my_dict_AGE,Scan_i,Re_No,index_exp,Temper_i,
+            model_options,BasicPath, Target,fs,dpi)
+        colormap = "cool"
+        Plot_HalfCell_V(
+            my_dict_RPT,my_dict_AGE,Scan_i,Re_No,index_exp,colormap,
+            Temper_i,model_options,BasicPath, Target,fs,dpi)
+    if Job["DryOut"] == "On":
+        Plot_Dryout(
+            Job["Cyc_Update_Index"],mdic_dry,Job["ce_EC_0"],index_exp,Temper_i,
+            Scan_i,Re_No,BasicPath, Target,fs,dpi)
+
+# job files are in Plots/Jobs/, plotted by PlotProcs or Run_Plot_Jobs
+def Save_Plot_Job(Job):
+    Path_Jobs = Job["BasicPath"] + Job["Target"] + "Plots/Jobs/"
+    os.makedirs(Path_Jobs, exist_ok=True)
+    Path_Job = Path_Jobs + f"{Job['Scan_i']}_Re_{Job['Re_No']}-Plot_Job.pkl"
+    with open(Path_Job + ".tmp", "wb") as file:
+        pickle.dump(Job, file)
+    os.replace(Path_Job + ".tmp", Path_Job)
+    return Path_Job
+
+# Background plot processes of one long-lived process (the 
+# scan pool or queue loop, or a scan run on its own), at most Max_No at 
+# a time, so the scan (and its core) is free at once; the other jobs 
+# wait in Plots/Jobs/. Return code 0: plotted (here or by someone else), 
+# 1: failed, the job stays for Run_Plot_Jobs
+class PlotProcs(object):
+    def __init__(self, Max_No=2):
+        self.Max_No = Max_No
+        self.Procs = []     # [Popen, Path_Job]
+        self.Codes = []     # [Path_Job, return code]
+
+    def Start(self, Path_Job):
+        Path_Fun = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(os.path.dirname(Path_Job), "Plot.log"), "a") as Log:
+            Proc = subprocess.Popen(
+                [sys.executable, "-c", 
+                 f"import sys, os; sys.path.insert(0, {Path_Fun!r}); "
+                 f"from Fun_NC import Run_Plot_Job; "
+                 f"sys.exit(0 if Run_Plot_Job({Path_Job!r}) "
+                 f"or not os.path.exists({Path_Job!r}) else 1)"],
+                stdout=Log, stderr=Log, stdin=subprocess.DEVNULL,
+                start_new_session=True)    # not killed with the scan
+        self.Procs.append([Proc, Path_Job])
+
+    def Poll(self):
+        for Proc_i in list(self.Procs):
+            [Proc, Path_Job] = Proc_i
+            if Proc.poll() is None:
+                continue
+            self.Procs.remove(Proc_i)
+            self.Codes.append([Path_Job, Proc.returncode])
+            if not Proc.returncode == 0:
+                print(f"Fail to plot {Path_Job}, return code {Proc.returncode}, see Plot.log")
+        return len(self.Procs)
+
+    # start jobs of an output folder (BasicPath + Target) while there is room
+    def Run(self, Path_Target):
+        self.Poll()
+        Failed = [Path_Job for Path_Job,Code in self.Codes if not Code == 0]
+        Started = [Path_Job for _,Path_Job in self.Procs]
+        for Path_Job in sorted(glob.glob(os.path.join(Path_Target, "Plots", "Jobs", "*-Plot_Job.pkl"))):
+            if len(self.Procs) >= self.Max_No:
+                break
+            if not Path_Job in Failed + Started:
+                self.Start(Path_Job)
+        return len(self.Procs)
+
+    def Wait(self):
+        for Proc,_ in self.Procs:
+            Proc.wait()
+        self.Poll()
+        return self.Codes
+
+    def Save(self, Path_csv):
+        pd.DataFrame(self.Codes, columns=["Plot job", "Return code"]).to_csv(
+            Path_csv, index=False)
+
+# a job is claimed by renaming it, so a batch and a background process 
+# never plot the same job; done jobs are removed unless Keep
+def Run_Plot_Job(Path_Job, Exp_Cache=None, Keep=False):
+    mpl.use("Agg")
+    Path_Claim = Path_Job + f".{os.getpid()}"
+    try:
+        os.rename(Path_Job, Path_Claim)
+    except FileNotFoundError:   # plotted by someone else
+        return False
+    try:
+        with open(Path_Claim, "rb") as file:
+            Job = pickle.load(file)
+        Key_Exp = (Job["Path_to_ExpData"], Job["index_exp"], Job["Temper_i"])
+        if Exp_Cache is None:
+            Exp_Cache = {}
+        if not Key_Exp in Exp_Cache:
+            Exp_Cache[Key_Exp] = Get_Exp_Data(
+                Job["Path_to_ExpData"], Job["index_exp"], Job["Temper_i"]-273.15)
+        t_0 = time.time()
+        Plot_Scan(Job, Exp_Cache[Key_Exp])
+        plt.close("all")
+        print(f"Scan {Job['Scan_i']} Re {Job['Re_No']}: Finish all plots within {time.time()-t_0:.1f} s")
+    except Exception:
+        print(f"Fail to plot {Path_Job}")
+        traceback.print_exc()
+        os.rename(Path_Claim, Path_Job)     # try again in the next batch
+        return False
+    if Keep:
+        os.rename(Path_Claim, Path_Job)
+    else:
+        os.remove(Path_Claim)
+    return True
+
+# plot the jobs left in an output folder (BasicPath + Target), all or 
+# only those of Scans, in Pool_No processes
+def Run_Plot_Jobs(Path_Target, Scans=None, Pool_No=1, Keep=False):
+    Paths_Job = []
+    for Path_Job in sorted(glob.glob(os.path.join(Path_Target, "Plots", "Jobs", "*-Plot_Job.pkl"))):
+        Scan_i = int(re.match(r"(\d+)_Re_", os.path.basename(Path_Job)).group(1))
+        if Scans is None or Scan_i in [int(i) for i in Scans]:
+            Paths_Job.append(Path_Job)
+    print(f"{len(Paths_Job)} plot jobs in {Path_Target}")
+    if Pool_No > 1 and len(Paths_Job) > 1:
+        with multiprocessing.Pool(min(Pool_No, len(Paths_Job))) as pool:
+            Done = pool.starmap(
+                Run_Plot_Job, [(Path_Job, None, Keep) for Path_Job in Paths_Job])
+    else:
+        Exp_Cache = {}
+        Done = [Run_Plot_Job(Path_Job, Exp_Cache, Keep) for Path_Job in Paths_Job]
+    return Done
+
 def Run_P2_Excel(
     Para_dict_i,  Path_List,  Re_No,        
-    Timelimit,    Options): 
+    Timelimit,    Options,  Options_Speed=None): 
     ##########################################################
     ##############    Part-0: Log of the scripts    ##########
     ##########################################################
@@ -2754,6 +4789,8 @@ def Run_P2_Excel(
     #                and at Exp-2,3,5
     # 240429: tidy up the script
     # idea to tidy up: create a class: 
+    # Add Options_Speed (dict, see Options_Speed_Default), 
+    #                "Engine" builds the model once and reuses it for all segments
 
     ##########################################################
     ##############    Part-1: Initialization    ##############
@@ -2764,7 +4801,17 @@ def Run_P2_Excel(
         Plot_Exp,Timeout,Return_Sol,
         Check_Small_Time,R_from_GITT,
         dpi,fs] = Options
+    Options_Speed = Get_Options_Speed(Options_Speed)
+    # Results to per-scan files, the results store, or both
+    Save_Files = Options_Speed["Store"] in ["Files", "Both"]
+    Save_Store = Options_Speed["Store"] in ["Parquet", "Both"]
+    Lean = Options_Speed["Lean"]    # compact records, see Get_Sol_Lean
+    if Options_Speed["Timeout_Inline"]:
+        TimeoutFunc_i = TimeoutInline
+    else:
+        TimeoutFunc_i = TimeoutFunc
     ModelTimer = pb.Timer() # start counting time
+    t_start_run = time.time()   # for the cost history
     if Check_Small_Time == True:
         SmallTimer = pb.Timer()
     import io
@@ -2798,22 +4845,13 @@ def Run_P2_Excel(
     index_exp = int(Para_dict_i["Exp No."]) # index for experiment set, can now go for 2,3,5
     Temp_K = Para_dict_i["Ageing temperature"]  
     Round_No = f"Case_{Scan_i}_Exp_{index_exp}_{Temp_K}oC"  # index to identify different rounds of running 
+    Sol_Store = None    # kept solutions go to disk, see SolSpill
+    if Options_Speed["Spill"] and Return_Sol == True and not Lean:
+        Sol_Store = SolSpill(BasicPath + Target + f"Sols/{Scan_i}_Re_{Re_No}/")
     # Load Niall's data
-    [
-        Exp_All_Cell,Temp_Cell_Exp_All,
-        Exp_Path,Exp_head,Exp_Temp_Cell
-        ]  = Get_Exp_Pack()
     book_name_xlsx = f'Re_{Re_No}_{purpose}.xlsx'
-    # index_exp should be 1~5 to really have experimental data
-    if index_exp in list(np.arange(1,6)) and int(Temp_K) in [10,25,40]:
-        Temp_Cell_Exp = Temp_Cell_Exp_All[index_exp-1] 
-        Exp_Any_AllData = Read_Exp(
-            Path_to_ExpData,Exp_All_Cell[index_exp-1],
-            Exp_Path,Exp_head,Exp_Temp_Cell[index_exp-1],
-            index_exp-1)
-    else:
-        Temp_Cell_Exp = "nan"
-        Exp_Any_AllData = "nan"
+    Temp_Cell_Exp,Exp_Any_AllData = Get_Exp_Data(
+        Path_to_ExpData, index_exp, Temp_K)
     # update 231205: write a function to get tot_cyc,cyc_age,update
     tot_cyc,cyc_age,update = Get_tot_cyc(Runshort,index_exp,Temp_K,Scan_i)
     Para_dict_i["Total ageing cycles"]       = int(tot_cyc)
@@ -2835,7 +4873,7 @@ def Run_P2_Excel(
         exp_refill,exp_adjust_before_age,
         step_0p1C_CD, step_0p1C_CC, step_0p1C_RE, step_0p5C_CD
         ] = Initialize_exp_text(
-        index_exp, V_max, V_min, Add_Rest)
+        index_exp, V_max, V_min, Add_Rest, Options_Speed["GITT_Sparse"])
     cycle_no = -1; 
 
 
@@ -2858,10 +4896,18 @@ def Run_P2_Excel(
 
     # define experiment
     Experiment_Long   = pb.Experiment( exp_AGE_text * Update_Cycles  )  
+    # GITT pulses side by side instead of in the RPT, see Get_GITT_Seeds
+    Pool_GITT = int(Options_Speed["GITT_Parallel"]) if R_from_GITT else 0
+    R_from_GITT_Seq = R_from_GITT and not Pool_GITT
+    Q_GITT = None   # charge of one C/2 pulse of 4.8 minutes
+    Engine_GITT = None  # see Get_GITT_Engine
+    if Pool_GITT:
+        Q_GITT = 0.5 * Para_0["Nominal cell capacity [A.h]"] * 4.8 / 60
+        print(f"Scan {Scan_i} Re {Re_No}: GITT_Parallel is on, the GITT pulses start from C/10 discharge states and the ageing during the GITT is not simulated")
     # update 24-04-2023: delete GITT
     # Update 01-11-2023 add GITT back but with an option 
     # update 231210: refine experiment to avoid charge or hold at 4.2V
-    if R_from_GITT: 
+    if R_from_GITT_Seq: 
         Experiment_Breakin= pb.Experiment( 
             exp_breakin_text * 1
             + exp_RPT_GITT_text*24  + exp_refill * 1    # only do refil if have GITT
@@ -2880,9 +4926,54 @@ def Run_P2_Excel(
             + exp_adjust_before_age*1) 
     
 
+    # Automatic mesh instead of "Mesh list", see Select_Mesh
+    if Options_Speed["Mesh_Auto"]:
+        Cycles_Mesh = min(Update_Cycles, Options_Speed["Mesh_Auto_Cycles"])
+        mesh_list = Select_Mesh(
+            BasicPath, Para_dict_i, Options_Speed["Model"], model_options, 
+            Para_0, Experiment_Breakin, pb.Experiment(exp_AGE_text * Cycles_Mesh), 
+            Cycles_Mesh, Temper_i, submesh_strech, cap_increase, 
+            [keys_all_RPT, 5, R_from_GITT_Seq, Cyc_Index_Res if R_from_GITT_Seq else None,
+                step_0p1C_CD, step_0p1C_CC,step_0p1C_RE , step_AGE_CV, step_0p5C_CD],
+            Options_Speed["Mesh_Auto_List"], Options_Speed["Mesh_Auto_Tol"])
+        Para_dict_i["Mesh list"] = str(mesh_list)  # goes to excel
+        print(f"Scan {Scan_i} Re {Re_No}: Use mesh {mesh_list}")
+    Key_Result = None
+    if Options_Speed["Result_Cache"]:
+        Key_Result = Get_Result_Key(
+            Para_0, model_options, 
+            [str_exp_AGE_text, str_exp_RPT_text, str(exp_breakin_text), 
+                str_exp_RPT_GITT_text, str(exp_refill), str(exp_adjust_before_age)],
+            mesh_list, submesh_strech, 
+            [Total_Cycles,Cycle_bt_RPT,Update_Cycles,RPT_Cycles,Temper_i,Temper_RPT],
+            R_from_GITT if not Pool_GITT else "Parallel", Options_Speed)
+        Cached = Load_Result_Cache(BasicPath, Key_Result)
+        if Cached is not None:
+            midc_merge = Use_Result_Cache(
+                Cached, Para_dict_i, Scan_i, Re_No, BasicPath, Target, 
+                book_name_xlsx, purpose, Save_Files, Save_Store)
+            return midc_merge,Sol_RPT,Sol_AGE,["Result cache","Result cache"]
     #####  index definition ######################
     Small_Loop =  int(Cycle_bt_RPT/Update_Cycles);   
     SaveTimes = int(Total_Cycles/Cycle_bt_RPT);   
+    # Per-segment Timelimit predicted from the cost history
+    if Options_Speed["Timelimit_Predict"]:
+        Predictor = CostPredictor(Runshort).Fit(Load_Cost_History(BasicPath))
+        Timelimit_0 = Timelimit
+        Timelimit = Get_Timelimit_Predicted(
+            Predictor, Para_dict_i, 
+            Cycle_bt_RPT if Options_Speed["Adaptive"] else Update_Cycles,
+            Timelimit, Options_Speed["Timelimit_Factor"])
+        if Timelimit < Timelimit_0:
+            print(f"Scan {Scan_i} Re {Re_No}: Timelimit per segment is {Timelimit} s from the cost history")
+    # Stop early if the error against experiment after 
+    # an RPT is already above Abort_MPE (%), see Get_Running_Error
+    XY_pack_Abort = None;  Flag_Abort = False
+    if (Options_Speed["Abort_MPE"] is not None 
+            and index_exp in list(np.arange(1,6)) 
+            and int(Temper_i- 273.15) in [10,25,40]):
+        XY_pack_Abort = Get_Cell_Mean_1T_1Exp(
+            Exp_Any_AllData, Temp_Cell_Exp[str(int(Temper_i- 273.15))])
 
     # initialize my_dict for outputs
     my_dict_RPT = {}
@@ -2915,6 +5006,15 @@ def Run_P2_Excel(
         mdic_dry,Para_0 = Initialize_mdic_dry(Para_0,Int_ElelyExces_Ratio)
     else:
         mdic_dry ={}
+    # Re_No > 0 goes on from the last checkpoint of this scan
+    Path_Check = Get_Checkpoint_Path(BasicPath, Target, Scan_i)
+    Checkpoint = None
+    if Re_No > 0:
+        Checkpoint = Load_Checkpoint(Path_Check)
+        if Checkpoint is None:
+            print(f"Scan {Scan_i} Re {Re_No}: No checkpoint, start from break-in")
+        else:
+            print(f"Scan {Scan_i} Re {Re_No}: Resume from checkpoint of Re {Checkpoint['Re_No']} at {Checkpoint['cycle_count']} cycles")
     if Check_Small_Time == True:
         print(f'Scan {Scan_i} Re {Re_No}: Spent {SmallTimer.time()} on Initialization')
         SmallTimer.reset()
@@ -2927,23 +5027,29 @@ def Run_P2_Excel(
     try:  
         # Timelimit = int(3600*2)
         # the following turns on for HPC only!
-        if Timeout == True:
-            timeout_RPT = TimeoutFunc(
+        if Checkpoint is not None: # restart: no break-in, Sol_0 is a list
+            Result_list_breakin = [
+                Get_Model_0(model_options, Para_0, Options_Speed["Model"]),
+                [Checkpoint["Summ_Last"]["dict_short"].copy(), 
+                    Checkpoint["Summ_Last"]["Thr"]],
+                RioCallback()]
+        elif Timeout == True:
+            timeout_RPT = TimeoutFunc_i(
                 Run_Breakin, 
                 timeout=Timelimit, 
                 timeout_val=Timeout_text)
             Result_list_breakin  = timeout_RPT(
                 model_options, Experiment_Breakin, 
                 Para_0, mesh_list, submesh_strech,
-                cap_increase)
+                cap_increase, Options_Speed["Model"])
         else:
             Result_list_breakin  = Run_Breakin(
                 model_options, Experiment_Breakin, 
                 Para_0, mesh_list, submesh_strech,
-                cap_increase)
+                cap_increase, Options_Speed["Model"])
         [Model_0,Sol_0,Call_Breakin] = Result_list_breakin
-        if Return_Sol == True:
-            Sol_RPT.append(Sol_0)
+        if Return_Sol == True and not Lean:
+            Sol_RPT.append(Sol_0 if Sol_Store is None else Sol_Store.Add(Sol_0, "RPT"))
         if Call_Breakin.success == False:
             print("Fail due to Experiment error or infeasible")
             1/0
@@ -2969,25 +5075,43 @@ def Run_P2_Excel(
             SmallTimer.reset()
         else:
             print(f"Scan {Scan_i} Re {Re_No}: Finish break-in cycle")
-        # post-process for break-in cycle - 0.1C only
-        my_dict_RPT = GetSol_dict (my_dict_RPT,keys_all_RPT, Sol_0, 
-            0, step_0p1C_CD, step_0p1C_CC,step_0p1C_RE , step_AGE_CV   )
-        # update 230517 - Get R from C/2 discharge only, discard GITT
-        cap_full = 5; 
-        if R_from_GITT: 
-            Res_midSOC,Res_full,SOC_Res = Get_0p1s_R0(Sol_0,Cyc_Index_Res,cap_full)
-        else: 
-            step_0P5C_CD = Sol_0.cycles[0].steps[step_0p5C_CD]
-            Res_midSOC,Res_full,SOC_Res = Get_R_from_0P5C_CD(step_0P5C_CD,cap_full)
-        my_dict_RPT["SOC_Res"].append(SOC_Res)
-        my_dict_RPT["Res_full"].append(Res_full)
-        my_dict_RPT["Res_midSOC"].append(Res_midSOC)    
-
-        my_dict_RPT["avg_Age_T"].append(Temper_i-273.15)  # Update add 230617              
-        del SOC_Res,Res_full,Res_midSOC
-        cycle_count =0
-        my_dict_RPT["Cycle_RPT"].append(cycle_count)
-        Cyc_Update_Index.append(cycle_count)
+        if Checkpoint is None:
+            # post-process for break-in cycle - 0.1C only
+            my_dict_RPT = GetSol_dict (my_dict_RPT,keys_all_RPT, Sol_0, 
+                0, step_0p1C_CD, step_0p1C_CC,step_0p1C_RE , step_AGE_CV   )
+            # update 230517 - Get R from C/2 discharge only, discard GITT
+            cap_full = 5; 
+            if R_from_GITT_Seq: 
+                Res_midSOC,Res_full,SOC_Res = Get_0p1s_R0(Sol_0,Cyc_Index_Res,cap_full)
+            elif Pool_GITT:
+                Engine_GITT = Get_GITT_Engine(Get_GITT_Recipe(
+                    model_options, Options_Speed["Model"], Para_0, 
+                    exp_RPT_GITT_text, V_min, mesh_list, submesh_strech), 
+                    Options_Speed["Cache"])
+                Res_midSOC,Res_full,SOC_Res = Run_GITT_Parallel(
+                    Engine_GITT, Para_0, Para_0["Ambient temperature [K]"], 
+                    *Get_GITT_Seeds(Sol_0, step_0p1C_CD, Q_GITT, cap_full), Pool_GITT,
+                    time.time() + Timelimit if Timeout else None)
+            else: 
+                step_0P5C_CD = Sol_0.cycles[0].steps[step_0p5C_CD]
+                Res_midSOC,Res_full,SOC_Res = Get_R_from_0P5C_CD(step_0P5C_CD,cap_full)
+            my_dict_RPT["SOC_Res"].append(SOC_Res)
+            my_dict_RPT["Res_full"].append(Res_full)
+            my_dict_RPT["Res_midSOC"].append(Res_midSOC)    
+
+            my_dict_RPT["avg_Age_T"].append(Temper_i-273.15)  # Update add 230617              
+            del SOC_Res,Res_full,Res_midSOC
+            cycle_count =0
+            my_dict_RPT["Cycle_RPT"].append(cycle_count)
+            Cyc_Update_Index.append(cycle_count)
+            if Return_Sol == True and Lean: # after the post-processing
+                Sol_RPT.append(Get_Sol_Lean(Sol_0))
+        else:
+            my_dict_RPT   = Checkpoint["my_dict_RPT"]
+            my_dict_AGE   = Checkpoint["my_dict_AGE"]
+            mdic_dry      = Checkpoint["mdic_dry"]
+            cycle_count   = Checkpoint["cycle_count"]
+            Cyc_Update_Index = Checkpoint["Cyc_Update_Index"]
         Flag_Breakin = True
         if Check_Small_Time == True:    
             print(f"Scan {Scan_i} Re {Re_No}: Finish post-process for break-in cycle within {SmallTimer.time()}")
@@ -2996,46 +5120,188 @@ def Run_P2_Excel(
             print(f"Scan {Scan_i} Re {Re_No}: Finish post-process for break-in cycle")
         
     Flag_AGE = True; Flag_partial_AGE = False
+    Cost_Log = Initialize_Cost_Log(Options_Speed["Model"])
+    Cost_Log["Time break-in [s]"] = time.time() - t_start_run
     str_error_AGE_final = "Empty";   str_error_RPT = "Empty"; 
     DeBug_List_RPT = "Break in fail"; DeBug_List_AGE = "Break in fail"
+    Worker = None
     #############################################################
     #######   2-2: Write a big loop to finish the long experiment    
     if Flag_Breakin == True: 
         k=0
         # Para_All.append(Para_0);Model_All.append(Model_0);Sol_All_i.append(Sol_0); 
-        Para_0_Dry_old = Para_0;     Model_Dry_old = Model_0  ; Sol_Dry_old = Sol_0;   del Model_0,Sol_0
+        Para_0_Dry_old = Para_0;     Model_Dry_old = Model_0  ; Sol_Dry_old = Sol_0;   
+        # Post-processing goes through compact summaries, 
+        #                Summ_Last is the one of the last successful run
+        # Adaptive length of ageing sets, see SegmentScheduler
+        Scheduler = None;   Cycs_to_RPT_0 = None
+        Experiments_AGE = {Update_Cycles: Experiment_Long}
+        if Options_Speed["Adaptive"]:
+            Scheduler = SegmentScheduler(
+                Update_Cycles, Cycle_bt_RPT, 
+                Options_Speed["Adaptive_Tol_Dry"], Options_Speed["Adaptive_Tol_LLI"])
+            Small_Loop = max(int(Cycle_bt_RPT), 1)  # at most one set per cycle
+        i_0 = 0;   avg_Age_T_0 = []  # where to start the first small loop
+        if Checkpoint is None:
+            Summ_Last = Get_Summary_Base(Model_0, Sol_0); Flag_Last_RPT = True
+            Summ_AGE_Last = None
+        else:
+            k = Checkpoint["k"];   i_0 = Checkpoint["i"]
+            avg_Age_T_0 = Checkpoint["avg_Age_T"]
+            Para_0_Dry_old = Para_0.copy()
+            Para_0_Dry_old.update(Checkpoint["Para_Dryout"], check_already_exists=False)
+            Summ_Last = Checkpoint["Summ_Last"]; Flag_Last_RPT = Checkpoint["Flag_Last_RPT"]
+            Summ_AGE_Last = Checkpoint["Summ_AGE_Last"]
+            Flag_partial_AGE = Checkpoint["Flag_partial_AGE"]
+            Cycs_to_RPT_0 = Checkpoint.get("Cycs_to_RPT")
+            if Scheduler is not None and Checkpoint.get("Scheduler") is not None:
+                Scheduler.Set_State(Checkpoint["Scheduler"])
+            if Flag_partial_AGE == True: # no more ageing after a partial set
+                if i_0 == 0:    # and its RPT is also done
+                    k = SaveTimes
+                else:
+                    i_0 = Small_Loop;  Cycs_to_RPT_0 = 0
+        if Lean: # Sol_0 is only the start of the first ageing set from here on
+            Sol_0 = Get_Sol_Last(Sol_0);    Sol_Dry_old = Sol_0
+        def Get_Checkpoint(k, i, avg_Age_T, Cycs_to_RPT=None):
+            return {
+                "Re_No": Re_No, "k": k, "i": i, "avg_Age_T": avg_Age_T, 
+                "Cycs_to_RPT": Cycs_to_RPT, 
+                "Scheduler": None if Scheduler is None else Scheduler.Get_State(),
+                "cycle_count": cycle_count, "Cyc_Update_Index": Cyc_Update_Index,
+                "my_dict_RPT": my_dict_RPT, "my_dict_AGE": my_dict_AGE, 
+                "mdic_dry": mdic_dry, "Para_Dryout": Get_Para_Dryout(Para_0_Dry_old),
+                "Summ_Last": Summ_Last, "Flag_Last_RPT": Flag_Last_RPT,
+                "Summ_AGE_Last": Summ_AGE_Last, 
+                "Flag_partial_AGE": Flag_partial_AGE}
+        # Build once here, so forked TimeoutFunc children inherit it
+        Run_AGE_i = Run_Model_Base_On_Last_Solution
+        Run_RPT_i = Run_Model_Base_On_Last_Solution_RPT
+        Cal_new_con = Cal_new_con_Update;   Dryout_ODE = False
+        if Options_Speed["Dryout_ODE"] and DryOut == "On":
+            if Options_Speed["Engine"]:
+                Dryout_ODE = True
+            else:
+                print(f"Scan {Scan_i} Re {Re_No}: Dryout_ODE needs the engine, ignored")
+        if Options_Speed["Engine"]:
+            if Options_Speed["Cache"]:
+                Keys_Scan = Get_Keys_Scan(Para_dict_i, Para_0)
+            else:
+                Keys_Scan = []
+            Engine = None
+            Experiment_AGE_Max = Experiment_Long # longest ageing set 
+            if Scheduler is not None and Cycle_bt_RPT > Update_Cycles:
+                Experiment_AGE_Max = pb.Experiment(exp_AGE_text * int(Cycle_bt_RPT))
+            for Keys_Scan_i in ([Keys_Scan, []] if len(Keys_Scan) > 0 else [[]]):
+                try:
+                    Model_Sim = None
+                    if Dryout_ODE:
+                        Model_Sim = Add_Dryout_States(
+                            Get_Model_0(model_options, Para_0, Options_Speed["Model"]))
+                    Engine = ScanEngine(
+                        Model_0, Para_0, Experiment_AGE_Max, Experiment_RPT,
+                        mesh_list, submesh_strech, Keys_Scan_i, 
+                        Model_Sim).Build(Options_Speed["Cache"])
+                except Exception as e:
+                    print(f"Scan {Scan_i} Re {Re_No}: Fail to build engine with {len(Keys_Scan_i)} scan inputs due to {e}")
+                else:
+                    break
+            if Engine is None:
+                print(f"Scan {Scan_i} Re {Re_No}: Rebuild every segment instead")
+            else:
+                Run_AGE_i = Engine.Run_AGE;  Run_RPT_i = Engine.Run_RPT
+                if Engine.Dryout_ODE:
+                    Cal_new_con = Cal_new_con_Update_ODE
+                if Options_Speed["Jump"]:
+                    Engine.Jump = [
+                        max(int(Options_Speed["Jump_Sample"]),4), Options_Speed["Jump_Tol"]]
+                    Run_AGE_i = Engine.Run_AGE_Jump
+                if Options_Speed["Worker"] and Return_Sol == True:
+                    # the worker sends back summaries, not solutions
+                    print(f"Scan {Scan_i} Re {Re_No}: Worker does not return solutions, run in this process for Return_Sol")
+                elif Options_Speed["Worker"]:
+                    Worker = ScanWorker(
+                        Engine, Sol_0, Timeout, Timelimit, Timeout_text, Lean)
+                if Check_Small_Time == True:    
+                    print(f"Scan {Scan_i} Re {Re_No}: Finish building engine within {SmallTimer.time()}")
+                    SmallTimer.reset()
+        elif Options_Speed["Worker"]:
+            print(f"Scan {Scan_i} Re {Re_No}: Worker needs Engine, use TimeoutFunc instead")
+        if Pool_GITT and Engine_GITT is None:  # restart from a checkpoint
+            Engine_GITT = Get_GITT_Engine(Get_GITT_Recipe(
+                model_options, Options_Speed["Model"], Para_0, 
+                exp_RPT_GITT_text, V_min, mesh_list, submesh_strech), 
+                Options_Speed["Cache"])
+        del Model_0,Sol_0
+        if Checkpoint is None:
+            Save_Checkpoint(Path_Check, Get_Checkpoint(k, 0, []))
         while k < SaveTimes:    
-            i=0  
-            avg_Age_T = []  
-            while i < Small_Loop:
+            i=i_0;   i_0 = 0  
+            avg_Age_T = avg_Age_T_0;   avg_Age_T_0 = []  
+            if Scheduler is None:
+                Cycs_to_RPT = Small_Loop * Update_Cycles
+            else:
+                Cycs_to_RPT = int(Cycle_bt_RPT)
+            if Cycs_to_RPT_0 is not None:
+                Cycs_to_RPT = Cycs_to_RPT_0;   Cycs_to_RPT_0 = None
+            while i < Small_Loop and Cycs_to_RPT > 0:
                 if DryOut == "On":
-                    Data_Pack,Paraupdate   = Cal_new_con_Update (  Sol_Dry_old,   Para_0_Dry_old )
+                    Data_Pack,Paraupdate   = Cal_new_con (  
+                        Sol_Endpoints(Summ_Last["Endpoints"]),   Para_0_Dry_old )
                 if DryOut == "Off":
                     Paraupdate = Para_0
+                if Scheduler is None:
+                    Update_Cycles_i = Update_Cycles
+                else:
+                    if not Flag_Last_RPT:
+                        Scheduler.Add(Summ_Last, Data_Pack if DryOut == "On" and not Dryout_ODE else None)
+                    Update_Cycles_i = Scheduler.Next(Cycs_to_RPT)
+                    print(f"Scan {Scan_i} Re {Re_No}: Next ageing set has {Update_Cycles_i} cycles")
+                if not Update_Cycles_i in Experiments_AGE.keys():
+                    Experiments_AGE[Update_Cycles_i] = pb.Experiment(exp_AGE_text * Update_Cycles_i)
+                Summ_Args_AGE = [
+                    keys_all_AGE, k==0 and i==0, cycle_no,
+                    step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV]
                 # Run aging cycle:
                 try:
                     #Timelimit = int(60*60*2)
-                    if Timeout == True:
-                        timeout_AGE = TimeoutFunc(
-                            Run_Model_Base_On_Last_Solution, 
+                    t_seg = time.time()
+                    if Worker is not None:
+                        Result_list_AGE = Worker.Run([
+                            "AGE", Worker.Get_Para_Short(Paraupdate), 
+                            Update_Cycles_i, Temper_i, Summ_Args_AGE])
+                    elif Timeout == True:
+                        timeout_AGE = TimeoutFunc_i(
+                            Run_AGE_i, 
                             timeout=Timelimit, 
                             timeout_val=Timeout_text)
                         Result_list_AGE = timeout_AGE( 
-                            Model_Dry_old  , Sol_Dry_old , Paraupdate ,Experiment_Long, 
-                            Update_Cycles,Temper_i,mesh_list,submesh_strech )
+                            Model_Dry_old  , Sol_Dry_old , Paraupdate ,Experiments_AGE[Update_Cycles_i], 
+                            Update_Cycles_i,Temper_i,mesh_list,submesh_strech )
                     else:
-                        Result_list_AGE = Run_Model_Base_On_Last_Solution( 
-                            Model_Dry_old  , Sol_Dry_old , Paraupdate ,Experiment_Long, 
-                            Update_Cycles,Temper_i,mesh_list,submesh_strech )
+                        Result_list_AGE = Run_AGE_i( 
+                            Model_Dry_old  , Sol_Dry_old , Paraupdate ,Experiments_AGE[Update_Cycles_i], 
+                            Update_Cycles_i,Temper_i,mesh_list,submesh_strech )
                     [Model_Dry_i, Sol_Dry_i , Call_Age,DeBug_List_AGE ] = Result_list_AGE
+                    if isinstance(Sol_Dry_i, pb.solvers.solution.Solution):
+                        Summ_AGE_i = Get_Summary_AGE(
+                            Model_Dry_i, Sol_Dry_i, "Partially" in DeBug_List_AGE[-1], 
+                            *Summ_Args_AGE)
+                    elif isinstance(Sol_Dry_i, dict): # summary from the worker
+                        Summ_AGE_i = Sol_Dry_i
                     
                     if Return_Sol == True:
-                        Sol_AGE.append(Sol_Dry_i)
+                        if Lean:
+                            Sol_AGE.append(Get_Sol_Lean(Sol_Dry_i, Summ_AGE_i))
+                        elif Sol_Store is not None:
+                            Sol_AGE.append(Sol_Store.Add(Sol_Dry_i, "AGE"))
+                        else:
+                            Sol_AGE.append(Sol_Dry_i)
                     if "Partially" in DeBug_List_AGE[-1]:
                         Flag_partial_AGE = True
-                        succeed_cycs = len(Sol_Dry_i.cycles) 
-                        if succeed_cycs < Update_Cycles:
-                            print(f"Instead of {Update_Cycles}, succeed only {succeed_cycs} cycles")
+                        succeed_cycs = Summ_AGE_i["Cycs"] 
+                        if succeed_cycs < Update_Cycles_i:
+                            print(f"Instead of {Update_Cycles_i}, succeed only {succeed_cycs} cycles")
                             Flag_partial_AGE = True
                     else:
                         if Call_Age.success == False:
@@ -3063,8 +5329,13 @@ def Run_P2_Excel(
                     Flag_AGE = False
                     break
                 else:                           # ageing cycle SUCCEED
-                    succeed_cycs = len(Sol_Dry_i.cycles) 
+                    succeed_cycs = Summ_AGE_i["Cycs"] 
+                    Add_Cost_Log(
+                        Cost_Log, "AGE", time.time()-t_seg, Summ_AGE_i, succeed_cycs)
+                    if Lean: # only the final state is needed from here on
+                        Sol_Dry_i = Get_Sol_Last(Sol_Dry_i)
                     Para_0_Dry_old = Paraupdate; Model_Dry_old = Model_Dry_i; Sol_Dry_old = Sol_Dry_i;   
+                    Summ_Last = Summ_AGE_i; Summ_AGE_Last = Summ_AGE_i; Flag_Last_RPT = False
                     del Paraupdate,Model_Dry_i,Sol_Dry_i
                     
                     if Check_Small_Time == True:    
@@ -3074,36 +5345,12 @@ def Run_P2_Excel(
                         print(f"Scan {Scan_i} Re {Re_No}: Finish for No.{Cyc_Update_Index[-1]} ageing cycles")
 
                     # post-process for first ageing cycle and every -1 ageing cycle
-                    if k==0 and i==0:    
-                        my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol_Dry_old, 
-                            0, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )     
+                    # (GetSol_dict is done in Get_Summary_AGE)
+                    my_dict_AGE = Merge_Sol_dict(my_dict_AGE, Summ_AGE_i["my_dict"])
+                    if Summ_AGE_i["Flag_First"]:    
                         my_dict_AGE["Cycle_AGE"].append(1)
-                    # update 240111
-                    if Flag_partial_AGE == True:
-                        try:
-                            my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol_Dry_old, 
-                                cycle_no, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )    
-                        except IndexError:
-                            print("The last cycle is incomplete, try [-2] cycle")
-                            try:
-                                my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol_Dry_old, 
-                                    -2, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )   
-                            except IndexError:
-                                print("[-2] cycle also does not work, try first one")
-                                try:
-                                    my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol_Dry_old, 
-                                        0, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )  
-                                except:
-                                    print("Still does not work, less than one cycle, we are in trouble")
-                    else:
-                        try:
-                            my_dict_AGE = GetSol_dict (my_dict_AGE,keys_all_AGE, Sol_Dry_old, 
-                                cycle_no, step_AGE_CD , step_AGE_CC , step_0p1C_RE, step_AGE_CV   )    
-                        except:
-                            print("GetSol_dict fail for a complete ageing set for unknown reasons!!!")
                     cycle_count +=  succeed_cycs 
-                    avg_Age_T.append(np.mean(
-                        Sol_Dry_old["Volume-averaged cell temperature [C]"].entries))
+                    avg_Age_T.append(Summ_AGE_i["avg_T"])
                     my_dict_AGE["Cycle_AGE"].append(cycle_count)           
                     Cyc_Update_Index.append(cycle_count)
                     
@@ -3116,18 +5363,33 @@ def Run_P2_Excel(
                     else:
                         pass
                     i += 1;   ##################### Finish small loop and add 1 to i 
+                    Cycs_to_RPT -= Update_Cycles_i
+                    Save_Checkpoint(Path_Check, Get_Checkpoint(k, i, avg_Age_T, Cycs_to_RPT))
             
             # run RPT, and also update parameters (otherwise will have problems)
             if DryOut == "On":
-                Data_Pack , Paraupdate  = Cal_new_con_Update (  
-                    Sol_Dry_old,   Para_0_Dry_old   )
+                Data_Pack , Paraupdate  = Cal_new_con (  
+                    Sol_Endpoints(Summ_Last["Endpoints"]),   Para_0_Dry_old   )
             if DryOut == "Off":
                 Paraupdate = Para_0     
+            if Scheduler is not None and not Flag_Last_RPT:
+                Scheduler.Add(Summ_Last, Data_Pack if DryOut == "On" and not Dryout_ODE else None)
+            cap_full = Paraupdate["Nominal cell capacity [A.h]"] # 5
+            Summ_Args_RPT = [
+                keys_all_RPT, cap_full, R_from_GITT_Seq, 
+                Cyc_Index_Res if R_from_GITT_Seq else None,
+                step_0p1C_CD, step_0p1C_CC,step_0p1C_RE , step_AGE_CV, step_0p5C_CD,
+                Q_GITT]
             try:
                 # Timelimit = int(60*60*2)
-                if Timeout == True:
-                    timeout_RPT = TimeoutFunc(
-                        Run_Model_Base_On_Last_Solution_RPT, 
+                t_seg = time.time()
+                if Worker is not None:
+                    Result_list_RPT = Worker.Run([
+                        "RPT", Worker.Get_Para_Short(Paraupdate), 
+                        RPT_Cycles, Temper_RPT, Summ_Args_RPT])
+                elif Timeout == True:
+                    timeout_RPT = TimeoutFunc_i(
+                        Run_RPT_i, 
                         timeout=Timelimit, 
                         timeout_val=Timeout_text)
                     Result_list_RPT = timeout_RPT(
@@ -3136,14 +5398,15 @@ def Run_P2_Excel(
                         Temper_RPT ,mesh_list ,submesh_strech
                     )
                 else:
-                    Result_list_RPT = Run_Model_Base_On_Last_Solution_RPT(
+                    Result_list_RPT = Run_RPT_i(
                         Model_Dry_old  , Sol_Dry_old ,   
                         Paraupdate,      Experiment_RPT, RPT_Cycles, 
                         Temper_RPT ,mesh_list ,submesh_strech
                     )
                 [Model_Dry_i, Sol_Dry_i,Call_RPT,DeBug_List_RPT]  = Result_list_RPT
-                if Return_Sol == True:
-                    Sol_RPT.append(Sol_Dry_i)
+                if Return_Sol == True and not Lean:
+                    Sol_RPT.append(
+                        Sol_Dry_i if Sol_Store is None else Sol_Store.Add(Sol_Dry_i, "RPT"))
                 #print(f"Temperature for RPT is now: {Temper_RPT}")  
                 if Call_RPT.success == False:
                     print("Fail due to Experiment error or infeasible")
@@ -3174,35 +5437,53 @@ def Run_P2_Excel(
                     SmallTimer.reset()
                 else:
                     print(f"Scan {Scan_i} Re {Re_No}: Finish for No.{Cyc_Update_Index[-1]} RPT cycles")
-                # update 231210: delete the first hold at 4.2V for later RPT
-                my_dict_RPT = GetSol_dict (my_dict_RPT,keys_all_RPT, Sol_Dry_i, 
-                    0,step_0p1C_CD, step_0p1C_CC,step_0p1C_RE , step_AGE_CV   ) 
+                # GetSol_dict and resistance are done in Get_Summary_RPT
+                if isinstance(Sol_Dry_i, pb.solvers.solution.Solution):
+                    Summ_RPT_i = Get_Summary_RPT(Model_Dry_i, Sol_Dry_i, *Summ_Args_RPT)
+                else: # summary from the worker
+                    Summ_RPT_i = Sol_Dry_i
+                if Pool_GITT:   # replaces the resistance from C/2
+                    Res_midSOC,Res_full,SOC_Res = Run_GITT_Parallel(
+                        Engine_GITT, Paraupdate, Temper_RPT, 
+                        *Summ_RPT_i.pop("GITT_Seeds"), Pool_GITT,
+                        time.time() + Timelimit if Timeout else None)
+                    Summ_RPT_i["my_dict"]["SOC_Res"]    = [SOC_Res,]
+                    Summ_RPT_i["my_dict"]["Res_full"]   = [Res_full,]
+                    Summ_RPT_i["my_dict"]["Res_midSOC"] = [Res_midSOC,]
+                Add_Cost_Log(Cost_Log, "RPT", time.time()-t_seg, Summ_RPT_i)
+                if Return_Sol == True and Lean:
+                    Sol_RPT.append(Get_Sol_Lean(Sol_Dry_i, Summ_RPT_i))
+                if Lean:
+                    Sol_Dry_i = Get_Sol_Last(Sol_Dry_i)
+                my_dict_RPT = Merge_Sol_dict(my_dict_RPT, Summ_RPT_i["my_dict"])
                 my_dict_RPT["Cycle_RPT"].append(cycle_count)
                 my_dict_RPT["avg_Age_T"].append(np.mean(avg_Age_T))  # Make sure avg_Age_T and 
-                
-                # update 230517 - Get R from C/2 discharge only, discard GITT
-                cap_full = Paraupdate["Nominal cell capacity [A.h]"] # 5
-                if R_from_GITT: 
-                    Res_midSOC,Res_full,SOC_Res = Get_0p1s_R0(Sol_Dry_i,Cyc_Index_Res,cap_full)
-                else: 
-                    step_0P5C_CD = Sol_Dry_i.cycles[0].steps[step_0p5C_CD]
-                    Res_midSOC,Res_full,SOC_Res = Get_R_from_0P5C_CD(step_0P5C_CD,cap_full)
-                my_dict_RPT["SOC_Res"].append(SOC_Res)
-                my_dict_RPT["Res_full"].append(Res_full)
-                my_dict_RPT["Res_midSOC"].append(Res_midSOC)             
-                del SOC_Res,Res_full,Res_midSOC
                 if DryOut == "On":
                     mdic_dry = Update_mdic_dry(Data_Pack,mdic_dry)
                 Para_0_Dry_old = Paraupdate;    Model_Dry_old = Model_Dry_i  ;     Sol_Dry_old = Sol_Dry_i    ;   
+                Summ_Last = Summ_RPT_i; Flag_Last_RPT = True
                 del Paraupdate,Model_Dry_i,Sol_Dry_i
+                Save_Checkpoint(Path_Check, Get_Checkpoint(k+1, 0, []))
+                if (XY_pack_Abort is not None and 
+                        len(my_dict_RPT["Cycle_RPT"]) >= Options_Speed["Abort_Min_RPT"]):
+                    mpe_run = Get_Running_Error(
+                        my_dict_RPT, XY_pack_Abort, model_options, 
+                        DryOut, mdic_dry, cap_0)
+                    print(f"Scan {Scan_i} Re {Re_No}: Running error is {mpe_run:.2f}% after {cycle_count} cycles")
+                    if mpe_run > Options_Speed["Abort_MPE"]:
+                        Flag_Abort = True
+                        str_error_RPT = f"Scan {Scan_i} Re {Re_No}: Early abort after {cycle_count} cycles, running error {mpe_run:.2f}% > {Options_Speed['Abort_MPE']}%"
+                        print(str_error_RPT)
                 if Check_Small_Time == True:    
                     print(f"Scan {Scan_i} Re {Re_No}: Finish post-process for No.{Cyc_Update_Index[-1]} RPT cycles within {SmallTimer.time()}")
                     SmallTimer.reset()
                 else:
                     pass
-                if Flag_AGE == False or Flag_partial_AGE == True:
+                if Flag_AGE == False or Flag_partial_AGE == True or Flag_Abort:
                     break
             k += 1 
+    if Worker is not None:
+        Worker.Stop()
     DeBug_Lists = [DeBug_List_RPT,DeBug_List_AGE]
     Keys_error = ["Error tot %","Error SOH %","Error LLI %",
         "Error LAM NE %","Error LAM PE %",
@@ -3227,16 +5508,24 @@ def Run_P2_Excel(
             model_options,my_dict_RPT,mdic_dry,
             DryOut,Scan_i,str_exp_AGE_text,
             str_exp_RPT_text,str_error_AGE_final,
-            str_error_RPT,log_messages,)
+            str_error_RPT,log_messages,Save_Files)
         for key in Keys_error:
             my_dict_RPT[key] =  np.nan
         
         midc_merge = [my_dict_RPT, my_dict_AGE,mdic_dry]
+        if Save_Store:
+            Save_Store_Scan(
+                BasicPath, Target, purpose, Scan_i, Re_No, 
+                df_excel.iloc[0].to_dict(), Para_dict_i, midc_merge)
         import pickle
-        with open(
-            BasicPath + Target+"Mats/" 
-            + str(Scan_i)+ f'-DeBug_Lists_Re_{Re_No}.pkl', 'wb') as file:
-            pickle.dump(DeBug_Lists, file)
+        if Save_Files:
+            with open(
+                BasicPath + Target+"Mats/" 
+                + str(Scan_i)+ f'-DeBug_Lists_Re_{Re_No}.pkl', 'wb') as file:
+                pickle.dump(DeBug_Lists, file)
+        Save_Cost_History(
+            BasicPath, purpose, Para_dict_i, Re_No, Cost_Log, 
+            time.time()-t_start_run, False)
 
         return midc_merge,Sol_RPT,Sol_AGE,DeBug_Lists
     ##########################################################
@@ -3261,16 +5550,19 @@ def Run_P2_Excel(
             Exp_temp_i_cell = Temp_Cell_Exp[str(int(Temper_i- 273.15))]
             XY_pack = Get_Cell_Mean_1T_1Exp(Exp_Any_AllData,Exp_temp_i_cell) # interpolate for exp only
             mpe_all = Compare_Exp_Model( my_dict_RPT, XY_pack, Scan_i, Re_No,
-                index_exp, Temper_i,BasicPath, Target,fs,dpi, PlotCheck=True)
+                index_exp, Temper_i,BasicPath, Target,fs,dpi, PlotCheck=False)
         else:
             Exp_temp_i_cell = "nan"
             XY_pack         = "nan"
             mpe_all         = [np.nan]*8
         for mpe_i,key in zip(mpe_all,Keys_error):
             my_dict_RPT[key] =  mpe_i
+        my_dict_RPT["Early abort"] = Flag_Abort
         # [mpe_tot,mpe_1,mpe_2,mpe_3,mpe_4,mpe_5,mpe_6,punish] = mpe_all
         # set pass or fail TODO figure out how much should be appropriate:
-        if isinstance(mpe_all[0],float): # is mpe_tot
+        if Flag_Abort:
+            Pass_Fail = "Early abort"
+        elif isinstance(mpe_all[0],float): # is mpe_tot
             if mpe_all[0] < 3:
                 Pass_Fail = "Pass"
             else:
@@ -3282,26 +5574,24 @@ def Run_P2_Excel(
         #########      3-1: Plot cycle,location, Dryout related 
         # update 23-05-25 there is a bug in Cyc_Update_Index, need to slide a bit:
         Cyc_Update_Index.insert(0,0); del Cyc_Update_Index[-1]
-
-        Plot_Cyc_RPT_4(
-            my_dict_RPT, Exp_Any_AllData,Temp_Cell_Exp,
-            XY_pack,index_exp, Plot_Exp,   R_from_GITT,
-            Scan_i,Re_No,Temper_i,model_options,
-            BasicPath, Target,fs,dpi)
-        Plot_DMA_Dec(my_dict_RPT,Scan_i,Re_No,Temper_i,model_options,
-            BasicPath, Target,fs,dpi)
-        if len(my_dict_AGE["CDend Porosity"])>1:
-            Plot_Loc_AGE_4(
-                my_dict_AGE,Scan_i,Re_No,index_exp,Temper_i,
-                model_options,BasicPath, Target,fs,dpi)
-            colormap = "cool"
-            Plot_HalfCell_V(
-                my_dict_RPT,my_dict_AGE,Scan_i,Re_No,index_exp,colormap,
-                Temper_i,model_options,BasicPath, Target,fs,dpi)
-        if DryOut == "On":
-            Plot_Dryout(
-                Cyc_Update_Index,mdic_dry,ce_EC_0,index_exp,Temper_i,
-                Scan_i,Re_No,BasicPath, Target,fs,dpi)
+        # Plots from a job, made here or off the critical path
+        Plotter = None  # background plot processes for "Async"
+        Job_Plot = {
+            "my_dict_RPT": my_dict_RPT, "my_dict_AGE": my_dict_AGE, 
+            "mdic_dry": mdic_dry, "XY_pack": XY_pack, 
+            "Path_to_ExpData": Path_to_ExpData, "index_exp": index_exp, 
+            "Plot_Exp": Plot_Exp, "R_from_GITT": R_from_GITT, 
+            "Scan_i": Scan_i, "Re_No": Re_No, "Temper_i": Temper_i, 
+            "model_options": model_options, "DryOut": DryOut, 
+            "Cyc_Update_Index": list(Cyc_Update_Index), "ce_EC_0": ce_EC_0,
+            "BasicPath": BasicPath, "Target": Target, "fs": fs, "dpi": dpi}
+        if Options_Speed["Plot"] == "Inline":
+            Plot_Scan(Job_Plot, [Temp_Cell_Exp,Exp_Any_AllData])
+        elif Options_Speed["Plot"] in ["Async", "Later"]:
+            Save_Plot_Job(Job_Plot)
+            if Options_Speed["Plot"] == "Async":   # waited for at the end
+                Plotter = PlotProcs(Options_Speed["Plot_Async_Max"])
+                Plotter.Run(BasicPath + Target)
         if Check_Small_Time == True:    
             print(f"Scan {Scan_i} Re {Re_No}: Finish all plots within {SmallTimer.time()}")
             SmallTimer.reset()
@@ -3324,7 +5614,7 @@ def Run_P2_Excel(
             model_options,my_dict_RPT,mdic_dry,
             DryOut,Scan_i,str_exp_AGE_text,
             str_exp_RPT_text,str_error_AGE_final,
-            str_error_RPT,log_messages,
+            str_error_RPT,log_messages,Save_Files,
             )
         # pick only the cyc - most concern
         Keys_cyc_mat =[
@@ -3348,67 +5638,81 @@ def Run_P2_Excel(
         #    new_dict[new_key] = my_dict_AGE[key]
         # midc_merge = {**my_dict_RPT, **my_dict_AGE,**mdic_dry}
         midc_merge = [my_dict_RPT, my_dict_AGE,mdic_dry]
-        if isinstance(Sol_RPT[-1],pb.solvers.solution.Solution):
-            _,dict_short = Get_Last_state(Model_Dry_old, Sol_RPT[-1])
-            sol_last = Sol_RPT[-1]
-        else:
-            _,dict_short = Get_Last_state(Model_Dry_old, Sol_AGE[-1])
-            sol_last = Sol_AGE[-1]
+        # From the summary of the last successful run, 
+        #                so this also works with Return_Sol = False
+        dict_short = Summ_Last["dict_short"]
+        if not Flag_Last_RPT:
             print("!!!!!!!Big problem! The last RPT fails, need to restart from RPT next time")
         # calculate dry-out parameter first
         if DryOut == "On":
-            Data_Pack,Paraupdate   = Cal_new_con_Update (  sol_last,   Para_0_Dry_old )
+            Data_Pack,Paraupdate   = Cal_new_con (  
+                Sol_Endpoints(Summ_Last["Endpoints"]),   Para_0_Dry_old )
         else: 
             Paraupdate = Para_0; Data_Pack = "nan"
-        i_try = 0
-        while i_try<3:
-            try:
-                getSth = sol_last['Throughput capacity [A.h]'].entries[-1] 
-                # Sol_new['Throughput capacity [A.h]'].entries[-1]
-            except:
-                i_try += 1
-                print(f"Fail to read Throughput capacity for the {i_try}th time")
-            else:
-                break
+        getSth = Summ_Last["Thr"]
         Save_for_Reload = [ midc_merge, dict_short, Paraupdate, Data_Pack, getSth]
         import pickle,json
-
-        with open(
-            BasicPath + Target+"Mats/" 
-            + str(Scan_i)+ f'_Re_{Re_No}-midc_merge.pkl', 'wb') as file:
-            pickle.dump(midc_merge, file)
+        if Save_Store:
+            Save_Store_Scan(
+                BasicPath, Target, purpose, Scan_i, Re_No, 
+                df_excel.iloc[0].to_dict(), Para_dict_i, midc_merge)
+        if Save_Files:  # otherwise all is in the results store
+            with open(
+                BasicPath + Target+"Mats/" 
+                + str(Scan_i)+ f'_Re_{Re_No}-midc_merge.pkl', 'wb') as file:
+                pickle.dump(midc_merge, file)
         
-        with open(
-            BasicPath + Target+"Mats/" 
-            + str(Scan_i)+ f'_Re_{Re_No}-Save_for_Reload.pkl', 'wb') as file:
-            pickle.dump(Save_for_Reload, file)
+            with open(
+                BasicPath + Target+"Mats/" 
+                + str(Scan_i)+ f'_Re_{Re_No}-Save_for_Reload.pkl', 'wb') as file:
+                pickle.dump(Save_for_Reload, file)
 
 
-        try:
-            savemat(
-                BasicPath + Target+"Mats/" 
-                + str(Scan_i)+ f'_Re_{Re_No}-Ageing_summary_only.mat',
-                my_dict_mat)  
-        except:
-            print(f"Scan {Scan_i} Re {Re_No}: Encounter problems when saving mat file!")
-        else: 
-            print(f"Scan {Scan_i} Re {Re_No}: Successfully save mat file!")
+            try:
+                savemat(
+                    BasicPath + Target+"Mats/" 
+                    + str(Scan_i)+ f'_Re_{Re_No}-Ageing_summary_only.mat',
+                    my_dict_mat)  
+            except:
+                print(f"Scan {Scan_i} Re {Re_No}: Encounter problems when saving mat file!")
+            else: 
+                print(f"Scan {Scan_i} Re {Re_No}: Successfully save mat file!")
 
         if Check_Small_Time == True:    
             print(f"Scan {Scan_i} Re {Re_No}: Try saving within {SmallTimer.time()}")
             SmallTimer.reset()
         else:
             pass
-
-        
-        with open(
-            BasicPath + Target+"Mats/" 
-            + str(Scan_i)+ f'_Re_{Re_No}-DeBug_Lists.pkl', 'wb') as file:
-            pickle.dump(DeBug_Lists, file)
-        
+        if Save_Files:
+            with open(
+                BasicPath + Target+"Mats/" 
+                + str(Scan_i)+ f'_Re_{Re_No}-DeBug_Lists.pkl', 'wb') as file:
+                pickle.dump(DeBug_Lists, file)
 
         # update 231217: save ageing solution if partially succeed in ageing set
-        if Flag_partial_AGE == True:
+        Flag_Lean_AGE = bool(len(Sol_AGE)) and isinstance(Sol_AGE[-1], dict) and (
+            len(Sol_AGE[-1].get("Cycles", [])) > 0)  # lean record, see Get_Sol_Lean
+        if Flag_partial_AGE == True and not (Flag_Lean_AGE or (
+                len(Sol_AGE) and isinstance(
+                    Sol_AGE[-1],(pb.solvers.solution.Solution, Sol_Spilled)))):
+            # only the summary is there (worker or Return_Sol = False)
+            Sol_partial_AGE_list = [
+                Summ_AGE_Last,    "nan",    Summ_AGE_Last["Cycs"]]
+            with open(
+                BasicPath + Target+"Mats/" 
+                + str(Scan_i)+ f'_Re_{Re_No}-Sol_partial_AGE_list.pkl', 'wb') as file:
+                pickle.dump(Sol_partial_AGE_list, file)
+            print(f"Last AGE succeed partially, save Sol_partial_AGE_list.pkl for Scan {Scan_i} Re {Re_No}")
+        elif Flag_partial_AGE == True and Flag_Lean_AGE:
+            Sol_partial_AGE_list = [
+                Sol_AGE[-1]["Cycles"][0],   Sol_AGE[-1]["Cycles"][-1],
+                Sol_AGE[-1]["Cycs"]]
+            with open(
+                BasicPath + Target+"Mats/" 
+                + str(Scan_i)+ f'_Re_{Re_No}-Sol_partial_AGE_list.pkl', 'wb') as file:
+                pickle.dump(Sol_partial_AGE_list, file)
+            print(f"Last AGE succeed partially, save Sol_partial_AGE_list.pkl for Scan {Scan_i} Re {Re_No}")
+        elif Flag_partial_AGE == True:
             try:
                 Sol_partial_AGE_list = [
                     Sol_AGE[-1].cycles[0],    Sol_AGE[-1].cycles[-1],
@@ -3431,8 +5735,18 @@ def Run_P2_Excel(
             print(f"Last AGE succeed partially, save Sol_partial_AGE_list.pkl for Scan {Scan_i} Re {Re_No}")
         else:
             pass
+        if Key_Result is not None and Get_Scan_Done(midc_merge, Para_dict_i):
+            Save_Result_Cache(
+                BasicPath, Key_Result, midc_merge, df_excel, 
+                f"{purpose} Scan {Scan_i} Re {Re_No}")
         print("Succeed doing something in {}".format(ModelTimer.time()))
         print(f'This is the end of No. {Scan_i} scan, Re {Re_No}')
+        Save_Cost_History(
+            BasicPath, purpose, Para_dict_i, Re_No, Cost_Log, 
+            time.time()-t_start_run, Get_Scan_Done(midc_merge, Para_dict_i))
+        if Plotter is not None:
+            Plotter.Wait()
+            Plotter.Save(BasicPath + Target + f"Plot_status_{Scan_i}_Re_{Re_No}.csv")
         return midc_merge,Sol_RPT,Sol_AGE,DeBug_Lists
 
 
@@ -0,0 +1,147 @@
+# Work queue of scan rows for any number of HPC jobs, see 
+# Run_Scan_Queue_Full_Exp1235.py; the rows run as in Run_Scan_Pool
+import os, json, time, socket, sqlite3
+import numpy as np
+
+from Fun_NC import Get_Options_Speed
+from Fun_Sched import (
+    Get_Scan_Cost, Make_Scan_Folders, Start_Scan_Row, Poll_Scan_Row, 
+    Get_Plot_Procs, Wait_Plot_Procs)
+
+# Work queue on the shared filesystem (one SQLite file), so 
+# any number of HPC jobs can pull scan rows as they get free instead of 
+# one fixed Bundle_{i}.csv each. A running row holds a lease that its job 
+# renews; a row whose lease ran out (job killed, node died) is pending 
+# again with Re_No + 1, i.e. it goes on from its checkpoint
+def Connect_Scan_Queue(Path_DB):
+    # no WAL: it does not work on network filesystems
+    Conn = sqlite3.connect(Path_DB, timeout=600, isolation_level=None)
+    Conn.execute(
+        "CREATE TABLE IF NOT EXISTS rows ("
+        "scan_no INTEGER PRIMARY KEY, para TEXT, cost REAL, "
+        "status TEXT, re_no INTEGER, tries INTEGER, owner TEXT, "
+        "lease_until REAL, not_before REAL, updated REAL)")
+    return Conn
+
+def Init_Scan_Queue(Path_DB, Para_dict_list, Runshort, Predictor=None):
+    # rows already in the queue are kept as they are
+    Costs = [
+        Get_Scan_Cost(Para_dict_i, Runshort, Predictor) 
+        for Para_dict_i in Para_dict_list]
+    Conn = Connect_Scan_Queue(Path_DB)
+    Conn.execute("BEGIN IMMEDIATE")
+    for Para_dict_i,Cost in zip(Para_dict_list,Costs):
+        Conn.execute(
+            "INSERT OR IGNORE INTO rows VALUES (?,?,?,?,?,?,?,?,?,?)",
+            (int(Para_dict_i["Scan No"]), json.dumps(Para_dict_i), 
+             Cost if np.isfinite(Cost) else 1e300,
+             "pending", 0, 0, "", 0.0, 0.0, time.time()))
+    Conn.execute("COMMIT")
+    Conn.close()
+
+# [Para_dict_i, Re_No] of the most expensive ready row, None if nothing 
+# is ready, "Empty" if nothing is pending or running anywhere
+def Claim_Scan_Row(Path_DB, Owner, Lease):
+    Conn = Connect_Scan_Queue(Path_DB)
+    t_now = time.time()
+    Conn.execute("BEGIN IMMEDIATE")
+    Conn.execute(
+        "UPDATE rows SET status='pending', re_no=re_no+1, tries=tries+1, "
+        "owner='', updated=? WHERE status='running' AND lease_until<?",
+        (t_now, t_now))
+    Row = Conn.execute(
+        "SELECT scan_no, para, re_no FROM rows WHERE status='pending' "
+        "AND not_before<=? ORDER BY cost DESC LIMIT 1", (t_now,)).fetchone()
+    if Row is None:
+        n_left = Conn.execute(
+            "SELECT COUNT(*) FROM rows WHERE status IN ('pending','running')"
+            ).fetchone()[0]
+        Result = "Empty" if n_left == 0 else None
+    else:
+        Conn.execute(
+            "UPDATE rows SET status='running', owner=?, lease_until=?, "
+            "updated=? WHERE scan_no=?", (Owner, t_now + Lease, t_now, Row[0]))
+        Result = [json.loads(Row[1]), Row[2]]
+    Conn.execute("COMMIT")
+    Conn.close()
+    return Result
+
+def Renew_Scan_Leases(Path_DB, Owner, Scan_list, Lease):
+    if not len(Scan_list):
+        return
+    Conn = Connect_Scan_Queue(Path_DB)
+    t_now = time.time()
+    Conn.execute("BEGIN IMMEDIATE")
+    for Scan_i in Scan_list:
+        Conn.execute(
+            "UPDATE rows SET lease_until=?, updated=? "
+            "WHERE scan_no=? AND owner=? AND status='running'",
+            (t_now + Lease, t_now, Scan_i, Owner))
+    Conn.execute("COMMIT")
+    Conn.close()
+
+def Finish_Scan_Row(Path_DB, Owner, Scan_i, Status, Retry_Max, Backoff):
+    Conn = Connect_Scan_Queue(Path_DB)
+    t_now = time.time()
+    Conn.execute("BEGIN IMMEDIATE")
+    Row = Conn.execute(
+        "SELECT tries FROM rows WHERE scan_no=? AND owner=? AND status='running'",
+        (Scan_i, Owner)).fetchone()
+    if Row is None:     # lease ran out and someone else has it now
+        print(f"Scan queue: Scan {Scan_i} is not ours any more, drop {Status}")
+    elif Status == "Done":
+        Conn.execute(
+            "UPDATE rows SET status='done', owner='', updated=? WHERE scan_no=?",
+            (t_now, Scan_i))
+    elif Row[0] < Retry_Max:
+        Conn.execute(
+            "UPDATE rows SET status='pending', re_no=re_no+1, tries=tries+1, "
+            "owner='', not_before=?, updated=? WHERE scan_no=?",
+            (t_now + Backoff * 2**Row[0], t_now, Scan_i))
+    else:
+        Conn.execute(
+            "UPDATE rows SET status=?, owner='', updated=? WHERE scan_no=?",
+            (f"failed: {Status}", t_now, Scan_i))
+    Conn.execute("COMMIT")
+    Conn.close()
+
+def Run_Scan_Queue(
+        Path_DB, Path_List, Timelimit, Options, Options_Speed=None,
+        Pool_No=None, Lease=900, Retry_Max=2, Backoff=60, Wall_Max=None):
+    Make_Scan_Folders(Path_List)
+    if Pool_No is None:
+        Pool_No = os.cpu_count()
+    Owner = f"{socket.gethostname()}-{os.getpid()}"
+    [BasicPath, _, Target, _] = Path_List
+    Plotter,Options_Speed_Row = Get_Plot_Procs(Get_Options_Speed(Options_Speed))
+    Running = {}  # Scan_i: [Process, Queue, start time, Re_No]
+    t_renew = time.time();   Flag_Empty = False
+    while not Flag_Empty or len(Running):
+        while not Flag_Empty and len(Running) < Pool_No:
+            Result = Claim_Scan_Row(Path_DB, Owner, Lease)
+            if Result is None or Result == "Empty":
+                Flag_Empty = Result == "Empty"
+                break
+            [Para_dict_i, Re_No_i] = Result
+            Scan_i = int(Para_dict_i["Scan No"])
+            Running[Scan_i] = Start_Scan_Row(
+                Para_dict_i, Re_No_i, Path_List, Timelimit, 
+                Options, Options_Speed_Row) + [Re_No_i]
+            print(f"Scan queue {Owner}: start Scan {Scan_i} Re {Re_No_i}")
+        for Scan_i in list(Running.keys()):
+            [Process_i, Queue_Row, t_start, Re_No_i] = Running[Scan_i]
+            Status = Poll_Scan_Row(Process_i, Queue_Row, t_start, Wall_Max)
+            if Status is None:
+                continue
+            del Running[Scan_i]
+            print(f"Scan queue {Owner}: Scan {Scan_i} Re {Re_No_i} {Status} after {time.time()-t_start:.0f} s")
+            Finish_Scan_Row(Path_DB, Owner, Scan_i, Status, Retry_Max, Backoff)
+            Flag_Empty = False  # a retry may be pending now
+        if time.time() - t_renew > Lease / 3:   # heartbeat
+            Renew_Scan_Leases(Path_DB, Owner, list(Running.keys()), Lease)
+            t_renew = time.time()
+        if Plotter is not None:
+            Plotter.Run(BasicPath + Target)
+        time.sleep(1 if len(Running) else 30) # idle: wait for leases to run out
+    Wait_Plot_Procs(Plotter, BasicPath + Target, f"Plot_status_{Owner}.csv")
+    print(f"Scan queue {Owner}: nothing left to run")
@@ -0,0 +1,264 @@
+# Scheduling of whole scan csv files on one machine: rows as processes 
+# of a pool (Run_Scan_Pool), screening with a cheap model first 
+# (Run_Scan_Screen) and packing rows into HPC allocations (Pack_Scan_Rows). 
+# The cost history and predictor are in Fun_NC.py, Run_P2_Excel uses them
+import os, sys, time, signal, traceback
+from multiprocessing import Queue, Process
+from queue import Empty
+import numpy as np;import pandas as pd
+
+from Fun_NC import (
+    Run_P2_Excel, Get_Options_Speed, Get_Scan_Done, Get_Scan_States, 
+    Get_Scan_Wall, PlotProcs, save_rows_to_csv)
+from Fun_Store import Compact_Store, Read_Store
+
+# rough wall time per state of the DFN of one ageing cycle and of one 
+# RPT (short runs, mesh [5,5,5,10,10]), used until there is a cost history
+Cost_Default = {"AGE per cycle [s]": 1e-2, "RPT [s]": 0.3, }
+def Get_Scan_Cost(Para_dict_i, Runshort, Predictor=None):
+    # wall time in s: predicted if there is history (see CostPredictor), 
+    # otherwise from Cost_Default and the number of states of the DFN
+    if Predictor is not None and Predictor.Coef is not None:
+        return Predictor.Predict(Para_dict_i)["Wall [s]"]
+    n_states = Get_Scan_States(Para_dict_i)
+    return Get_Scan_Wall(
+        Para_dict_i, Runshort, Cost_Default["AGE per cycle [s]"] * n_states,
+        Cost_Default["RPT [s]"] * n_states)
+
+# Run all rows of a scan csv on one machine. Every row is 
+# one Run_P2_Excel in its own process, rows expected to be longest start 
+# first, and rows that crash, time out or stop early are tried again 
+# with Re_No + 1 (so from their checkpoint) after a growing wait
+def Run_Scan_Row(
+        Para_dict_i, Path_List, Re_No, Timelimit, Options, Options_Speed, 
+        Queue_Row):
+    if hasattr(os, "setpgrp"):  # so that a kill also stops the scan workers
+        os.setpgrp()
+    [BasicPath, _, Target, _] = Path_List
+    Scan_i = int(Para_dict_i["Scan No"])
+    Path_Log = BasicPath + Target + f"Logs/{Scan_i}_Re_{Re_No}.log"
+    sys.stdout = sys.stderr = open(Path_Log, "w", buffering=1)
+    try:
+        midc_merge,_,_,_ = Run_P2_Excel(
+            Para_dict_i, Path_List, Re_No, Timelimit, Options, Options_Speed)
+        Status = "Done" if Get_Scan_Done(midc_merge, Para_dict_i) else "Failed"
+    except Exception:
+        traceback.print_exc()
+        Status = "Error"
+    Queue_Row.put(Status)
+
+def Kill_Scan_Row(Process_i):
+    try:
+        os.killpg(Process_i.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        Process_i.kill()
+    Process_i.join()
+
+def Make_Scan_Folders(Path_List):
+    [BasicPath, _, Target, _] = Path_List
+    for folder in ["", "Mats", "Plots", "Excel", "Logs"]:
+        os.makedirs(BasicPath + Target + folder, exist_ok=True)
+
+def Start_Scan_Row(
+        Para_dict_i, Re_No, Path_List, Timelimit, Options, Options_Speed):
+    Queue_Row = Queue(1)
+    Process_i = Process(
+        target = Run_Scan_Row, 
+        args = (
+            Para_dict_i.copy(), Path_List, Re_No, Timelimit, 
+            Options, Options_Speed, Queue_Row))
+    Process_i.start()
+    return [Process_i, Queue_Row, time.time()]
+
+# status of a started row, None if it is still running
+def Poll_Scan_Row(Process_i, Queue_Row, t_start, Wall_Max):
+    try:
+        Status = Queue_Row.get(timeout=0.1)
+    except Empty:
+        if Process_i.is_alive():
+            if Wall_Max is None or time.time() - t_start < Wall_Max:
+                return None
+            Kill_Scan_Row(Process_i)
+            Status = "Timeout"
+        else:
+            Status = "Error"    # died without sending a status
+    Process_i.join()
+    return Status
+
+# with "Async" plots the rows only save their plot jobs ("Later") and the 
+# pool or queue loop plots them, see PlotProcs
+def Get_Plot_Procs(Options_Speed_i):
+    if not Options_Speed_i["Plot"] == "Async":
+        return None,Options_Speed_i
+    return (
+        PlotProcs(Options_Speed_i["Plot_Async_Max"]), 
+        {**Options_Speed_i, "Plot": "Later"})
+
+def Wait_Plot_Procs(Plotter, Path_Target, Name_csv="Plot_status.csv"):
+    if Plotter is None:
+        return
+    while Plotter.Run(Path_Target):   # also the jobs of the last rows
+        time.sleep(1)
+    Plotter.Save(Path_Target + Name_csv)
+
+def Run_Scan_Pool(
+        Para_dict_list, Path_List, Timelimit, Options, Options_Speed=None,
+        Pool_No=None, Re_No=0, Retry_Max=2, Backoff=60, Wall_Max=None,
+        Predictor=None):
+    # Wall_Max (s) is for one try of one row, Timelimit for one segment
+    [BasicPath, _, Target, _] = Path_List
+    Make_Scan_Folders(Path_List)
+    if Pool_No is None:
+        Pool_No = os.cpu_count()
+    Runshort = Options[1]
+    Options_Speed_i = Get_Options_Speed(Options_Speed)
+    Plotter,Options_Speed_Row = Get_Plot_Procs(Options_Speed_i)
+    Rows = sorted(
+        Para_dict_list, 
+        key = lambda Para_dict_i: Get_Scan_Cost(Para_dict_i, Runshort, Predictor), 
+        reverse = True)
+    # [Para_dict_i, Re_No, tries so far, earliest start time]
+    Todo = [[Para_dict_i, Re_No, 0, 0.0] for Para_dict_i in Rows]
+    Running = {}  # Process: [Queue, start time, task], rows may share a Scan No
+    Status_All = []
+    while len(Todo) or len(Running):
+        t_now = time.time()
+        for task in list(Todo):
+            if len(Running) >= Pool_No:
+                break
+            if task[3] > t_now:
+                continue
+            Todo.remove(task)
+            [Para_dict_i, Re_No_i, _, _] = task
+            [Process_i, Queue_Row, t_start] = Start_Scan_Row(
+                Para_dict_i, Re_No_i, Path_List, Timelimit, 
+                Options, Options_Speed_Row)
+            Running[Process_i] = [Queue_Row, t_start, task]
+            print(f"Scan pool: start Scan {int(Para_dict_i['Scan No'])} Re {Re_No_i}, {len(Running)} running, {len(Todo)} waiting")
+        for Process_i in list(Running.keys()):
+            [Queue_Row, t_start, task] = Running[Process_i]
+            Status = Poll_Scan_Row(Process_i, Queue_Row, t_start, Wall_Max)
+            if Status is None:
+                continue
+            del Running[Process_i]
+            [Para_dict_i, Re_No_i, n_try, _] = task
+            Scan_i = int(Para_dict_i["Scan No"])
+            n_try += 1
+            t_used = time.time() - t_start
+            print(f"Scan pool: Scan {Scan_i} Re {Re_No_i} {Status} after {t_used:.0f} s")
+            Status_All.append([Scan_i, Re_No_i, n_try, Status, t_used])
+            if not Status == "Done" and n_try <= Retry_Max:
+                # at the back: rows not tried yet go first
+                Todo.append([
+                    Para_dict_i, Re_No_i + 1, n_try, 
+                    time.time() + Backoff * 2**(n_try-1)])
+        pd.DataFrame(
+            Status_All, columns=["Scan No", "Re_No", "Tries", "Status", "Wall time [s]"]
+            ).to_csv(BasicPath + Target + "Scan_pool_status.csv", index=False)
+        if Plotter is not None:
+            Plotter.Run(BasicPath + Target)
+        if len(Running) >= Pool_No or not len(Todo):
+            time.sleep(1)
+        elif min([task[3] for task in Todo]) > time.time():
+            time.sleep(1)
+    Wait_Plot_Procs(Plotter, BasicPath + Target)
+    if not Options_Speed_i["Store"] == "Files":
+        Compact_Store(BasicPath + Target + "Store")
+    return Status_All
+
+# Screening pass before the DFN. All rows run first with a 
+# cheap model (SPMe, coarse mesh, cycle jumping) in the sub-folder 
+# Screen/ of Target; rows whose error against experiment (mpe_tot 
+# without the punishment for ending early) is above MPE_Keep are dropped, 
+# the others are returned for the full run. Rows without experimental 
+# data or whose screening crashed are kept
+Options_Speed_Screen = {
+    "Model": "SPMe", "Engine": True, "Jump": True, 
+    "Adaptive": False, "Dryout_ODE": False, "Timelimit_Predict": False, 
+    "Plot": "None", }
+
+def Get_Screen_Error(BasicPath, Target, purpose, Scan_i, Store="Files"):
+    try:
+        if Store == "Parquet":
+            df = Read_Store(
+                BasicPath + Target + "Store", "Summary", 
+                Filters=[("Scan No", "=", Scan_i), ("Re_No", "=", 0)],
+                Columns=["Error tot %", "Punish"])
+        else:
+            df = pd.read_excel(
+                BasicPath + Target + f"Excel/{Scan_i}_Re_0_{purpose}.xlsx", 
+                engine='openpyxl')
+        mpe_tot = float(df["Error tot %"][0]);  punish = float(df["Punish"][0])
+    except Exception:   # nothing saved: crashed before the end
+        return np.nan
+    return mpe_tot - (punish>1.0) * punish * 2
+
+def Run_Scan_Screen(
+        Para_dict_list, Path_List, Timelimit, Options, Options_Speed=None,
+        Pool_No=None, MPE_Keep=10, Mesh_Screen="[3,3,3,8,8]"):
+    [BasicPath, Path_Input, Target, purpose] = Path_List
+    Path_List_Screen = [
+        BasicPath, Path_Input, Target + "Screen/", purpose + "_Screen"]
+    # a copy of the caller's options; no need to finish bad rows, but a 
+    # tighter Abort_MPE of the caller stays
+    Options_Speed_i = Get_Options_Speed(
+        {**(Options_Speed if isinstance(Options_Speed, dict) else {}), 
+         **Options_Speed_Screen})
+    if Options_Speed_i["Abort_MPE"] is None or Options_Speed_i["Abort_MPE"] > MPE_Keep:
+        Options_Speed_i["Abort_MPE"] = MPE_Keep
+    Rows_Screen = []
+    for Para_dict_i in Para_dict_list:
+        Para_dict_screen = Para_dict_i.copy()
+        Para_dict_screen["Mesh list"] = Mesh_Screen
+        Rows_Screen.append(Para_dict_screen)
+    Status_All = Run_Scan_Pool(
+        Rows_Screen, Path_List_Screen, Timelimit, Options, Options_Speed_i,
+        Pool_No, Re_No=0, Retry_Max=0)
+    Status_dict = {Status[0]: Status[3] for Status in Status_All}
+    Rows_Keep = [];  Screen_All = []
+    for Para_dict_i in Para_dict_list:
+        Scan_i = int(Para_dict_i["Scan No"])
+        mpe_screen = Get_Screen_Error(
+            BasicPath, Target + "Screen/", purpose + "_Screen", Scan_i, 
+            Options_Speed_i["Store"])
+        Keep = not mpe_screen > MPE_Keep    # nan: keep
+        if Keep:
+            Rows_Keep.append(Para_dict_i)
+        Screen_All.append([
+            Scan_i, Status_dict.get(Scan_i, "Error"), mpe_screen, Keep])
+    pd.DataFrame(
+        Screen_All, columns=["Scan No", "Status", "Error screen %", "Keep"]
+        ).to_csv(BasicPath + Target + "Scan_screen_status.csv", index=False)
+    print(f"Screening: keep {len(Rows_Keep)} of {len(Para_dict_list)} rows")
+    return Rows_Keep
+
+# first fit decreasing: rows into allocations of Cores processes for 
+# Walltime seconds each; returns the Para_dict lists of every allocation
+# and, with Path_Save, writes them as Bundle_{i}.csv (i from 1)
+def Pack_Scan_Rows(
+        Para_dict_list, Runshort, Predictor, Walltime, Cores, Path_Save=None):
+    Rows = sorted(
+        [[Get_Scan_Cost(Para_dict_i, Runshort, Predictor), Para_dict_i] 
+         for Para_dict_i in Para_dict_list], 
+        key = lambda Row: Row[0], reverse = True)
+    Bins = []   # [load of every core, rows]
+    for Cost,Para_dict_i in Rows:
+        if not Cost <= Walltime:
+            print(f"Scan {Para_dict_i['Scan No']} is expected to take {Cost:.0f} s, longer than the walltime")
+        for Bin in Bins:
+            i_core = int(np.argmin(Bin[0]))
+            if Bin[0][i_core] + Cost <= Walltime:
+                Bin[0][i_core] += Cost;  Bin[1].append(Para_dict_i)
+                break
+        else:
+            Bins.append([[Cost] + [0.0]*(Cores-1), [Para_dict_i]])
+    Bundles = [Bin[1] for Bin in Bins]
+    if Path_Save is not None:
+        os.makedirs(Path_Save, exist_ok=True)
+        for i,Bundle in enumerate(Bundles):
+            save_rows_to_csv(
+                Path_Save + f"Bundle_{i+1}.csv", 
+                [list(Para_dict_i.values()) for Para_dict_i in Bundle], 
+                list(Bundle[0].keys()))
+        print(f"{len(Para_dict_list)} rows packed into {len(Bundles)} bundles in {Path_Save}")
+    return Bundles
@@ -0,0 +1,350 @@
+# Results store and campaign index of the scans run with Fun_NC.py: 
+# parquet tables written by Run_P2_Excel (Options_Speed["Store"]) and 
+# ScanIndex over the finished scans, for the Reload notebooks. Only needs 
+# numpy, pandas and, for the parquet files, pyarrow
+import os, json, time, glob, hashlib, pickle, re
+import numpy as np;import pandas as pd
+
+# Columnar results store, instead of one Excel, several 
+# pickles and a .mat per scan. Every scan try writes one parquet file per 
+# table to BasicPath + Target + "Store/{Table}/" (atomic rename, file name 
+# unique per scan and Re_No, so concurrent writers never clash):
+#   Summary: one row per scan, same columns as the Excel row, the scan 
+#            columns as json in "Para" so all campaigns share one schema
+#   RPT:     one row per RPT with the main ageing metrics
+#   Arrays:  everything in midc_merge, one row per key (1D series, Index=-1)
+#            or per key and RPT/cycle (profiles), values as a list column
+# Compact_Store merges the small files, Read_Store reads lazily with filters
+Keys_Store_Summary_Str = [
+    "Y or N", "Dry out", "exp_AGE_text", "exp_RPT_text", 
+    "Error_AGE", "Error_RPT", "Log"]
+Keys_Store_Summary_Float = [
+    "Exp No.", "Error tot %","Error SOH %","Error LLI %",
+    "Error LAM NE %","Error LAM PE %","Error Res %","Error ageT %","Punish",
+    "Throughput capacity [kA.h]","CDend SOH [%]","CDend Neg Porosity Sep side",
+    "CDend LLI [%]","LLI to sei-on-cracks [%]","LLI to LiP [%]","LLI to SEI [%]",
+    "CDend LLI due to LAM [%]","LAM_to_Crack_NE [%]","LAM_to_Crack_PE [%]",
+    "LAM_to_Dry [%]","CDend LAM_ne_tot [%]","CDend LAM_pe_tot [%]",
+    "Cap per kAh","LLI% per kAh","LAM_ne% per kAh","LAM_pe% per kAh",
+    "Vol_Elely_Tot_All_final","Vol_Elely_JR_All_final","Width_all_final",]
+Keys_Store_RPT = [
+    "Cycle_RPT", "Throughput capacity [kA.h]", "Discharge capacity [A.h]",
+    "CDend SOH [%]", "CDend LLI [%]", "CDend LAM_ne [%]", "CDend LAM_pe [%]",
+    "CDend LLI SEI [%]", "CDend LLI SEI on cracks [%]", 
+    "CDend LLI lithium plating [%]", "CDend LLI due to LAM [%]",
+    "Res_midSOC", "avg_Age_T",]
+def Get_Store_Schema(Table):
+    import pyarrow as pa
+    Fields = [
+        ("purpose", pa.string()), ("Scan No", pa.int64()), 
+        ("Re_No", pa.int64()), ("Written", pa.float64())]
+    if Table == "Summary":
+        Fields += [(key, pa.string()) for key in Keys_Store_Summary_Str]
+        Fields += [(key, pa.float64()) for key in Keys_Store_Summary_Float]
+        Fields += [("Para", pa.string())]
+    elif Table == "RPT":
+        Fields += [("RPT", pa.int64())]
+        Fields += [(key, pa.float64()) for key in Keys_Store_RPT]
+    elif Table == "Arrays":
+        Fields += [
+            ("Source", pa.string()), ("Key", pa.string()), 
+            ("Index", pa.int64()), ("Values", pa.list_(pa.float64()))]
+    return pa.schema(Fields)
+
+def Get_Float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def Get_Store_Rows(Dict_Excel, Para_dict_i, midc_merge):
+    Rows_Summary = [{
+        **{key: (None if Dict_Excel.get(key) is None else str(Dict_Excel[key]))
+            for key in Keys_Store_Summary_Str},
+        **{key: Get_Float(Dict_Excel.get(key)) for key in Keys_Store_Summary_Float},
+        "Para": json.dumps(Para_dict_i, default=str)}]
+    my_dict_RPT = midc_merge[0]
+    Rows_RPT = []
+    for i in range(len(my_dict_RPT.get("Cycle_RPT", []))):
+        Row = {"RPT": i}
+        for key in Keys_Store_RPT:
+            value = my_dict_RPT.get(key, [])
+            Row[key] = Get_Float(value[i]) if (
+                isinstance(value, list) and i < len(value)) else np.nan
+        Rows_RPT.append(Row)
+    Rows_Arrays = []
+    for Source, dict_i in zip(["RPT", "AGE", "Dry"], midc_merge):
+        for key, value in dict_i.items():
+            try:
+                if not isinstance(value, (list, tuple, np.ndarray)):
+                    Items = [[-1, [float(value)]]]
+                elif all([np.ndim(value_i) == 0 for value_i in value]):
+                    Items = [[-1, np.asarray(value, dtype=float).tolist()]]
+                else:
+                    Items = [
+                        [i, np.ravel(np.asarray(value_i, dtype=float)).tolist()] 
+                        for i,value_i in enumerate(value)]
+            except (TypeError, ValueError):  # text, nothing to store
+                continue
+            Rows_Arrays += [
+                {"Source": Source, "Key": key, "Index": i, "Values": Values}
+                for i,Values in Items]
+    return {"Summary": Rows_Summary, "RPT": Rows_RPT, "Arrays": Rows_Arrays}
+
+def Save_Store_Scan(
+        BasicPath, Target, purpose, Scan_i, Re_No, 
+        Dict_Excel, Para_dict_i, midc_merge):
+    import pyarrow as pa, pyarrow.parquet as pq
+    Meta = {
+        "purpose": purpose, "Scan No": int(Scan_i), 
+        "Re_No": int(Re_No), "Written": time.time()}
+    for Table, Rows in Get_Store_Rows(Dict_Excel, Para_dict_i, midc_merge).items():
+        Path_Table = BasicPath + Target + f"Store/{Table}/"
+        os.makedirs(Path_Table, exist_ok=True)
+        Path_File = Path_Table + f"{purpose}_{Scan_i}_Re_{Re_No}.parquet"
+        try:
+            pq.write_table(
+                pa.Table.from_pylist(
+                    [{**Meta, **Row} for Row in Rows], 
+                    schema=Get_Store_Schema(Table)), 
+                Path_File + f".{os.getpid()}.tmp")
+            os.replace(Path_File + f".{os.getpid()}.tmp", Path_File)
+        except Exception as e:
+            print(f"Scan {Scan_i} Re {Re_No}: Fail to write {Table} to the store due to {e}")
+
+# lazy: only the row groups and columns asked for are read. Filters as in 
+# pyarrow, e.g. [("Scan No", "in", [1,2]), ("Key", "=", "CDend Porosity")];
+# Latest keeps only the last write of every purpose, scan and Re_No
+def Read_Store(Path_Store, Table, Filters=None, Columns=None, Latest=True):
+    import pyarrow.dataset as ds
+    Dataset = ds.dataset(
+        Path_Store + f"/{Table}/", format="parquet", 
+        schema=Get_Store_Schema(Table), exclude_invalid_files=True)
+    Expression = None
+    if Filters is not None:
+        import pyarrow.parquet as pq
+        Expression = pq.filters_to_expression(Filters)
+    if Columns is not None:
+        Columns = list(dict.fromkeys(
+            ["purpose", "Scan No", "Re_No", "Written"] + list(Columns)))
+    df = Dataset.to_table(columns=Columns, filter=Expression).to_pandas()
+    if Latest and len(df):
+        Written_last = df.groupby(
+            ["purpose", "Scan No", "Re_No"])["Written"].transform("max")
+        df = df[df["Written"] == Written_last].reset_index(drop=True)
+    return df
+
+# same structure as the old midc_merge.pkl, for the reload notebooks
+def Load_Store_midc_merge(Path_Store, purpose, Scan_i, Re_No):
+    df = Read_Store(Path_Store, "Arrays", Filters=[
+        ("purpose", "=", purpose), ("Scan No", "=", int(Scan_i)), 
+        ("Re_No", "=", int(Re_No))])
+    midc_merge = [{}, {}, {}]
+    for Source, dict_i in zip(["RPT", "AGE", "Dry"], midc_merge):
+        df_i = df[df["Source"] == Source].sort_values(["Key", "Index"])
+        for key, df_key in df_i.groupby("Key", sort=False):
+            if df_key["Index"].iloc[0] == -1:
+                dict_i[key] = list(df_key["Values"].iloc[0])
+            else:
+                dict_i[key] = [np.array(Values) for Values in df_key["Values"]]
+    return midc_merge
+
+# merge the per-scan files of every table into one file; skipped if 
+# another process is compacting the same store
+def Compact_Store(Path_Store):
+    import pyarrow.parquet as pq, pyarrow as pa
+    os.makedirs(Path_Store, exist_ok=True)
+    Path_Lock = Path_Store + "/compact.lock"
+    try:
+        Lock = os.open(Path_Lock, os.O_CREAT | os.O_EXCL)
+    except FileExistsError:
+        print(f"Store {Path_Store} is being compacted by another process")
+        return
+    try:
+        for Table in ["Summary", "RPT", "Arrays"]:
+            Files = sorted(glob.glob(Path_Store + f"/{Table}/*.parquet"))
+            if len(Files) < 2:
+                continue
+            Path_File = Path_Store + f"/{Table}/Compact_{time.time():.0f}_{os.getpid()}.parquet"
+            pq.write_table(
+                pa.concat_tables([
+                    pq.read_table(file, schema=Get_Store_Schema(Table)) 
+                    for file in Files]), 
+                Path_File + ".tmp")
+            os.replace(Path_File + ".tmp", Path_File)
+            for file in Files:
+                if file != Path_File:   # same second, same process
+                    os.remove(file)
+            print(f"Store: {len(Files)} files of {Table} merged")
+    finally:
+        os.close(Lock);  os.remove(Path_Lock)
+
+# One index over every finished scan of a campaign (all 
+# {purpose_i}* folders in Path_Results, Excel/Mats files or Store/), for the 
+# reload notebooks. Summary is one DataFrame (inputs and results, one row 
+# per scan and Re_No); per-RPT arrays are one .npy per key plus offsets, 
+# opened memory-mapped only when asked for. The index is cached in 
+# Scan_Index_{purpose_i}/ and only sources changed since are read again
+Keys_Index_Alias = {
+    "Exp": "Exp No.", "Temp": "Ageing temperature", 
+    "Scan": "Scan No", "Re": "Re_No"}
+class ScanIndex(object):
+    def __init__(
+            self, Path_Results, purpose_i, Keys_Array=None, Refresh=False):
+        self.Path_Results = Path_Results
+        self.purpose_i = purpose_i
+        self.Keys_Array = list(Keys_Store_RPT if Keys_Array is None else Keys_Array)
+        self.Path_Index = os.path.join(Path_Results, f"Scan_Index_{purpose_i}")
+        self.Summary = pd.DataFrame();  self.Offsets = {};  self.Signature = {}
+        self.Arrays = {}    # memory maps opened so far
+        t_0 = time.time()
+        Signature = self.Get_Signature()
+        if not Refresh:
+            self.Load()
+        if Signature != self.Signature or set(self.Keys_Array) - set(self.Offsets):
+            self.Update(Signature)
+        print(f"Index of {purpose_i}: {len(self.Summary)} scans in {time.time()-t_0:.1f} s")
+
+    # source -> last modified time; a source is one Excel file (Mats 
+    # pickle read together with it) or one Store/ folder
+    def Get_Signature(self):
+        Signature = {}
+        for Path_purpose in sorted(glob.glob(
+                os.path.join(self.Path_Results, f"{self.purpose_i}*", ""))):
+            for file in glob.glob(os.path.join(Path_purpose, "Excel", "*_Re_*.xlsx")):
+                Signature[file] = os.path.getmtime(file)
+            Files_Store = glob.glob(os.path.join(Path_purpose, "Store", "*", "*.parquet"))
+            if len(Files_Store):
+                Signature[os.path.join(Path_purpose, "Store")] = max(
+                    [os.path.getmtime(file) for file in Files_Store])
+        return Signature
+
+    def Load(self):
+        try:
+            with open(os.path.join(self.Path_Index, "Index.pkl"), "rb") as file:
+                [self.Summary, self.Offsets, self.Signature] = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            self.Summary = pd.DataFrame();  self.Offsets = {};  self.Signature = {}
+
+    # read the new or changed sources, keep the rest, write all keys again
+    def Update(self, Signature):
+        Keep = [
+            i for i,Source in enumerate(self.Summary.get("Source", []))
+            if Signature.get(Source) == self.Signature.get(Source)
+            and all([key in self.Offsets for key in self.Keys_Array])]
+        Rows = self.Summary.iloc[Keep].to_dict("records")
+        Values = {
+            key: [np.array(self.Get_Array(key, i)) for i in Keep] 
+            for key in self.Keys_Array}
+        Sources_Old = set([Rows_i["Source"] for Rows_i in Rows])
+        for Source in Signature:
+            if Source in Sources_Old:
+                continue
+            try:
+                if Source.endswith(".xlsx"):
+                    New = self.Read_Files(Source)
+                else:
+                    New = self.Read_Store(Source)
+            except Exception as e:
+                print(f"Index of {self.purpose_i}: Fail to read {Source} due to {e}")
+                continue
+            for Row,Arrays in New:
+                Rows.append(Row)
+                for key in self.Keys_Array:
+                    Values[key].append(Arrays.get(key, []))
+        Summary = pd.DataFrame(Rows)
+        if len(Summary):    # "Both" writes a scan to Excel and Store, keep one
+            Unique = ~Summary.duplicated(["purpose", "Scan No", "Re_No"]).values
+            Summary = Summary[Unique].reset_index(drop=True)
+            Values = {
+                key: [Value for Value,Flag in zip(Values[key], Unique) if Flag]
+                for key in self.Keys_Array}
+            Summary = Summary.sort_values(["purpose", "Scan No", "Re_No"])
+            Order = Summary.index.values
+            Summary = Summary.reset_index(drop=True)
+            Values = {key: [Values[key][i] for i in Order] for key in self.Keys_Array}
+        self.Arrays = {}     # old maps point to files about to be replaced
+        os.makedirs(self.Path_Index, exist_ok=True)
+        Offsets = {}
+        for key in self.Keys_Array:
+            Lengths = np.array([len(Value) for Value in Values[key]], dtype=np.int64)
+            Offsets[key] = np.stack([np.cumsum(Lengths) - Lengths, Lengths], axis=1)
+            Path_File = self.Get_Path_Array(key)
+            np.save(Path_File + ".tmp.npy", np.concatenate(
+                [np.asarray(Value, dtype=float) for Value in Values[key]] 
+                + [np.zeros(0)]))
+            os.replace(Path_File + ".tmp.npy", Path_File)
+        self.Summary = Summary;  self.Offsets = Offsets;  self.Signature = Signature
+        with open(os.path.join(self.Path_Index, "Index.pkl.tmp"), "wb") as file:
+            pickle.dump([self.Summary, self.Offsets, self.Signature], file)
+        os.replace(
+            os.path.join(self.Path_Index, "Index.pkl.tmp"), 
+            os.path.join(self.Path_Index, "Index.pkl"))
+
+    def Read_Files(self, Source):
+        [Scan_i, Re_No, purpose] = re.match(
+            r"(\d+)_Re_(\d+)_(.*)\.xlsx$", os.path.basename(Source)).groups()
+        [Scan_i, Re_No] = [int(Scan_i), int(Re_No)]
+        Path_purpose = os.path.dirname(os.path.dirname(Source))
+        Row = pd.read_excel(Source, engine="openpyxl").iloc[0].to_dict()
+        Row.update({
+            "purpose": purpose, "Scan No": Scan_i,
+            "Re_No": Re_No, "Source": Source})
+        Arrays = {}
+        try:
+            with open(os.path.join(
+                    Path_purpose, "Mats", f"{Scan_i}_Re_{Re_No}-midc_merge.pkl"), 
+                    "rb") as file:
+                Arrays = pickle.load(file)[0]
+        except OSError:     # failed in break-in, summary only
+            pass
+        return [[Row, Arrays]]
+
+    def Read_Store(self, Source):
+        df_Summ = Read_Store(Source, "Summary")
+        df_RPT = Read_Store(Source, "RPT", Columns=["RPT"] + [
+            key for key in self.Keys_Array if key in Keys_Store_RPT])
+        New = []
+        for _,Summ in df_Summ.iterrows():
+            Row = json.loads(Summ["Para"])
+            Row.update(Summ.drop(["Para", "Written"]).to_dict())
+            Row["Source"] = Source
+            df_i = df_RPT[
+                (df_RPT["purpose"] == Row["purpose"]) 
+                & (df_RPT["Scan No"] == Row["Scan No"])
+                & (df_RPT["Re_No"] == Row["Re_No"])].sort_values("RPT")
+            New.append([Row, {
+                key: df_i[key].values for key in self.Keys_Array 
+                if key in df_i.columns}])
+        return New
+
+    # e.g. Query(Exp=2, Temp=[10,25]) or Query(**{"Y or N": "Yes"}); a 
+    # value can be a list of values or a function of the column
+    def Query(self, **Filters):
+        Flag = np.ones(len(self.Summary), dtype=bool)
+        for key,value in Filters.items():
+            Column = self.Summary[Keys_Index_Alias.get(key, key)]
+            if callable(value):
+                Flag &= np.asarray(value(Column), dtype=bool)
+            elif isinstance(value, (list, tuple, set, np.ndarray)):
+                Flag &= Column.isin(list(value)).values
+            else:
+                Flag &= (Column == value).values
+        return self.Summary[Flag]
+
+    def Get_Path_Array(self, key):
+        return os.path.join(
+            self.Path_Index, 
+            f"Array_{hashlib.md5(key.encode()).hexdigest()[:12]}.npy")
+
+    # per-RPT array of one row (index of Summary, also of Query results), 
+    # read-only view into the memory map
+    def Get_Array(self, key, i_row):
+        if not key in self.Arrays:
+            self.Arrays[key] = np.load(self.Get_Path_Array(key), mmap_mode="r")
+        [Start, Length] = self.Offsets[key][i_row]
+        return self.Arrays[key][Start:Start+Length]
+
+    def Get_Arrays(self, key, df=None):
+        Index = self.Summary.index if df is None else df.index
+        return [self.Get_Array(key, i_row) for i_row in Index]
@@ -0,0 +1,22 @@
+"""
+Make the plots of scans run with Options_Speed["Plot"] = "Later" (or
+"Async" jobs that did not finish), from the plot jobs the scans left in
+Plots/Jobs/ of their output folder. Can run any time after the scans,
+also while other scans of the same folder are still running.
+
+    python Run_Plot_Jobs.py <output folder> [Scan No ...]
+
+Without scan numbers all jobs of the folder are plotted, NCPUS (PBS sets
+it, default: 1) processes at a time.
+"""
+import os, sys
+
+if __name__ == "__main__":
+    # Add path to system to ensure Fun_NC can be used
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from Fun_NC import Run_Plot_Jobs
+    Path_Target = sys.argv[1]
+    Scans = [int(Scan_i) for Scan_i in sys.argv[2:]] or None
+    Pool_No = int(os.environ.get("NCPUS", 1))
+    Done = Run_Plot_Jobs(Path_Target, Scans, Pool_No)
+    print(f"{sum(Done)} of {len(Done)} plot jobs done")
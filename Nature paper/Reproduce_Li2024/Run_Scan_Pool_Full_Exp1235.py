@@ -0,0 +1,52 @@
+"""
+Same cases as Run_long_Full_Exp1235.py, but runs the whole scan csv
+(not one bundle) on this machine, on a pool of processes.
+
+Rows expected to be longest start first: predicted from the cost
+history of earlier runs (Cost_History/) if there is one, otherwise
+from the number of cycles and the mesh.
+Rows that crash, time out or stop before the last RPT are tried again
+with Re_No + 1, i.e. from their last checkpoint, after waiting
+Backoff, 2*Backoff, ... seconds. All results go to one folder,
+Scan_pool_status.csv there lists every try, Logs/ has one log per try.
+
+With Screen = True, all rows first run with SPMe on a coarse mesh with
+cycle jumping (in Screen/ of the output folder) and only rows within
+MPE_Keep of the experiment go on to the DFN, see Scan_screen_status.csv.
+
+Set the number of processes with SCAN_POOL_NO (default: all cores)
+"""
+# Load modules
+import os
+
+########################     Global settings!!!
+Pool_No = int(os.environ.get("SCAN_POOL_NO", os.cpu_count()))
+Retry_Max = 2       # tries after the first one
+Backoff = 60        # s, wait before the first retry, doubled every time
+Wall_Max = None     # s, for one try of one row, None: only Timelimit
+Screen = False      # screen all rows with SPMe first, see Run_Scan_Screen
+MPE_Keep = 10       # %, rows with a larger screening error are dropped
+
+# cases, options and paths shared with the other scan script
+from Scan_Setup import (
+    Options, Options_Speed, Timelimit, Runshort, Re_No, Para_file, 
+    Get_Path_List)
+from Fun_NC import (
+    load_combinations_from_csv, CostPredictor, Load_Cost_History)
+from Fun_Sched import Run_Scan_Screen, Run_Scan_Pool
+
+if __name__ == "__main__":
+    # Load input file
+    Para_dict_list = load_combinations_from_csv(Para_file)
+    Path_List = Get_Path_List("Pool")
+    BasicPath = Path_List[0]
+    # expected wall time of every row from earlier runs, if any
+    Predictor = CostPredictor(Runshort).Fit(Load_Cost_History(BasicPath))
+    if Screen:
+        Para_dict_list = Run_Scan_Screen(
+            Para_dict_list, Path_List, Timelimit, Options, Options_Speed,
+            Pool_No, MPE_Keep)
+    Status_All = Run_Scan_Pool(
+        Para_dict_list, Path_List, Timelimit, Options, Options_Speed,
+        Pool_No, Re_No, Retry_Max, Backoff, Wall_Max, Predictor)
+    print(f"Scan pool: {sum([Status[3]=='Done' for Status in Status_All])} tries done out of {len(Status_All)}")
@@ -0,0 +1,45 @@
+"""
+Same cases as Run_long_Full_Exp1235.py, but every job (e.g. every PBS
+array element, as many as you like) pulls rows of the whole scan csv
+from one work queue on the shared filesystem, Scan_queue.db in the
+output folder, instead of running one fixed Bundle_{i}.csv.
+
+Each job runs up to NCPUS rows at a time (PBS sets it, default: all
+cores), longest expected rows first, and renews the lease of its rows
+every Lease/3 seconds. Rows of a job that died are run again from their
+last checkpoint once their lease runs out, failed rows are tried again
+after Backoff, 2*Backoff, ... seconds. The first job fills the queue,
+later jobs keep the rows already there.
+"""
+# Load modules
+import os
+
+########################     Global settings!!!
+Pool_No = int(os.environ.get("NCPUS", os.cpu_count()))
+Lease = 900         # s, a row without heartbeat for this long is requeued
+Retry_Max = 2       # tries after the first one
+Backoff = 60        # s, wait before the first retry, doubled every time
+Wall_Max = None     # s, for one try of one row, None: only Timelimit
+
+# cases, options and paths shared with the other scan script
+from Scan_Setup import (
+    Options, Options_Speed, Timelimit, Runshort, Para_file, 
+    Get_Path_List)
+from Fun_NC import (
+    load_combinations_from_csv, CostPredictor, Load_Cost_History)
+from Fun_Sched import Make_Scan_Folders
+from Fun_Queue import Init_Scan_Queue, Run_Scan_Queue
+
+if __name__ == "__main__":
+    # Load input file
+    Para_dict_list = load_combinations_from_csv(Para_file)
+    Path_List = Get_Path_List("Queue")
+    [BasicPath, _, Target, _] = Path_List
+    Make_Scan_Folders(Path_List)
+    Path_DB = BasicPath + Target + "Scan_queue.db"
+    # expected wall time of every row from earlier runs, if any
+    Predictor = CostPredictor(Runshort).Fit(Load_Cost_History(BasicPath))
+    Init_Scan_Queue(Path_DB, Para_dict_list, Runshort, Predictor)
+    Run_Scan_Queue(
+        Path_DB, Path_List, Timelimit, Options, Options_Speed,
+        Pool_No, Lease, Retry_Max, Backoff, Wall_Max)
@@ -38,6 +38,27 @@ Options = [
     Check_Small_Time,R_from_GITT,
     dpi,fs]
 Timelimit = int(3600*48) # give 48 hours!
+# speed-up switches, see Options_Speed_Default in Fun_NC.py
+Options_Speed = {
+    "Engine": False,    # build the model once, reuse for all ageing/RPT
+    "Cache": False,     # keep built engines for later scans in this process
+    "Timeout_Inline": False, # enforce Timelimit without forking per segment
+    "Worker": False,    # one long-lived process per scan keeps model and state
+    "Jump": False,      # cycle jumping (extrapolate slow states) in ageing sets
+    "Adaptive": False,  # adaptive number of cycles per ageing set
+    "Dryout_ODE": False,    # solve electrolyte dry-out inside the DFN
+    "Timelimit_Predict": False, # per-segment Timelimit from the cost history
+    "Timelimit_Factor": 5,  # times the predicted segment time
+    "Abort_MPE": None,      # e.g. 10: stop scans with running error above 10%
+    "Mesh_Auto": False,     # pick the coarsest converged mesh, ignore "Mesh list"
+    "Result_Cache": False,  # rows identical to a finished one reuse its result
+    "Store": "Files",       # "Parquet": results to Store/ instead of Excel/pkl/mat
+    "Plot": "Inline",   # "Async": plots in a background process, "Later": Run_Plot_Jobs.py
+    "Lean": False,   # keep only a compact record of finished segments
+    "Spill": False,  # Return_Sol: solutions to Sols/ on disk, lazy reload
+    "GITT_Sparse": False, # R_from_GITT: 0.1 s output only before each pulse
+    "GITT_Parallel": 0, # > 0: GITT pulses on this many processes, from C/10 states
+}
 
 
 if On_HPC:
@@ -83,6 +104,10 @@ Path_List = [BasicPath, Path_Input,Target,purpose]
 if Re_No == 0:
     midc_merge,Sol_RPT,Sol_AGE,DeBug_Lists = Run_P2_Excel (
         Para_dict_list[0], Path_List, 
-        Re_No, Timelimit, Options) 
+        Re_No, Timelimit, Options, Options_Speed) 
 elif Re_No > 0:
-    pass
+    # go on from the last checkpoint written by run Re_No-1 
+    # (after break-in, every ageing set and every RPT)
+    midc_merge,Sol_RPT,Sol_AGE,DeBug_Lists = Run_P2_Excel (
+        Para_dict_list[0], Path_List, 
+        Re_No, Timelimit, Options, Options_Speed) 
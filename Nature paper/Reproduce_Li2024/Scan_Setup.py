@@ -0,0 +1,66 @@
+"""
+Settings shared by Run_Scan_Pool_Full_Exp1235.py and 
+Run_Scan_Queue_Full_Exp1235.py: the cases and options of 
+Run_long_Full_Exp1235.py, with the speed-up switches on. Change them 
+here for both scripts.
+"""
+import os, sys
+import pybamm as pb
+
+purpose_i = "Full_Exp1235_NC"
+para_csv = f"{purpose_i}.csv"  # all rows, as saved by Get_Input_files.ipynb
+
+# define options:
+On_HPC =  False;        Runshort="GEM-2";    Add_Rest = False
+Plot_Exp=True;          Timeout=True;     Return_Sol=False;
+Check_Small_Time=True;  R_from_GITT = True
+fs = 13; dpi = 100; Re_No =0
+Options = [
+    On_HPC,Runshort,Add_Rest,
+    Plot_Exp,Timeout,Return_Sol,
+    Check_Small_Time,R_from_GITT,
+    dpi,fs]
+Timelimit = int(3600*48) # give 48 hours!
+# speed-up switches, see Options_Speed_Default in Fun_NC.py
+Options_Speed = {
+    "Engine": True,     # build the model once, reuse for all ageing/RPT
+    "Cache": True,      # keep built engines for later scans in this process
+    "Timeout_Inline": True, # enforce Timelimit without forking per segment
+    "Worker": True,     # one long-lived process per scan keeps model and state
+    "Jump": False,      # cycle jumping (extrapolate slow states) in ageing sets
+    "Adaptive": False,  # adaptive number of cycles per ageing set
+    "Dryout_ODE": False,    # solve electrolyte dry-out inside the DFN
+    "Timelimit_Predict": False, # per-segment Timelimit from the cost history
+    "Timelimit_Factor": 5,  # times the predicted segment time
+    "Abort_MPE": None,      # e.g. 10: stop scans with running error above 10%
+    "Mesh_Auto": False,     # pick the coarsest converged mesh, ignore "Mesh list"
+    "Result_Cache": True,   # rows identical to a finished one reuse its result
+    "Store": "Files",       # "Parquet": results to Store/ instead of Excel/pkl/mat
+    "Plot": "Inline",   # "Async": plots in a background process, "Later": Run_Plot_Jobs.py
+    "Lean": True,    # keep only a compact record of finished segments
+    "GITT_Sparse": True, # R_from_GITT: 0.1 s output only before each pulse
+}
+
+# Path setting:
+if On_HPC:                          # Run on HPC
+    Path_csv = f"InputData/{purpose_i}/"
+    Path_Input = "InputData/"
+    BasicPath=os.getcwd()
+    Para_file = Path_csv +  para_csv
+else:
+    # Add path to system to ensure Fun_NC can be used
+    str_path_0 = os.path.abspath(os.path.join(pb.__path__[0],'..'))
+    str_path_1 = os.path.abspath(
+        os.path.join(str_path_0,"Reproduce_Li2024"))
+    sys.path.append(str_path_1)
+    Path_Input = os.path.expanduser(
+        "~/EnvPBGEM_NC/SimSave/InputData/") # for Linux
+    BasicPath =  os.path.expanduser(
+        "~/EnvPBGEM_NC/SimSave/P2_R9_Dim")
+    Para_file = Path_Input+f'{purpose_i}/'+para_csv
+
+# [BasicPath, Path_Input, Target, purpose] of a script, e.g. suffix "Pool"
+def Get_Path_List(suffix):
+    purpose = f"{purpose_i}_{suffix}"
+    Target  = f'/{purpose}/'
+    return [BasicPath, Path_Input, Target, purpose]
@@ -0,0 +1,5 @@
+# Fun_NC.py and the other modules sit one folder up and are used by 
+# scripts and notebooks run from there, not as an installed package
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
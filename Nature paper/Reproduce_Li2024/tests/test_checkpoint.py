@@ -0,0 +1,72 @@
+import os
+import pickle
+
+import numpy as np
+import pybamm as pb
+import pytest
+
+from Fun_NC import (
+    Get_Checkpoint_Path, Save_Checkpoint, Load_Checkpoint, 
+    Get_Para_Dryout, SegmentScheduler)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    os.makedirs(tmp_path / "Mats")
+    Path_Check = Get_Checkpoint_Path(str(tmp_path), "/", 7)
+    Checkpoint = {
+        "Re_No": 2, "k": 3, "i": 1, "avg_Age_T": [25.0, 25.1],
+        "my_dict_RPT": {"Discharge capacity [A.h]": [5.07, 4.98]},
+        "Summ_Last": {"Endpoints": {"Total lithium in electrolyte [mol]": np.array([1.0, 0.9])}},
+    }
+    Save_Checkpoint(Path_Check, Checkpoint)
+    Loaded = Load_Checkpoint(Path_Check)
+    assert Loaded["Re_No"] == 2 and Loaded["my_dict_RPT"] == Checkpoint["my_dict_RPT"]
+    np.testing.assert_array_equal(
+        Loaded["Summ_Last"]["Endpoints"]["Total lithium in electrolyte [mol]"], [1.0, 0.9])
+    assert os.listdir(tmp_path / "Mats") == [os.path.basename(Path_Check)]  # no temporary file left
+
+
+def test_checkpoint_path_does_not_depend_on_re_no(tmp_path):
+    # a retry with any Re_No finds the checkpoint of the try before
+    assert Get_Checkpoint_Path(str(tmp_path), "/", 7).endswith("Mats/7-Checkpoint.pkl")
+
+
+def test_checkpoint_save_fails_loudly(tmp_path):
+    with pytest.raises(OSError):
+        Save_Checkpoint(str(tmp_path / "missing" / "1-Checkpoint.pkl"), {"k": 0})
+
+
+def test_checkpoint_load_missing_or_broken(tmp_path):
+    assert Load_Checkpoint(str(tmp_path / "none.pkl")) is None
+    (tmp_path / "broken.pkl").write_bytes(b"not a pickle")
+    assert Load_Checkpoint(str(tmp_path / "broken.pkl")) is None
+
+
+def test_para_dryout_is_plain_and_restores():
+    Para = pb.ParameterValues("OKane2022")
+    Para.update({
+        "Ratio of electrolyte dry out in jelly roll": 0.97, 
+        "Current total electrolyte volume in jelly roll [m3]": 4.5e-6}, 
+        check_already_exists=False)
+    Para_Dryout = Get_Para_Dryout(Para)
+    assert all(isinstance(value, float) for value in Para_Dryout.values())
+    pickle.dumps(Para_Dryout)
+    Para_new = pb.ParameterValues("OKane2022")
+    Para_new.update(Para_Dryout, check_already_exists=False)
+    assert Para_new["Ratio of electrolyte dry out in jelly roll"] == 0.97
+    assert Para_new["Electrode width [m]"] == Para["Electrode width [m]"]
+
+
+def test_scheduler_state_round_trip():
+    Scheduler = SegmentScheduler(10, 100, 0.05, 0.2)
+    Summ = {"Cycs": 10, "Endpoints": {
+        "Loss of lithium to SEI [mol]": [0.0, 1e-3],
+        "Loss of lithium to SEI on cracks [mol]": [0.0, 0.0],
+        "Loss of lithium to lithium plating [mol]": [0.0, 0.0]}}
+    Scheduler.Add(Summ, None)
+    n_next = Scheduler.Next(90)
+    State = pickle.loads(pickle.dumps(Scheduler.Get_State()))
+    Scheduler_new = SegmentScheduler(10, 100, 0.05, 0.2)
+    Scheduler_new.Set_State(State)
+    assert Scheduler_new.n_last == n_next
+    assert Scheduler_new.Next(70) == Scheduler.Next(70)
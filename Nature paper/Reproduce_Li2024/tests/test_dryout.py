@@ -0,0 +1,122 @@
+import numpy as np
+import pybamm as pb
+import pytest
+
+from Fun_NC import (
+    Add_Dryout_States, Get_Dryout_Ratio, Cal_new_con_Update,
+    Cal_new_con_Update_ODE)
+
+
+def Get_Vol_Pore(Sol, Para, i):
+    return (
+        Sol["X-averaged negative electrode porosity"].entries[i]
+            * Para["Negative electrode thickness [m]"]
+        + Sol["X-averaged separator porosity"].entries[i]
+            * Para["Separator thickness [m]"]
+        + Sol["X-averaged positive electrode porosity"].entries[i]
+            * Para["Positive electrode thickness [m]"]
+        ) * Para["Electrode width [m]"] * Para["Electrode height [m]"]
+
+
+def Get_Para(Int_ElelyExces_Ratio, Vol_Pore=1e-6):
+    Para = pb.ParameterValues("OKane2022")
+    L_y = Para["Electrode width [m]"]
+    Para.update({
+        "Outer SEI solvent diffusivity [m2.s-1]":
+            Para["Outer SEI solvent diffusivity [m2.s-1]"] * 1e5, # age fast
+        "EC partial molar volume [m3.mol-1]": 6.667e-5,
+        # SEI takes less pore volume than the EC it consumes, so the 
+        # jelly roll needs electrolyte: refilled, or dried without reservoir
+        "Outer SEI partial molar volume [m3.mol-1]": 3e-5,
+        "EC initial concentration in electrolyte [mol.m-3]":
+            Para["Bulk solvent concentration [mol.m-3]"],
+        "Initial Electrode width [m]": L_y,
+        "Current total electrolyte volume in whole cell [m3]":
+            Vol_Pore * Int_ElelyExces_Ratio,
+        "Current total electrolyte volume in jelly roll [m3]": Vol_Pore,
+        "Current electrolyte concentration in the reservoir [mol.m-3]":
+            Para["Initial concentration in electrolyte [mol.m-3]"],
+        "Current solvent concentration in the reservoir [mol.m-3]":
+            Para["Bulk solvent concentration [mol.m-3]"],
+        "Ratio of Li-ion concentration change in electrolyte consider solvent consumption": 1.0,
+        "Ratio of electrolyte dry out in jelly roll": 1.0,
+        }, check_already_exists=False)
+    return Para
+
+
+def Get_Model():
+    Model = pb.lithium_ion.DFN(options={
+        "SEI": "solvent-diffusion limited", "SEI porosity change": "true"})
+    # names of the pybamm version Fun_NC is written for
+    for name in [
+            "SEI", "SEI on cracks", "lithium plating", "dead lithium plating"]:
+        name_new = f"Loss of lithium to negative {name} [mol]"
+        Model.variables.setdefault(
+            f"Loss of lithium to {name} [mol]", 
+            Model.variables[name_new] if name_new in Model.variables.keys() 
+            else pb.Scalar(0))
+    return Add_Dryout_States(Model)
+
+
+def Solve_Coupled(Para, Steps):
+    Model = Get_Model()
+    Para_sim = Para.copy()
+    Para_sim.update({
+        "Electrode width [m]":
+        pb.InputParameter("Initial Electrode width [m]") * Get_Dryout_Ratio(Model),
+        "Initial Electrode width [m]": "[input]"})
+    Sim = pb.Simulation(
+        Model, parameter_values=Para_sim,
+        var_pts={"x_n": 5, "x_s": 5, "x_p": 5, "r_n": 10, "r_p": 10},
+        experiment=pb.Experiment(Steps))
+    L_y = Para["Electrode width [m]"]
+    return Sim.solve(calc_esoh=False, inputs={
+        "Electrode width [m]": L_y, "Initial Electrode width [m]": L_y})
+
+
+def Get_Total_Li(Sol):
+    return (
+        Sol["Total lithium in particles [mol]"].entries
+        + Sol["Total lithium in electrolyte [mol]"].entries
+        + Sol["Reservoir lithium-ion amount [mol]"].entries
+        + Sol["Loss of lithium to SEI [mol]"].entries)
+
+
+def Solve_Case(Int_ElelyExces_Ratio):
+    # start with the jelly roll full at the porosity the model starts with
+    Sol_0 = Solve_Coupled(Get_Para(1.5), ["Rest for 1 s"])
+    Para = Get_Para(Int_ElelyExces_Ratio, Get_Vol_Pore(Sol_0, Get_Para(1.5), 0))
+    Sol = Solve_Coupled(
+        Para, ["Discharge at 5 A until 3 V", "Charge at 5 A until 4.1 V"])
+    return Para, Sol
+
+
+def test_coupled_dryout_matches_per_segment_update():
+    # enough reservoir: the width stays, so Cal_new_con_Update applies
+    Para, Sol = Solve_Case(1.5)
+    Data_Pack_seg, _ = Cal_new_con_Update(Sol, Para.copy())
+    Data_Pack_ODE, _ = Cal_new_con_Update_ODE(Sol, Para.copy())
+    # Vol_EC_consumed, Vol_Elely_add, Vol_Elely_Tot_new, Vol_Elely_JR_new, 
+    # Ratio_Dryout, Width_new
+    for i in [0, 4, 5, 6, 11, 14]:
+        assert Data_Pack_ODE[i] == pytest.approx(Data_Pack_seg[i], rel=1e-3)
+    assert Data_Pack_ODE[11] == pytest.approx(1.0, abs=1e-9)
+    # lithium moved from the reservoir is conserved
+    Li = Get_Total_Li(Sol)
+    np.testing.assert_allclose(Li, Li[0], rtol=1e-6)
+
+
+def test_coupled_dryout_dries_without_reservoir():
+    # the width shrinks within the run, where the lithium lost to SEI of 
+    # pybamm (read by Cal_new_con_Update) drops the dried part
+    Para, Sol = Solve_Case(1.0001)
+    Data_Pack_ODE, Para_new = Cal_new_con_Update_ODE(Sol, Para.copy())
+    Vol_Tot_old = Para["Current total electrolyte volume in whole cell [m3]"]
+    assert Data_Pack_ODE[11] < 1 - 1e-3
+    assert Data_Pack_ODE[5] == pytest.approx(
+        Vol_Tot_old - Data_Pack_ODE[0], rel=1e-9)
+    # the remaining electrolyte fills the pores of the wetted width
+    assert Data_Pack_ODE[6] == pytest.approx(Data_Pack_ODE[7], rel=1e-4)
+    assert Data_Pack_ODE[6] == pytest.approx(Data_Pack_ODE[5], rel=1e-3)
+    assert Para_new["Electrode width [m]"] == pytest.approx(
+        Data_Pack_ODE[11] * Para["Electrode width [m]"])
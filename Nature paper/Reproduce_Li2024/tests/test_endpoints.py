@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from Fun_NC import (
+    Get_Var_At, Get_Endpoints, Get_Throughput_Last, Sol_Endpoints,
+    Cal_new_con_Update)
+from test_dryout import Get_Para, Solve_Coupled
+
+
+@pytest.fixture(scope="module")
+def Case():
+    Para = Get_Para(1.5)
+    Sol = Solve_Coupled(
+        Para, ["Discharge at 5 A until 3 V", "Rest for 10 minutes",
+               "Charge at 5 A until 4.1 V"])
+    return Para, Sol
+
+
+def test_var_at_matches_full_entries(Case):
+    _, Sol = Case
+    assert len(Sol.all_ts) > 1
+    n_t = len(Sol.t)
+    # a middle index on a later sub-solution, and negative indices
+    Indices = [0, len(Sol.all_ts[0]) + 2, n_t - 2, -1]
+    keys = [
+        "X-averaged electrolyte concentration [mol.m-3]",   # scalar
+        "Electrolyte concentration [mol.m-3]",              # profile
+        "Loss of lithium to SEI [mol]",
+        "Discharge capacity [A.h]",             # integrated over time
+        "Throughput capacity [A.h]", ]
+    Values = Get_Var_At(Sol, keys, Indices)
+    for key in keys:
+        entries = Sol[key].entries
+        Values_ref = np.stack([entries[..., i] for i in Indices], axis=-1)
+        np.testing.assert_allclose(Values[key], Values_ref, rtol=1e-10)
+    assert Get_Throughput_Last(Sol) == pytest.approx(
+        Sol["Throughput capacity [A.h]"].entries[-1], rel=1e-10)
+
+
+def test_endpoints_give_same_update(Case):
+    Para, Sol = Case
+    Data_Pack, Para_new = Cal_new_con_Update(Sol, Para.copy())
+    Data_Pack_end, Para_new_end = Cal_new_con_Update(
+        Sol_Endpoints(Get_Endpoints(Sol)), Para.copy())
+    for value, value_ref in zip(Data_Pack_end, Data_Pack):
+        np.testing.assert_allclose(value, value_ref, rtol=1e-10)
+    for key in [
+            "Electrode width [m]",
+            "Current total electrolyte volume in whole cell [m3]",
+            "Initial concentration in electrolyte [mol.m-3]"]:
+        assert Para_new_end[key] == pytest.approx(Para_new[key], rel=1e-10)
+
+
+def test_throughput_read_fails_to_nan():
+    class Sol_Broken(object):
+        all_models = []
+        def __getitem__(self, key):
+            raise KeyError(key)
+    assert np.isnan(Get_Throughput_Last(Sol_Broken()))
@@ -0,0 +1,69 @@
+import numpy as np
+import pybamm as pb
+
+from Fun_NC import Get_Engine_Key
+
+
+Mesh = [5, 5, 5, 10, 10]
+
+
+def Get_Case():
+    Model = pb.lithium_ion.SPM()
+    Para = pb.ParameterValues("OKane2022")
+    Experiment = pb.Experiment(["Discharge at C/10 for 1 hour"])
+    return Model, Para, Experiment
+
+
+def Get_Key(Model, Para, Experiment, mesh_list=Mesh, submesh_strech="nan"):
+    return Get_Engine_Key(Model, Para, Experiment, mesh_list, submesh_strech)
+
+
+def Get_Fun(scale):
+    def Fun(x):
+        return scale * x
+    return Fun
+
+
+def test_engine_key_same_inputs():
+    Model, Para, Experiment = Get_Case()
+    Model_2, Para_2, Experiment_2 = Get_Case()
+    assert Get_Key(Model, Para, Experiment) == Get_Key(
+        Model_2, Para_2, Experiment_2)
+
+
+def test_engine_key_differs():
+    Model, Para, Experiment = Get_Case()
+    Key = Get_Key(Model, Para, Experiment)
+    # a parameter value
+    Para_new = Para.copy()
+    Para_new.update({"Electrode width [m]": 0.9 * Para["Electrode width [m]"]})
+    assert Get_Key(Model, Para_new, Experiment) != Key
+    # model options, experiment, mesh and submesh
+    Model_new = pb.lithium_ion.SPM(options={"SEI": "reaction limited"})
+    assert Get_Key(Model_new, Para, Experiment) != Key
+    Experiment_new = pb.Experiment(["Discharge at C/5 for 1 hour"])
+    assert Get_Key(Model, Para, Experiment_new) != Key
+    assert Get_Key(Model, Para, Experiment, mesh_list=[5, 5, 5, 20, 20]) != Key
+    assert Get_Key(Model, Para, Experiment, submesh_strech=2) != Key
+
+
+def test_engine_key_callables_and_arrays():
+    Model, Para, Experiment = Get_Case()
+    Keys = []
+    # same function, different values captured by the closure
+    for scale in [1.0, 2.0]:
+        Para_new = Para.copy()
+        Para_new.update({"Test function": Get_Fun(scale)},
+            check_already_exists=False)
+        Keys.append(Get_Key(Model, Para_new, Experiment))
+    assert Keys[0] != Keys[1]
+    Para_new = Para.copy()
+    Para_new.update({"Test function": Get_Fun(1.0)}, check_already_exists=False)
+    assert Get_Key(Model, Para_new, Experiment) == Keys[0]
+    # arrays by content
+    Keys = []
+    for Values in [np.array([1.0, 2.0]), np.array([1.0, 2.0]), np.array([1.0, 3.0])]:
+        Para_new = Para.copy()
+        Para_new.update({"Test data": Values}, check_already_exists=False)
+        Keys.append(Get_Key(Model, Para_new, Experiment))
+    assert Keys[0] == Keys[1] and Keys[0] != Keys[2]
@@ -0,0 +1,85 @@
+import multiprocessing
+import time
+
+import numpy as np
+import pybamm as pb
+import pytest
+
+from Fun_NC import (
+    Engine_Cache, Get_GITT_Engine, Get_GITT_Recipe, Get_GITT_Seeds,
+    Run_GITT_Parallel)
+
+
+Mesh = [5, 5, 5, 10, 10]
+exp_RPT_GITT_text = [ (
+    "Rest for 5 minutes (1 minute period)",
+    "Rest for 1.2 seconds (0.1 second period)",
+    "Discharge at C/2 for 4.8 minutes or until 2.5V (0.1 second period)",
+    "Rest for 1 hour",
+    ) ]
+
+
+def Get_Recipe(Para):
+    return Get_GITT_Recipe(
+        {}, "SPMe", Para, exp_RPT_GITT_text, 2.5, Mesh, "nan")
+
+
+@pytest.fixture(scope="module")
+def Case():
+    Model = pb.lithium_ion.SPMe()
+    Para = pb.ParameterValues("OKane2022")
+    Sim = pb.Simulation(
+        Model, parameter_values=Para,
+        var_pts={"x_n": 5, "x_s": 5, "x_p": 5, "r_n": 10, "r_p": 10},
+        experiment=pb.Experiment(["Discharge at C/10 for 1 hour"]))
+    Seeds, SOC = Get_GITT_Seeds(
+        Sim.solve(calc_esoh=False), 0, 0.1, 5.0, N_Pulse=3)
+    Engine_GITT = Get_GITT_Engine(Get_Recipe(Para), Use_Cache=True)
+    return Para, Engine_GITT, Seeds, SOC
+
+
+def test_gitt_engine_built_once(Case):
+    Para, Engine_GITT, _, _ = Case
+    # the width changes between RPTs, the built pulse is reused
+    Para_new = Para.copy()
+    Para_new.update({"Electrode width [m]": 0.9 * Para["Electrode width [m]"]})
+    Engine_new = Get_GITT_Engine(Get_Recipe(Para_new), Use_Cache=True)
+    assert Engine_new.Sim_RPT is Engine_GITT.Sim_RPT
+    assert "Electrode width [m]" in Engine_GITT.Keys_Input
+    Engine_Cache.clear()
+
+
+def test_gitt_pool_matches_sequential(Case):
+    Para, Engine_GITT, Seeds, SOC = Case
+    T = Para["Ambient temperature [K]"]
+    _, Res_seq, SOC_seq = Run_GITT_Parallel(Engine_GITT, Para, T, Seeds, SOC, 1)
+    _, Res_pool, _ = Run_GITT_Parallel(Engine_GITT, Para, T, Seeds, SOC, 2)
+    assert len(Res_seq) == 3 and np.all(np.isfinite(Res_seq))
+    np.testing.assert_allclose(Res_pool, Res_seq, rtol=1e-9)
+    assert SOC_seq == SOC
+    # a thinner wetted width gives a higher resistance
+    Para_new = Para.copy()
+    Para_new.update({"Electrode width [m]": 0.5 * Para["Electrode width [m]"]})
+    _, Res_new, _ = Run_GITT_Parallel(Engine_GITT, Para_new, T, Seeds, SOC, 1)
+    assert np.all(np.array(Res_new) > np.array(Res_seq))
+
+
+def test_gitt_deadline(Case):
+    Para, Engine_GITT, Seeds, SOC = Case
+    T = Para["Ambient temperature [K]"]
+    for Pool_No in [1, 2]:
+        Res_midSOC, Res_full, _ = Run_GITT_Parallel(
+            Engine_GITT, Para, T, Seeds, SOC, Pool_No, time.time() - 1)
+        assert len(Res_full) == len(Seeds)
+        assert np.all(np.isnan(Res_full))
+
+
+def test_gitt_pool_spawn(Case, monkeypatch):
+    # the pool processes build their own engine, nothing relies on fork
+    Para, Engine_GITT, Seeds, SOC = Case
+    T = Para["Ambient temperature [K]"]
+    _, Res_seq, _ = Run_GITT_Parallel(Engine_GITT, Para, T, Seeds, SOC, 1)
+    monkeypatch.setattr(
+        multiprocessing, "Pool", multiprocessing.get_context("spawn").Pool)
+    _, Res_spawn, _ = Run_GITT_Parallel(Engine_GITT, Para, T, Seeds, SOC, 2)
+    np.testing.assert_allclose(Res_spawn, Res_seq, rtol=1e-9)
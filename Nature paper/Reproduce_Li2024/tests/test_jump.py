@@ -0,0 +1,69 @@
+import numpy as np
+import pybamm as pb
+
+from Fun_NC import ScanEngine, Jump_Max_Change
+
+
+class Model_Fake(object):
+    # what Get_Jump needs from a built model: state slices and sizes
+    def __init__(self):
+        self.y_slices = {
+            pb.Variable("Outer SEI thickness [m]"): [slice(0, 2)],
+            pb.Variable("Negative particle concentration [mol.m-3]"): [slice(2, 4)],
+            pb.Variable("Volume-averaged cell temperature [K]"): [slice(4, 5)],
+            pb.Variable("Negative electrode interfacial current density [A.m-2]"): [slice(5, 6)],
+        }
+        self.len_rhs = 5
+        self.len_rhs_and_alg = 6
+
+
+class Cycle_Fake(object):
+    def __init__(self, Model, y_end):
+        self.all_models = [Model]
+        self.all_ys = [np.array(y_end)[:, np.newaxis]]
+
+
+def Get_Engine(Jump_Sample=4, Jump_Tol=1e-3):
+    Engine = ScanEngine.__new__(ScanEngine)
+    Engine.Jump = [Jump_Sample, Jump_Tol]
+    Engine.Jump_Masks = {}
+    return Engine
+
+
+def Get_Cycles(Model, n_cyc, drift_slow, drift_fast):
+    cycles = []
+    for i in range(n_cyc):
+        cycles.append(Cycle_Fake(Model, [
+            1.0 + drift_slow * i, 2.0 + drift_slow * i,     # SEI, slow
+            100.0 + drift_fast * i, 200.0 + 3 * drift_fast * i, # particle, fast
+            300.0,                                          # temperature, fast
+            7.0 + drift_fast * i,                           # algebraic
+        ]))
+    return cycles
+
+
+def test_only_slow_states_are_extrapolated():
+    Model = Model_Fake()
+    cycles = Get_Cycles(Model, 6, 1e-4, 0.5)
+    [Jump, y_jump] = Get_Engine().Get_Jump(cycles, 1000)
+    y_last = cycles[-1].all_ys[-1][:, -1]
+    assert Jump >= 4
+    np.testing.assert_allclose(y_jump[:2], y_last[:2] + 1e-4 * Jump)
+    # fast states keep their end-of-cycle profile, shifted by the mean drift
+    np.testing.assert_allclose(y_jump[2:4], y_last[2:4] + 1.0 * Jump)
+    np.testing.assert_array_equal(y_jump[4:], y_last[4:])
+
+
+def test_jump_limited_by_largest_change_of_slow_states():
+    Model = Model_Fake()
+    cycles = Get_Cycles(Model, 6, 1e-3, 0.0)
+    [Jump, y_jump] = Get_Engine().Get_Jump(cycles, 10000)
+    # linear drift: no curvature, only Jump_Max_Change of the largest slow state
+    y_last = cycles[-1].all_ys[-1][:, -1]
+    assert Jump == int(Jump_Max_Change * y_last[1] / 1e-3)
+
+
+def test_no_jump_when_capped():
+    Model = Model_Fake()
+    cycles = Get_Cycles(Model, 6, 1e-4, 0.5)
+    assert Get_Engine().Get_Jump(cycles, 2) == [0, None]
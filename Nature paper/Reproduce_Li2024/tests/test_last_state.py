@@ -0,0 +1,37 @@
+import numpy as np
+import pybamm as pb
+import pytest
+
+from Fun_NC import Get_Last_state
+
+
+Keys_Phi_e = [
+    "Negative electrolyte potential [V]",
+    "Separator electrolyte potential [V]",
+    "Positive electrolyte potential [V]", ]
+
+
+@pytest.mark.parametrize("Model_Type", [pb.lithium_ion.DFN, pb.lithium_ion.SPMe])
+def test_last_state_restarts_model(Model_Type):
+    # SPMe has no electrolyte potential state, the DFN has one per domain
+    Model = Model_Type()
+    Para = pb.ParameterValues("OKane2022")
+    Sim = pb.Simulation(
+        Model, parameter_values=Para,
+        var_pts={"x_n": 5, "x_s": 5, "x_p": 5, "r_n": 10, "r_p": 10})
+    Sol = Sim.solve([0, 600])
+    list_short,dict_short = Get_Last_state(Model, Sol)
+    Has_Phi_e = "Electrolyte potential [V]" in [
+        var.name for var in Model.initial_conditions.keys()]
+    assert Has_Phi_e == (Model_Type is pb.lithium_ion.DFN)
+    assert all([(key in list_short) == Has_Phi_e for key in Keys_Phi_e])
+    assert not "Porosity times concentration [mol.m-3]" in list_short
+    # a new model starts from the last state
+    Model_new = Model.set_initial_conditions_from(dict_short, inplace=False)
+    Sim_new = pb.Simulation(
+        Model_new, parameter_values=Para,
+        var_pts={"x_n": 5, "x_s": 5, "x_p": 5, "r_n": 10, "r_p": 10})
+    Sol_new = Sim_new.solve([0, 1])
+    np.testing.assert_allclose(
+        Sol_new["Terminal voltage [V]"].entries[0],
+        Sol["Terminal voltage [V]"].entries[-1], rtol=1e-3)
@@ -0,0 +1,30 @@
+import os
+
+from Fun_NC import PlotProcs
+
+
+def test_plot_procs_cap_and_return_codes(tmp_path):
+    # jobs that can not be loaded: the plot fails and the job stays
+    Path_Jobs = tmp_path / "Plots" / "Jobs"
+    Path_Jobs.mkdir(parents=True)
+    for Scan_i in [1, 2]:
+        (Path_Jobs / f"{Scan_i}_Re_0-Plot_Job.pkl").write_bytes(b"not a job")
+    Plotter = PlotProcs(Max_No=1)
+    assert Plotter.Run(str(tmp_path)) == 1     # one at a time
+    Codes = Plotter.Wait()
+    assert [os.path.basename(Path_Job) for Path_Job,_ in Codes] == ["1_Re_0-Plot_Job.pkl"]
+    assert Codes[0][1] == 1
+    assert os.path.exists(Codes[0][0])
+    # the failed job is not started again, the next one is
+    Plotter.Run(str(tmp_path))
+    assert [os.path.basename(Path_Job) for _,Path_Job in Plotter.Procs] == ["2_Re_0-Plot_Job.pkl"]
+    Plotter.Wait()
+    assert Plotter.Run(str(tmp_path)) == 0
+    Plotter.Save(str(tmp_path / "Plot_status.csv"))
+    assert len(open(tmp_path / "Plot_status.csv").read().splitlines()) == 3
+
+
+def test_no_plot_procs_on_import():
+    # made by Run_P2_Excel only when "Async" is chosen
+    import Fun_NC
+    assert not any(isinstance(value, PlotProcs) for value in vars(Fun_NC).values())
@@ -0,0 +1,83 @@
+import sqlite3
+import time
+
+from Fun_Queue import (
+    Init_Scan_Queue, Claim_Scan_Row, Renew_Scan_Leases, Finish_Scan_Row)
+
+
+def Get_Rows(Path_DB):
+    Conn = sqlite3.connect(Path_DB)
+    Rows = {
+        Row[0]: Row[1:] for Row in Conn.execute(
+            "SELECT scan_no, status, re_no, tries, owner, lease_until, "
+            "not_before FROM rows")}
+    Conn.close()
+    return Rows
+
+
+def Init_Case(tmp_path):
+    Path_DB = str(tmp_path / "Queue.db")
+    # a finer mesh costs more, so Scan 2 is claimed first
+    Para_dict_list = [
+        {"Scan No": Scan_i, "Exp No.": 2, "Ageing temperature": 25, 
+         "Mesh list": Mesh} 
+        for Scan_i,Mesh in [(1, "[5,5,5,10,10]"), (2, "[5,5,5,30,30]")]]
+    Init_Scan_Queue(Path_DB, Para_dict_list, "GEM-2")
+    return Path_DB
+
+
+def test_queue_claim_by_two_owners(tmp_path):
+    Path_DB = Init_Case(tmp_path)
+    # init again keeps the rows as they are
+    Init_Scan_Queue(Path_DB, [{"Scan No": 1}], "GEM-2")
+    assert len(Get_Rows(Path_DB)) == 2
+    Row_A = Claim_Scan_Row(Path_DB, "A", 100)
+    Row_B = Claim_Scan_Row(Path_DB, "B", 100)
+    assert Row_A[0]["Scan No"] == 2 and Row_A[1] == 0
+    assert Row_B[0]["Scan No"] == 1 and Row_B[1] == 0
+    # nothing ready, but rows are still running
+    assert Claim_Scan_Row(Path_DB, "C", 100) is None
+    Finish_Scan_Row(Path_DB, "A", 2, "Done", 2, 0)
+    Finish_Scan_Row(Path_DB, "B", 1, "Done", 2, 0)
+    assert Claim_Scan_Row(Path_DB, "C", 100) == "Empty"
+    assert [Row[0] for Row in Get_Rows(Path_DB).values()] == ["done", "done"]
+
+
+def test_queue_lease_renew_and_expiry(tmp_path):
+    Path_DB = Init_Case(tmp_path)
+    Claim_Scan_Row(Path_DB, "A", 0.5)
+    lease_until = Get_Rows(Path_DB)[2][4]
+    time.sleep(0.3)
+    Renew_Scan_Leases(Path_DB, "A", [2], 0.5)
+    assert Get_Rows(Path_DB)[2][4] > lease_until
+    # someone else cannot renew it
+    lease_until = Get_Rows(Path_DB)[2][4]
+    Renew_Scan_Leases(Path_DB, "B", [2], 100)
+    assert Get_Rows(Path_DB)[2][4] == lease_until
+    # the lease runs out: Scan 2 goes on from its checkpoint with Re_No + 1
+    time.sleep(0.6)
+    Row_B = Claim_Scan_Row(Path_DB, "B", 100)
+    assert Row_B[0]["Scan No"] == 2 and Row_B[1] == 1
+    assert Get_Rows(Path_DB)[2][:4] == ("running", 1, 1, "B")
+    # the old owner cannot finish it any more
+    Finish_Scan_Row(Path_DB, "A", 2, "Done", 2, 0)
+    assert Get_Rows(Path_DB)[2][0] == "running"
+
+
+def test_queue_retry_with_backoff(tmp_path):
+    Path_DB = Init_Case(tmp_path)
+    Claim_Scan_Row(Path_DB, "A", 100)
+    t_now = time.time()
+    Finish_Scan_Row(Path_DB, "A", 2, "Error", 2, 100)
+    Status, Re_No, tries, _, _, not_before = Get_Rows(Path_DB)[2]
+    assert (Status, Re_No, tries) == ("pending", 1, 1)
+    assert not_before >= t_now + 100
+    # waits for its backoff, so the cheaper row is claimed
+    assert Claim_Scan_Row(Path_DB, "A", 100)[0]["Scan No"] == 1
+    # out of retries
+    Finish_Scan_Row(Path_DB, "A", 1, "Error", 2, 0)
+    Claim_Scan_Row(Path_DB, "A", 100)
+    Finish_Scan_Row(Path_DB, "A", 1, "Error", 2, 0)
+    Claim_Scan_Row(Path_DB, "A", 100)
+    Finish_Scan_Row(Path_DB, "A", 1, "Error", 2, 0)
+    assert Get_Rows(Path_DB)[1][:3] == ("failed: Error", 2, 2)
@@ -0,0 +1,59 @@
+import time
+
+import Fun_Sched
+from Fun_Sched import Run_Scan_Pool
+
+
+class Process_Fake(object):
+    def __init__(self, Para_dict_i, Re_No):
+        self.Scan_i = int(Para_dict_i["Scan No"]);  self.Re_No = Re_No
+
+
+def test_scan_pool_rows_and_retries(tmp_path, monkeypatch):
+    # two rows share Scan No 1, Scan 2 fails once, every row takes 2 polls
+    Started = [];   Polls = {}
+    def Start_Scan_Row(Para_dict_i, Re_No, *args):
+        Process_i = Process_Fake(Para_dict_i, Re_No)
+        Started.append((Process_i.Scan_i, Re_No))
+        return [Process_i, None, time.time()]
+    def Poll_Scan_Row(Process_i, Queue_Row, t_start, Wall_Max):
+        Polls[Process_i] = Polls.get(Process_i, 0) + 1
+        if Polls[Process_i] < 2:
+            return None
+        return "Error" if (Process_i.Scan_i, Process_i.Re_No) == (2, 0) else "Done"
+    monkeypatch.setattr(Fun_Sched, "Start_Scan_Row", Start_Scan_Row)
+    monkeypatch.setattr(Fun_Sched, "Poll_Scan_Row", Poll_Scan_Row)
+    monkeypatch.setattr(Fun_Sched, "Get_Scan_Cost", lambda Para_dict_i, *args: Para_dict_i["Cost"])
+    monkeypatch.setattr(Fun_Sched.time, "sleep", lambda t: None)
+    Rows = [
+        {"Scan No": 2, "Cost": 3}, {"Scan No": 1, "Cost": 2}, 
+        {"Scan No": 1, "Cost": 1}, {"Scan No": 3, "Cost": 0}, ]
+    Status_All = Run_Scan_Pool(
+        Rows, [str(tmp_path) + "/", "", "Out/", "Test"], 60, [None, "GEM-2"], 
+        Pool_No=2, Backoff=0)
+    # both rows with Scan No 1 ran, the retry of Scan 2 went after the rest
+    assert Started == [(2, 0), (1, 0), (1, 0), (3, 0), (2, 1)]
+    assert sorted([tuple(Status[:4]) for Status in Status_All]) == [
+        (1, 0, 1, "Done"), (1, 0, 1, "Done"), (2, 0, 1, "Error"), 
+        (2, 1, 2, "Done"), (3, 0, 1, "Done"), ]
+
+
+def test_scan_screen_keeps_caller_options(tmp_path, monkeypatch):
+    Calls = []
+    def Run_Scan_Pool(Rows, Path_List, Timelimit, Options, Options_Speed, *args, **kwargs):
+        Calls.append([Rows, Options_Speed]);    return []
+    monkeypatch.setattr(Fun_Sched, "Run_Scan_Pool", Run_Scan_Pool)
+    Rows = [{"Scan No": 1, "Mesh list": "[5,5,5,30,30]"}]
+    Path_List = [str(tmp_path) + "/", "", "Out/", "Test"]
+    (tmp_path / "Out").mkdir()
+    for Abort_MPE, Abort_Screen in [(None, 10), (5, 5), (20, 10)]:
+        Options_Speed = {"Model": "DFN", "Jump": False, "Abort_MPE": Abort_MPE}
+        Options_Speed_old = Options_Speed.copy()
+        Rows_Keep = Fun_Sched.Run_Scan_Screen(
+            Rows, Path_List, 60, [None, "GEM-2"], Options_Speed, MPE_Keep=10)
+        assert Options_Speed == Options_Speed_old
+        assert Rows_Keep == Rows and Rows[0]["Mesh list"] == "[5,5,5,30,30]"
+        [Rows_Screen, Options_Speed_i] = Calls[-1]
+        assert Options_Speed_i["Model"] == "SPMe" and Options_Speed_i["Jump"]
+        assert Options_Speed_i["Abort_MPE"] == Abort_Screen
+        assert Rows_Screen[0]["Mesh list"] == "[3,3,3,8,8]"
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from Fun_NC import CostPredictor, Get_Scan_States
+from Fun_Sched import Cost_Default, Get_Scan_Cost, Pack_Scan_Rows
+
+
+def Get_Rows():
+    Rows = []
+    for Scan_i,(Exp,Mesh) in enumerate([
+            (1, "[5,5,5,10,10]"), (2, "[5,5,5,30,30]"), 
+            (5, "[5,5,5,10,10]"), (5, "[5,5,5,30,30]"), ]):
+        Rows.append({
+            "Scan No": Scan_i + 1, "Exp No.": Exp, "Ageing temperature": 25, 
+            "Mesh list": Mesh, "Model option": "{'thermal': 'lumped'}", })
+    return Rows
+
+
+def Get_Predictor():
+    # history where every ageing cycle takes 2 s and every RPT 50 s
+    History = []
+    for Para_dict_i in Get_Rows():
+        History.append({
+            "Para": Para_dict_i, "Cycles AGE": 100, "Segments RPT": 4, 
+            "Time AGE [s]": 200.0, "Time RPT [s]": 200.0, })
+    return CostPredictor("GEM-2", Ridge=1e-9).Fit(History)
+
+
+def Check_Bundles(Bundles, Rows, Costs, Walltime, Cores):
+    Scans = sorted([Para["Scan No"] for Bundle in Bundles for Para in Bundle])
+    assert Scans == sorted([Para["Scan No"] for Para in Rows])
+    for Bundle in Bundles:  # rows longer than the walltime get a core alone
+        Cost_i = [Costs[Para["Scan No"]] for Para in Bundle]
+        assert sum([Cost for Cost in Cost_i if Cost <= Walltime]) <= (
+            Walltime * (Cores - sum([Cost > Walltime for Cost in Cost_i])))
+
+
+def test_scan_cost_in_seconds_without_history():
+    Para_dict_i = Get_Rows()[2]     # Exp 5: 1170 cycles, RPT every 78
+    n_states = Get_Scan_States(Para_dict_i)
+    assert Get_Scan_Cost(Para_dict_i, "GEM-2") == pytest.approx(
+        1170 * Cost_Default["AGE per cycle [s]"] * n_states 
+        + 16 * Cost_Default["RPT [s]"] * n_states)
+    # an experiment that is not implemented starts first
+    assert Get_Scan_Cost({**Para_dict_i, "Exp No.": 4}, "GEM-2") == np.inf
+
+
+def test_pack_without_predictor():
+    Rows = Get_Rows()
+    Costs = {Para["Scan No"]: Get_Scan_Cost(Para, "GEM-2") for Para in Rows}
+    # one core each and room for the longest row only
+    Walltime = max(Costs.values())
+    Bundles = Pack_Scan_Rows(Rows, "GEM-2", None, Walltime, 1)
+    Check_Bundles(Bundles, Rows, Costs, Walltime, 1)
+    assert Bundles[0][0]["Scan No"] == max(Costs, key=Costs.get)
+    # all fit into one allocation with enough cores and time
+    Bundles = Pack_Scan_Rows(Rows, "GEM-2", None, Walltime, len(Rows))
+    assert len(Bundles) == 1
+
+
+def test_pack_with_predictor():
+    Rows = Get_Rows()
+    Predictor = Get_Predictor()
+    Costs = {Para["Scan No"]: Get_Scan_Cost(Para, "GEM-2", Predictor) for Para in Rows}
+    # Exp 5: 1170 cycles of 2 s, 16 RPTs of 50 s
+    assert Costs[3] == pytest.approx(1170 * 2 + 16 * 50, rel=1e-3)
+    assert Costs[3] == pytest.approx(Costs[4], rel=1e-3)
+    # Exp 2 is over the walltime and takes one core, Exp 1 and one Exp 5 
+    # share the other one, the second Exp 5 needs a new allocation
+    Walltime = 10000
+    Bundles = Pack_Scan_Rows(Rows, "GEM-2", Predictor, Walltime, 2)
+    Check_Bundles(Bundles, Rows, Costs, Walltime, 2)
+    assert [len(Bundle) for Bundle in Bundles] == [3, 1]
+    assert [Para["Scan No"] for Para in Bundles[0][:2]] == [2, 1]
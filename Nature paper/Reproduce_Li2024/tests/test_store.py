@@ -0,0 +1,86 @@
+import glob
+import time
+
+import numpy as np
+
+from Fun_Store import (
+    Save_Store_Scan, Read_Store, Load_Store_midc_merge, Compact_Store)
+
+
+def Get_midc_merge(Scan_i, Re_No):
+    my_dict_RPT = {
+        "Cycle_RPT": [0, 10, 20],
+        "Discharge capacity [A.h]": [5.0, 4.9 - 0.1 * Scan_i, 4.8 - Re_No],
+        "CDend Porosity": [np.full(3, 0.2), np.full(3, 0.19), np.full(3, 0.18)],
+        "Error_RPT": "none",     # text is not stored
+    }
+    my_dict_AGE = {"Cycle_AGE": [1, 2, 3]}
+    return [my_dict_RPT, my_dict_AGE, {}]
+
+
+def Save_Case(BasicPath, Scan_i, Re_No):
+    Dict_Excel = {"Y or N": "Yes", "Exp No.": 2, "Error tot %": 0.1 * Scan_i}
+    Para_dict_i = {"Scan No": Scan_i, "Exp No.": 2}
+    Save_Store_Scan(
+        BasicPath, "Case/", "Test", Scan_i, Re_No,
+        Dict_Excel, Para_dict_i, Get_midc_merge(Scan_i, Re_No))
+
+
+def test_store_merge(tmp_path):
+    BasicPath = str(tmp_path) + "/"
+    Path_Store = BasicPath + "Case/Store"
+    for Scan_i, Re_No in [(1, 0), (2, 0), (2, 1)]:
+        Save_Case(BasicPath, Scan_i, Re_No)
+    df_before = Read_Store(Path_Store, "RPT")
+    Compact_Store(Path_Store)
+    for Table in ["Summary", "RPT", "Arrays"]:
+        assert len(glob.glob(Path_Store + f"/{Table}/*.parquet")) == 1
+    assert not glob.glob(Path_Store + "/*.lock")
+    # nothing is lost by merging
+    df_after = Read_Store(Path_Store, "RPT")
+    Keys = ["Scan No", "Re_No", "RPT"]
+    df_before = df_before.sort_values(Keys).reset_index(drop=True)
+    df_after = df_after.sort_values(Keys).reset_index(drop=True)
+    assert df_after.equals(df_before)
+    assert len(df_after) == 9
+    # later writes are merged into the compacted file next time
+    time.sleep(0.01)
+    Save_Case(BasicPath, 1, 0)
+    Compact_Store(Path_Store)
+    assert len(Read_Store(Path_Store, "Summary", Latest=False)) == 4
+    df = Read_Store(Path_Store, "Summary")
+    assert len(df) == 3
+    assert sorted(zip(df["Scan No"], df["Re_No"])) == [(1, 0), (2, 0), (2, 1)]
+
+
+def test_store_read_filters(tmp_path):
+    BasicPath = str(tmp_path) + "/"
+    Path_Store = BasicPath + "Case/Store"
+    for Scan_i, Re_No in [(1, 0), (2, 0)]:
+        Save_Case(BasicPath, Scan_i, Re_No)
+    df = Read_Store(
+        Path_Store, "Summary", Filters=[("Scan No", "=", 2)],
+        Columns=["Error tot %"])
+    assert len(df) == 1 and df["Error tot %"].iloc[0] == 0.2
+    assert "Y or N" not in df.columns
+    df = Read_Store(
+        Path_Store, "Arrays", Filters=[("Key", "=", "CDend Porosity")])
+    assert sorted(df["Index"].unique()) == [0, 1, 2]
+
+
+def test_store_midc_merge_round_trip(tmp_path):
+    BasicPath = str(tmp_path) + "/"
+    Save_Case(BasicPath, 2, 1)
+    Save_Case(BasicPath, 2, 0)
+    Compact_Store(BasicPath + "Case/Store")
+    midc_merge = Load_Store_midc_merge(BasicPath + "Case/Store", "Test", 2, 1)
+    midc_ref = Get_midc_merge(2, 1)
+    for dict_i, dict_ref in zip(midc_merge, midc_ref):
+        assert sorted(dict_i.keys()) == sorted(
+            key for key in dict_ref.keys() if key != "Error_RPT")
+        for key, value in dict_i.items():
+            if key == "CDend Porosity":
+                for value_i, value_ref in zip(value, dict_ref[key]):
+                    np.testing.assert_allclose(value_i, value_ref)
+            else:
+                np.testing.assert_allclose(value, dict_ref[key])
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from Fun_NC import TimeoutInline, TimeoutError, RioCallback, Get_Throughput_Last
+
+
+def Run_Steps(n_steps, t_step, Deadline=None):
+    # stands in for a pybamm solve: the callback is called at every step
+    Call = RioCallback(Deadline=Deadline)
+    for _ in range(n_steps):
+        Call.on_step_start({})
+        time.sleep(t_step)
+    return ["Model", "Sol", Call, "DeBug"]
+
+
+def test_finishes_before_deadline():
+    Result = TimeoutInline(Run_Steps, timeout=5, timeout_val="timed out")(3, 0.01)
+    assert Result[1] == "Sol"
+
+
+def test_callback_stops_at_deadline():
+    t_0 = time.time()
+    Result = TimeoutInline(Run_Steps, timeout=0.2, timeout_val="timed out")(100, 0.05)
+    assert Result[1] == "timed out" and Result[2].success
+    assert time.time() - t_0 < 1.0
+
+
+def test_alarm_stops_a_long_step():
+    def Run_Hang(Deadline=None):  # one step that never reaches a callback
+        t_end = time.time() + 10
+        while time.time() < t_end:
+            pass
+        return ["Model", "Sol", RioCallback(), "DeBug"]
+    t_0 = time.time()
+    Result = TimeoutInline(Run_Hang, timeout=0.5, timeout_val="timed out")()
+    assert Result[1] == "timed out"
+    assert time.time() - t_0 < 3
+
+
+def test_nested_deadlines_are_independent():
+    def Run_Outer(Deadline=None):
+        Inner = TimeoutInline(Run_Steps, timeout=0.1, timeout_val="inner timed out")(100, 0.02)
+        # the inner timeout must not end or reset the outer one
+        Outer = Run_Steps(3, 0.01, Deadline)
+        return [Inner[1], Outer[1], Outer[2], None]
+    Result = TimeoutInline(Run_Outer, timeout=5, timeout_val="outer timed out")()
+    assert Result[:2] == ["inner timed out", "Sol"]
+
+
+def test_deadline_outside_main_thread():
+    Results = []
+    Thread = threading.Thread(target=lambda: Results.append(
+        TimeoutInline(Run_Steps, timeout=0.2, timeout_val="timed out")(100, 0.05)))
+    Thread.start();   Thread.join(5)
+    assert Results[0][1] == "timed out"
+
+
+def test_deadline_outside_main_thread_in_debug_list():
+    def Run_Short(Deadline=None):
+        return ["Model", "Sol", RioCallback(Deadline=Deadline), [None, "Fully succeed"]]
+    Results = []
+    Thread = threading.Thread(target=lambda: Results.append(
+        TimeoutInline(Run_Short, timeout=5, timeout_val="timed out")()))
+    Thread.start();   Thread.join(5)
+    assert Results[0][3][-1].startswith("Fully succeed; no SIGALRM")
+    assert TimeoutInline(Run_Short, timeout=5)()[3][-1] == "Fully succeed"
+
+
+def test_timeout_not_swallowed_by_retries():
+    class Sol_Timeout(object):  # the alarm fires while Sol is read
+        @property
+        def all_models(self):
+            raise TimeoutError
+    def Run_Read(Deadline=None):
+        return ["Model", Get_Throughput_Last(Sol_Timeout()), RioCallback(), "DeBug"]
+    Result = TimeoutInline(Run_Read, timeout=5, timeout_val="timed out")()
+    assert Result[1] == "timed out"